@@ -1,25 +1,52 @@
+import codecs
 import json
+import logging
+import time
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app import config
 from app.api.auth import verify_api_key
 from app.api.schemas import (
     RunResponse,
     TaskInstanceResponse,
+    TaskResultBatch,
     TaskResultCallback,
+    WorkClaimRequest,
+    WorkerHeartbeat,
     WorkflowCreate,
     WorkflowResponse,
 )
-from app.core.dag import validate_dag
-from app.core.models import RunState, TaskState
+from app.core.dag import LIMIT_FIELDS, dag_cache, validate_dag
+from app.core.logtail import LogTails
+from app.core.models import TaskState
+from app.core.retries import retry_at
+from app.core.scheduler import Scheduler, lease_expiry, task_payload
+from app.core.triggers import RunTrigger, Schedule
 from app.db import repository
 from app.db.database import get_db
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def get_scheduler(request: Request) -> Scheduler:
+    return request.app.state.scheduler
+
+
+def get_trigger(request: Request) -> RunTrigger:
+    return request.app.state.trigger
+
+
+def get_log_tails(request: Request) -> LogTails:
+    return request.app.state.log_tails
+
+
 # ── Public endpoints (require API key) ──────────────────────────────────────
 
 
@@ -28,23 +55,37 @@ router = APIRouter()
     response_model=WorkflowResponse,
     dependencies=[Depends(verify_api_key)],
 )
-def register_workflow(workflow: WorkflowCreate, db: Session = Depends(get_db)):
+def register_workflow(
+    workflow: WorkflowCreate,
+    db: Session = Depends(get_db),
+    trigger: RunTrigger = Depends(get_trigger),
+):
     existing = repository.get_workflow(db, workflow.id)
     if existing:
         raise HTTPException(
             status_code=409, detail=f"Workflow '{workflow.id}' already exists"
         )
 
-    definition = workflow.model_dump()
+    definition = workflow.model_dump(exclude_none=True)
     errors = validate_dag(definition)
     if errors:
         raise HTTPException(status_code=400, detail={"errors": errors})
 
-    wf = repository.create_workflow(db, workflow.id, definition)
+    schedule = Schedule.of(definition)
+    next_run_at = None
+    if schedule is not None:
+        # The first schedule time after registration; none are caught up
+        first = schedule.next_after(datetime.now(timezone.utc))
+        next_run_at = first.isoformat() if first is not None else None
+
+    wf = repository.create_workflow(db, workflow.id, definition, next_run_at)
+    if wf.next_run_at is not None:
+        trigger.workflow_registered(wf.id)
     return WorkflowResponse(
         id=wf.id,
-        definition=json.loads(wf.definition),
+        definition=dag_cache.get(wf).definition,
         created_at=wf.created_at,
+        next_run_at=wf.next_run_at,
     )
 
 
@@ -58,8 +99,9 @@ def list_workflows(db: Session = Depends(get_db)):
     return [
         WorkflowResponse(
             id=w.id,
-            definition=json.loads(w.definition),
+            definition=dag_cache.get(w).definition,
             created_at=w.created_at,
+            next_run_at=w.next_run_at,
         )
         for w in workflows
     ]
@@ -78,8 +120,9 @@ def get_workflow(workflow_id: str, db: Session = Depends(get_db)):
         )
     return WorkflowResponse(
         id=wf.id,
-        definition=json.loads(wf.definition),
+        definition=dag_cache.get(wf).definition,
         created_at=wf.created_at,
+        next_run_at=wf.next_run_at,
     )
 
 
@@ -88,15 +131,20 @@ def get_workflow(workflow_id: str, db: Session = Depends(get_db)):
     response_model=RunResponse,
     dependencies=[Depends(verify_api_key)],
 )
-def trigger_run(workflow_id: str, db: Session = Depends(get_db)):
+def trigger_run(
+    workflow_id: str,
+    db: Session = Depends(get_db),
+    scheduler: Scheduler = Depends(get_scheduler),
+):
     wf = repository.get_workflow(db, workflow_id)
     if not wf:
         raise HTTPException(
             status_code=404, detail=f"Workflow '{workflow_id}' not found"
         )
 
-    definition = json.loads(wf.definition)
+    definition = dag_cache.get(wf).definition
     run = repository.create_run(db, workflow_id, definition["tasks"])
+    scheduler.run_created(run.id)
     return RunResponse(
         id=run.id,
         workflow_id=run.workflow_id,
@@ -122,6 +170,8 @@ def get_run(run_id: str, db: Session = Depends(get_db)):
         status=run.status,
         started_at=run.started_at,
         finished_at=run.finished_at,
+        scheduled_at=run.scheduled_at,
+        task_counts=repository.run_task_counts(run),
     )
 
 
@@ -144,6 +194,7 @@ def get_task_instances(run_id: str, db: Session = Depends(get_db)):
             run_id=t.run_id,
             task_id=t.task_id,
             command=t.command,
+            callable=json.loads(t.callable) if t.callable else None,
             status=t.status,
             retries_left=t.retries_left,
             max_retries=t.max_retries,
@@ -151,70 +202,317 @@ def get_task_instances(run_id: str, db: Session = Depends(get_db)):
             finished_at=t.finished_at,
             output=t.output,
             worker_id=t.worker_id,
+            log_url=t.log_url,
+            timeout=t.timeout,
+            cpus=t.cpus,
+            memory_mb=t.memory_mb,
+            retry_delay=t.retry_delay,
+            retry_backoff=t.retry_backoff,
+            max_retry_delay=t.max_retry_delay,
+            not_before=t.not_before,
+            peak_rss_kb=t.peak_rss_kb,
+            cpu_seconds=t.cpu_seconds,
+            wall_seconds=t.wall_seconds,
         )
         for t in tasks
     ]
 
 
+@router.get(
+    "/runs/{run_id}/tasks/{task_id}/logs",
+    dependencies=[Depends(verify_api_key)],
+)
+async def stream_task_log(
+    run_id: str,
+    task_id: str,
+    request: Request,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+    log_tails: LogTails = Depends(get_log_tails),
+):
+    """Follow a task's output live as server-sent events.
+
+    Each ``log`` event carries the text written since the previous one,
+    with the byte offset reached as its id, so a reconnecting client (or
+    ``?offset=``) resumes where it stopped. An ``end`` event with the
+    task's status closes the stream once the attempt is over. Output is
+    read from the worker running the task through a tail shared by all
+    followers of that attempt.
+    """
+    task = await run_in_threadpool(
+        repository.get_task_instance_by_task_id, db, run_id, task_id
+    )
+    if task is None:
+        raise HTTPException(
+            status_code=404, detail=f"Task '{task_id}' not found in run '{run_id}'"
+        )
+    if not task.log_url:
+        raise HTTPException(status_code=404, detail="Task has no log yet")
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    task_instance_id, started_at = task.id, task.started_at
+    state = {"status": task.status}
+
+    def attempt_over() -> bool:
+        current = repository.get_task_instance(db, task_instance_id)
+        state["status"] = current.status if current else None
+        over = (
+            current is None
+            or current.status != TaskState.RUNNING
+            or current.started_at != started_at
+        )
+        # Drop the read transaction so the next check sees new commits
+        db.close()
+        return over
+
+    async def is_finished() -> bool:
+        return await run_in_threadpool(attempt_over)
+
+    async def events():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for chunk_offset, data in log_tails.follow(
+            f"{task_instance_id}@{started_at}", task.log_url, is_finished, offset
+        ):
+            yield _sse_event("log", decoder.decode(data), chunk_offset + len(data))
+        await is_finished()
+        yield _sse_event("end", json.dumps({"status": state["status"]}))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _sse_event(event: str, data: str, event_id: int | None = None) -> str:
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/workers", dependencies=[Depends(verify_api_key)])
+async def list_workers(scheduler: Scheduler = Depends(get_scheduler)):
+    """Live worker membership with the master's view of each worker's load.
+
+    ``async`` so that it runs on the scheduler's event loop, the only place
+    the worker registry may be read.
+    """
+    return scheduler.workers.snapshot()
+
+
 # ── Internal endpoint (worker callback, no auth) ───────────────────────────
 
 
 @router.post("/internal/task-result")
-def task_result_callback(result: TaskResultCallback, db: Session = Depends(get_db)):
+def task_result_callback(
+    result: TaskResultCallback,
+    db: Session = Depends(get_db),
+    scheduler: Scheduler = Depends(get_scheduler),
+):
     task = repository.get_task_instance(db, result.task_instance_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task instance not found")
 
-    now = datetime.now(timezone.utc).isoformat()
+    _apply_task_results(db, scheduler, [result], {task.id: task})
+    return {"status": "ok"}
+
+
+@router.post("/internal/task-results")
+def task_results_batch_callback(
+    batch: TaskResultBatch,
+    db: Session = Depends(get_db),
+    scheduler: Scheduler = Depends(get_scheduler),
+):
+    """Apply a batch of worker results in one transaction.
+
+    Unknown task instances are skipped rather than failing the batch, so a
+    worker retrying after a lost response never gets stuck on one item.
+    """
+    tasks = {
+        t.id: t
+        for t in repository.get_task_instances_by_ids(
+            db, [r.task_instance_id for r in batch.results]
+        )
+    }
+    applied = _apply_task_results(db, scheduler, batch.results, tasks)
+    return {"status": "ok", "applied": applied}
+
+
+@router.post("/internal/work/claim")
+async def claim_work(
+    claim: WorkClaimRequest,
+    db: Session = Depends(get_db),
+    scheduler: Scheduler = Depends(get_scheduler),
+):
+    """Pull mode: renew the caller's leases and claim up to ``max_tasks``.
 
-    if result.status == TaskState.SUCCESS:
-        repository.update_task_status(
+    When nothing is queued the request is held open (long poll) until the
+    scheduler queues work or ``wait`` seconds pass, so idle workers neither
+    spin nor add latency.
+    """
+    deadline = time.monotonic() + min(claim.wait, config.CLAIM_WAIT)
+    if claim.running:
+        await run_in_threadpool(
+            repository.renew_leases,
+            db,
+            [claim.worker_id],
+            claim.running,
+            lease_expiry(),
+        )
+    load = claim.load or {}
+    while True:
+        since = scheduler.work_generation
+        tasks = await run_in_threadpool(
+            repository.claim_queued_tasks,
             db,
-            task.id,
-            TaskState.SUCCESS,
-            output=result.output,
-            finished_at=now,
-            worker_id=result.worker_id,
+            claim.worker_id,
+            claim.max_tasks,
+            datetime.now(timezone.utc).isoformat(),
+            lease_expiry(),
+            claim.url,
+            free_cpus=load.get("free_cpus"),
+            free_memory_mb=load.get("free_memory_mb"),
+            idle=(
+                load.get("free_cpus") == load.get("cpus")
+                and load.get("free_memory_mb") == load.get("memory_mb")
+            ),
+        )
+        remaining = deadline - time.monotonic()
+        if tasks or claim.max_tasks <= 0 or remaining <= 0:
+            break
+        await scheduler.wait_for_work(since, remaining)
+    return {
+        "tasks": [_task_payload(t) for t in tasks],
+        "lease_seconds": config.TASK_LEASE_SECONDS,
+    }
+
+
+def _task_payload(task) -> dict:
+    limits = {
+        field: getattr(task, field)
+        for field in LIMIT_FIELDS
+        if getattr(task, field) is not None
+    }
+    return task_payload(
+        task.id,
+        task.task_id,
+        task.command,
+        json.loads(task.callable) if task.callable else None,
+        limits,
+        task.started_at,
+    )
+
+
+@router.post("/internal/workers/register")
+@router.post("/internal/workers/heartbeat")
+def worker_heartbeat(
+    beat: WorkerHeartbeat,
+    db: Session = Depends(get_db),
+    scheduler: Scheduler = Depends(get_scheduler),
+):
+    """Register a worker or keep it alive; the first beat also registers.
+
+    Also renews the leases of the tasks the worker reports running.
+    """
+    scheduler.worker_heartbeat(beat.url, beat.worker_id, beat.load)
+    if beat.running:
+        repository.renew_leases(
+            db, [beat.url, beat.worker_id], beat.running, lease_expiry()
         )
-    elif result.status == TaskState.FAILED:
-        if task.retries_left > 0:
-            # Mark as RETRYING — scheduler will move it back to PENDING
-            repository.update_task_status(
-                db,
+    return {"status": "ok", "heartbeat_timeout": config.WORKER_HEARTBEAT_TIMEOUT}
+
+
+@router.post("/internal/workers/deregister")
+def worker_deregister(
+    beat: WorkerHeartbeat, scheduler: Scheduler = Depends(get_scheduler)
+):
+    scheduler.worker_left(beat.url)
+    return {"status": "ok"}
+
+
+def _apply_task_results(
+    db: Session,
+    scheduler: Scheduler,
+    results: list[TaskResultCallback],
+    tasks: dict,
+) -> int:
+    """Record results, then check completion once per affected run.
+
+    Only results of a task's current attempt are applied: the task must
+    still be RUNNING, and started with the ``attempt`` the worker echoes.
+    A worker the lease reaper gave up on may deliver its result after the
+    task was handed to another worker; that result is dropped. The write
+    itself re-checks both, so a reap racing this request wins.
+    """
+    finished = datetime.now(timezone.utc)
+    now = finished.isoformat()
+    changes = []
+    for result in results:
+        task = tasks.get(result.task_instance_id)
+        if task is None or task.status in _FINISHED_STATES:
+            # Unknown, or a duplicate delivery of a result already applied
+            continue
+        if task.status != TaskState.RUNNING or (
+            result.attempt is not None and result.attempt != task.started_at
+        ):
+            logger.info(
+                "Dropping a stale result of task %s from %s (attempt %s, "
+                "current %s, %s)",
                 task.id,
-                TaskState.RETRYING,
-                output=result.output,
-                finished_at=now,
-                worker_id=result.worker_id,
+                result.worker_id or "a worker",
+                result.attempt,
+                task.started_at,
+                task.status,
+            )
+            continue
+        if result.status == TaskState.SUCCESS:
+            new_status = TaskState.SUCCESS
+        elif result.status == TaskState.FAILED:
+            # RETRYING — scheduler will move it back to PENDING
+            new_status = (
+                TaskState.RETRYING if task.retries_left > 0 else TaskState.FAILED
             )
         else:
-            repository.update_task_status(
-                db,
+            continue
+        values = {
+            "status": new_status,
+            "output": result.output,
+            "finished_at": now,
+            "worker_id": result.worker_id,
+        }
+        if new_status == TaskState.RETRYING:
+            # Stored with the failure, so the backoff survives a restart
+            values["not_before"] = retry_at(task, finished)
+        if result.log_url:
+            values["log_url"] = result.log_url
+        for field in ("peak_rss_kb", "cpu_seconds", "wall_seconds"):
+            values[field] = getattr(result, field)
+        changes.append((task, values))
+
+    written = set(repository.record_task_results(db, changes))
+
+    run_ids = set()
+    for task, values in changes:
+        if task.id not in written:
+            logger.info(
+                "Dropping a stale result of task %s from %s: it left attempt "
+                "%s meanwhile",
                 task.id,
-                TaskState.FAILED,
-                output=result.output,
-                finished_at=now,
-                worker_id=result.worker_id,
+                values["worker_id"] or "a worker",
+                task.started_at,
             )
-
-    _check_run_completion(db, task.run_id)
-    return {"status": "ok"}
+            continue
+        # Downstream tasks may now be runnable (or a retry is timed)
+        scheduler.task_state_changed(
+            task.run_id, task.task_id, values["status"], values.get("not_before")
+        )
+        run_ids.add(task.run_id)
+    for run_id in run_ids:
+        repository.check_run_completion(db, run_id)
+    return len(written)
 
 
-def _check_run_completion(db: Session, run_id: str):
-    """Check if all tasks in a run are finished and update run status."""
-    tasks = repository.get_task_instances(db, run_id)
-    statuses = [t.status for t in tasks]
-    now = datetime.now(timezone.utc).isoformat()
-
-    if all(s == TaskState.SUCCESS for s in statuses):
-        repository.update_run_status(db, run_id, RunState.SUCCESS, finished_at=now)
-    elif any(s == TaskState.FAILED for s in statuses):
-        still_active = any(
-            s in (TaskState.PENDING, TaskState.RUNNING, TaskState.RETRYING)
-            for s in statuses
-        )
-        if not still_active:
-            repository.update_run_status(
-                db, run_id, RunState.FAILED, finished_at=now
-            )
+_FINISHED_STATES = (TaskState.SUCCESS, TaskState.FAILED, TaskState.RETRYING)
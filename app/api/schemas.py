@@ -3,16 +3,56 @@ from pydantic import BaseModel, Field
 
 # --- Request models ---
 
+class CallableSpec(BaseModel):
+    # "package.module:function", importable on the workers
+    target: str
+    args: list = Field(default_factory=list)
+    kwargs: dict = Field(default_factory=dict)
+
+
 class TaskDefinition(BaseModel):
     id: str
-    command: str
+    # Exactly one of: a shell command, or a Python callable run in-process
+    # on a worker's warm interpreters
+    command: str | None = None
+    callable: CallableSpec | None = None
     dependencies: list[str] = Field(default_factory=list)
     max_retries: int = 0
+    # Backoff between retries: retry_delay seconds before the first, times
+    # retry_backoff for each retry already used, at most max_retry_delay
+    # (each defaults to the master's RETRY_* setting)
+    retry_delay: float | None = Field(default=None, ge=0)
+    retry_backoff: float | None = Field(default=None, ge=1)
+    max_retry_delay: float | None = Field(default=None, ge=0)
+    # Seconds before the task is killed (default: the worker's TASK_TIMEOUT)
+    timeout: float | None = Field(default=None, gt=0)
+    # Cores and memory the task needs: reserved on the worker it is placed
+    # on while it runs, and enforced there as rlimits
+    cpus: float | None = Field(default=None, gt=0)
+    memory_mb: int | None = Field(default=None, gt=0)
+    # Added to the workflow's priority; higher is dispatched first
+    priority: int = 0
+    # Named pool (see POOLS) the task takes a slot of while QUEUED or RUNNING
+    pool: str | None = None
 
 
 class WorkflowCreate(BaseModel):
     id: str
     tasks: list[TaskDefinition]
+    # Runs of higher-priority workflows are dispatched first; workflows of
+    # equal priority share the dispatch slots fairly
+    priority: int = 0
+    # At most this many runs of the workflow, and tasks across its runs,
+    # active at once; further runs wait their turn
+    max_active_runs: int | None = Field(default=None, gt=0)
+    max_active_tasks: int | None = Field(default=None, gt=0)
+    # Runs are also triggered on a schedule: a cron expression (in UTC, or
+    # @hourly, @daily...) or every schedule_interval seconds
+    schedule: str | None = None
+    schedule_interval: float | None = Field(default=None, gt=0)
+    # Of several schedule times missed at once, at most this many get a run
+    # (default: SCHEDULE_MAX_CATCHUP_RUNS)
+    max_catchup_runs: int | None = Field(default=None, gt=0)
 
 
 # --- Response models ---
@@ -21,6 +61,8 @@ class WorkflowResponse(BaseModel):
     id: str
     definition: dict
     created_at: str
+    # Scheduled workflows: the schedule time of the next run
+    next_run_at: str | None = None
 
 
 class RunResponse(BaseModel):
@@ -29,6 +71,9 @@ class RunResponse(BaseModel):
     status: str
     started_at: str
     finished_at: str | None = None
+    # Runs created by the workflow's schedule: the schedule time they are for
+    scheduled_at: str | None = None
+    task_counts: dict[str, int] | None = None
 
 
 class TaskInstanceResponse(BaseModel):
@@ -36,6 +81,7 @@ class TaskInstanceResponse(BaseModel):
     run_id: str
     task_id: str
     command: str
+    callable: dict | None = None
     status: str
     retries_left: int
     max_retries: int
@@ -43,6 +89,18 @@ class TaskInstanceResponse(BaseModel):
     finished_at: str | None = None
     output: str | None = None
     worker_id: str | None = None
+    log_url: str | None = None
+    timeout: float | None = None
+    cpus: float | None = None
+    memory_mb: int | None = None
+    retry_delay: float | None = None
+    retry_backoff: float | None = None
+    max_retry_delay: float | None = None
+    # RETRYING tasks: when the retry is due
+    not_before: str | None = None
+    peak_rss_kb: int | None = None
+    cpu_seconds: float | None = None
+    wall_seconds: float | None = None
 
 
 # --- Internal models ---
@@ -52,3 +110,38 @@ class TaskResultCallback(BaseModel):
     status: str
     output: str = ""
     worker_id: str = ""
+    # The attempt's ``started_at``, as sent with the task (older workers: None)
+    attempt: str | None = None
+    # Full log on the worker (output only holds its head and tail)
+    log_url: str | None = None
+    # What the attempt consumed, as far as the worker could measure it
+    peak_rss_kb: int | None = None
+    cpu_seconds: float | None = None
+    wall_seconds: float | None = None
+
+
+class TaskResultBatch(BaseModel):
+    results: list[TaskResultCallback]
+
+
+class WorkClaimRequest(BaseModel):
+    worker_id: str
+    # Free slots the worker wants filled; 0 only renews leases
+    max_tasks: int = 1
+    # Seconds to long-poll when nothing is queued (capped by the master)
+    wait: float = 0.0
+    # Task instances the worker is still running, whose leases to renew
+    running: list[str] = []
+    # The worker's advertised URL, where the master can read live task logs
+    url: str | None = None
+    # The worker's load, including its free cores and memory; tasks whose
+    # requests do not fit are left for other workers
+    load: dict | None = None
+
+
+class WorkerHeartbeat(BaseModel):
+    worker_id: str
+    url: str
+    load: dict | None = None
+    # Task instances the worker is running, whose leases to renew
+    running: list[str] = []
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+from collections import Counter
+
+from app.core.dag import CompiledDag
+from app.core.models import TaskState
+
+# States in which a task holds a slot: of its pool, of its workflow's
+# max_active_tasks and of the scheduler's MAX_RUNNING_TASKS
+ACTIVE_STATES = frozenset((TaskState.QUEUED, TaskState.RUNNING))
+
+
+class ConcurrencyLimits:
+    """Slots held by QUEUED and RUNNING tasks, and the tasks waiting for one.
+
+    Counts are kept overall, per pool (``pools`` maps names to slot counts)
+    and per workflow (its ``max_active_tasks``). ``RunReadiness`` reports
+    every transition into or out of an active state through ``change``, so
+    checking and taking a slot costs O(1) and no query.
+
+    A task that comes off the ready queue while its pool or workflow is
+    full is parked with ``block`` in a heap for that pool or workflow. Each
+    slot freed there releases the best parked task (by priority, then
+    critical-path rank), which ``pop_released`` hands back to the
+    scheduler. So a long backlog behind a small pool is not rescanned on
+    every pass.
+    """
+
+    def __init__(self, pools: dict[str, int] | None = None, max_running: int = 0):
+        self.pools = dict(pools or {})
+        # 0: no overall limit
+        self.max_running = max_running
+        self.running = 0
+        # ("pool", name) / ("workflow", workflow_id) -> active tasks
+        self._active: Counter = Counter()
+        # Same keys -> heap of tasks waiting for a slot there
+        self._blocked: dict[tuple, list] = {}
+        self._released: list = []
+        self._seq = itertools.count()
+
+    def budget(self) -> int | None:
+        """How many more tasks may become active (None: no overall limit)."""
+        if self.max_running <= 0:
+            return None
+        return max(0, self.max_running - self.running)
+
+    def change(self, dag: CompiledDag, i: int, delta: int):
+        """Task ``i`` of ``dag`` became active (+1) or stopped being (-1)."""
+        self.running += delta
+        for key in _keys(dag, i):
+            self._active[key] += delta
+            if not self._active[key]:
+                del self._active[key]
+            if delta < 0:
+                self._release(key)
+
+    def blocker(self, dag: CompiledDag, i: int, taken: Counter) -> tuple | None:
+        """The full pool or workflow keeping task ``i`` from a slot, if any.
+
+        ``taken`` counts the slots handed out in the current pass that are
+        not active yet (see ``take``).
+        """
+        for key in _keys(dag, i):
+            limit = self._limit(key, dag)
+            if limit is not None and self._active[key] + taken[key] >= limit:
+                return key
+        return None
+
+    def take(self, dag: CompiledDag, i: int, taken: Counter):
+        taken.update(_keys(dag, i))
+
+    def block(self, key: tuple, readiness, i: int):
+        """Park a task until a slot frees up under ``key``."""
+        dag = readiness.dag
+        heapq.heappush(
+            self._blocked.setdefault(key, []),
+            (
+                -(dag.priority + dag.priorities[i]),
+                -readiness.ranks[i],
+                next(self._seq),
+                readiness,
+                i,
+            ),
+        )
+
+    def unblock(self, dag: CompiledDag, i: int):
+        """A slot taken for task ``i`` went unused: let a parked task try it."""
+        for key in _keys(dag, i):
+            self._release(key)
+
+    def pop_released(self) -> list:
+        """Parked tasks that may have a slot now, as (readiness, index)."""
+        released, self._released = self._released, []
+        return released
+
+    def forget(self, readiness):
+        """Give back the slots of a run the scheduler stops tracking."""
+        for i, status in enumerate(readiness.status):
+            if status in ACTIVE_STATES:
+                self.change(readiness.dag, i, -1)
+
+    def _limit(self, key: tuple, dag: CompiledDag) -> int | None:
+        kind, name = key
+        if kind == "pool":
+            return self.pools.get(name)
+        return dag.max_active_tasks
+
+    def _release(self, key: tuple):
+        heap = self._blocked.get(key)
+        while heap:
+            *_, readiness, i = heapq.heappop(heap)
+            # Skip tasks that were dispatched, changed or dropped meanwhile
+            if not readiness.closed and readiness.status[i] == TaskState.PENDING:
+                self._released.append((readiness, i))
+                break
+        if heap is not None and not heap:
+            del self._blocked[key]
+
+
+def _keys(dag: CompiledDag, i: int) -> list[tuple]:
+    keys = [("workflow", dag.workflow_id)]
+    if dag.pools[i] is not None:
+        keys.append(("pool", dag.pools[i]))
+    return keys
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+# Nicknames for common schedules
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+_MONTHS = ("jan feb mar apr may jun jul aug sep oct nov dec").split()
+_DAYS = ("sun mon tue wed thu fri sat").split()
+
+# (name, lowest, highest, names for lowest.. if any)
+_FIELDS = (
+    ("minute", 0, 59, None),
+    ("hour", 0, 23, None),
+    ("day of month", 1, 31, None),
+    ("month", 1, 12, _MONTHS),
+    ("day of week", 0, 7, _DAYS),
+)
+
+# Give up looking for a match after this many years (e.g. "0 0 30 2 *")
+_SEARCH_YEARS = 8
+
+
+class CronExpression:
+    """A standard five-field cron expression, evaluated in UTC.
+
+    Fields are minute, hour, day of month, month and day of week, each
+    ``*``, a number, a range ``a-b``, a step ``*/n`` or ``a-b/n``, or a
+    comma-separated list of those. Months and weekdays may be given by
+    their three-letter names; Sunday is 0 or 7. As in cron, when both day
+    fields are restricted a day matching either one matches. The macros in
+    ``MACROS`` (``@hourly``, ``@daily``...) are accepted too. An invalid
+    expression, or one that can never match, raises ValueError.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError("expected 5 fields: minute hour day month weekday")
+        parsed = [_parse_field(text, *spec) for text, spec in zip(fields, _FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # Sunday is both 0 and 7
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day = fields[2].startswith("*")
+        self._any_weekday = fields[4].startswith("*")
+        self._sorted_minutes = sorted(self.minutes)
+        self._sorted_hours = sorted(self.hours)
+        if self.next_after(datetime(2000, 1, 1)) is None:
+            raise ValueError("never matches")
+
+    def __repr__(self) -> str:
+        return f"CronExpression({self.expression!r})"
+
+    def _day_matches(self, t: datetime) -> bool:
+        in_days = t.day in self.days
+        # datetime: Monday is 0; cron: Sunday is 0
+        in_weekdays = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after: datetime) -> datetime | None:
+        """The first matching minute strictly after ``after`` (None if there
+        is none within the next few years). Keeps ``after``'s tzinfo."""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after.year + _SEARCH_YEARS
+        while t.year <= limit:
+            if t.month not in self.months:
+                year, month = divmod(t.month, 12)
+                t = t.replace(
+                    year=t.year + year, month=month + 1, day=1, hour=0, minute=0
+                )
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = _first_at_least(self._sorted_hours, t.hour)
+            if hour is None:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+            minute = _first_at_least(self._sorted_minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+
+def _first_at_least(values: list[int], low: int) -> int | None:
+    for value in values:
+        if value >= low:
+            return value
+    return None
+
+
+def _parse_field(
+    text: str, name: str, low: int, high: int, names: list[str] | None
+) -> frozenset[int]:
+    values = set()
+    for part in text.split(","):
+        spec, _, step_text = part.partition("/")
+        step = 1
+        if step_text:
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"bad step in {name} field: {part!r}")
+            step = int(step_text)
+        if spec == "*":
+            first, last = low, high
+        else:
+            first_text, dash, last_text = spec.partition("-")
+            first = _parse_value(first_text, name, low, high, names)
+            if dash:
+                last = _parse_value(last_text, name, low, high, names)
+            else:
+                # "5/15": from 5 to the end, every 15
+                last = high if step_text else first
+            if first > last:
+                raise ValueError(f"bad range in {name} field: {part!r}")
+        values.update(range(first, last + 1, step))
+    return frozenset(values)
+
+
+def _parse_value(
+    text: str, name: str, low: int, high: int, names: list[str] | None
+) -> int:
+    if names is not None and text.lower() in names:
+        return names.index(text.lower()) + low
+    if not text.isdigit() or not low <= int(text) <= high:
+        raise ValueError(f"{name} must be {low}-{high}, got {text!r}")
+    return int(text)
+
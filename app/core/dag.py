@@ -1,3 +1,20 @@
+import json
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from app import config
+from app.core.cron import CronExpression
+
+
+# Per-task limits and resource requests a definition may declare
+LIMIT_FIELDS = ("timeout", "cpus", "memory_mb")
+
+
 def validate_dag(definition: dict) -> list[str]:
     """Validate a workflow DAG definition. Returns a list of errors (empty = valid)."""
     errors = []
@@ -5,6 +22,17 @@ def validate_dag(definition: dict) -> list[str]:
     if "id" not in definition:
         errors.append("Workflow must have an 'id' field")
 
+    if definition.get("schedule") is not None:
+        if definition.get("schedule_interval") is not None:
+            errors.append(
+                "Workflow may have a 'schedule' or a 'schedule_interval', not both"
+            )
+        else:
+            try:
+                CronExpression(definition["schedule"])
+            except ValueError as e:
+                errors.append(f"Invalid schedule '{definition['schedule']}': {e}")
+
     if "tasks" not in definition:
         errors.append("Workflow must have a 'tasks' field")
         return errors
@@ -19,8 +47,16 @@ def validate_dag(definition: dict) -> list[str]:
         if "id" not in task:
             errors.append("Each task must have an 'id' field")
             continue
-        if "command" not in task:
-            errors.append(f"Task '{task['id']}' must have a 'command' field")
+        if ("command" in task) == ("callable" in task):
+            errors.append(
+                f"Task '{task['id']}' must have either a 'command' or a 'callable' field"
+            )
+        elif "callable" in task and not _is_callable_target(task["callable"]):
+            errors.append(
+                f"Task '{task['id']}' callable must name a 'package.module:function'"
+            )
+        if task.get("pool") is not None and task["pool"] not in config.POOLS:
+            errors.append(f"Task '{task['id']}' uses unknown pool '{task['pool']}'")
         if task["id"] in task_ids:
             errors.append(f"Duplicate task ID: '{task['id']}'")
         task_ids.add(task["id"])
@@ -34,30 +70,269 @@ def validate_dag(definition: dict) -> list[str]:
                     f"Task '{task['id']}' has unknown dependency: '{dep}'"
                 )
 
-    if not errors and _has_cycle(tasks):
+    if not errors and compile_dag(definition).topo_order is None:
         errors.append("Workflow contains a cycle")
 
     return errors
 
 
-def _has_cycle(tasks: list[dict]) -> bool:
-    """Detect cycles using DFS with three-color marking."""
-    adj = {t["id"]: t.get("dependencies", []) for t in tasks}
-    WHITE, GRAY, BLACK = 0, 1, 2
-    color = {tid: WHITE for tid in adj}
-
-    def dfs(node):
-        color[node] = GRAY
-        for neighbor in adj[node]:
-            if color[neighbor] == GRAY:
-                return True
-            if color[neighbor] == WHITE and dfs(neighbor):
-                return True
-        color[node] = BLACK
+def _is_callable_target(spec) -> bool:
+    target = spec.get("target") if isinstance(spec, dict) else None
+    if not isinstance(target, str):
         return False
+    module, _, attribute = target.partition(":")
+    return all(
+        name.isidentifier()
+        for name in (*module.split("."), *attribute.split("."))
+    )
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledDag:
+    """Immutable, index-based form of a workflow definition.
+
+    Tasks are numbered ``0..n-1`` in definition order. Downstream adjacency
+    is stored in CSR form: the children of task ``i`` are
+    ``down_targets[down_offsets[i]:down_offsets[i + 1]]``.
+    ``topo_order`` is None when the graph contains a cycle.
+
+    ``definition`` is the parsed workflow JSON; it is shared between all
+    users of the cache and must not be mutated.
+    """
+
+    workflow_id: str
+    version: int
+    definition: dict
+    task_ids: tuple[str, ...]
+    index: MappingProxyType
+    commands: tuple[str, ...]
+    # The callable spec of each Python task, None for shell commands
+    callables: tuple[dict | None, ...]
+    # Each task's declared timeout / cpus / memory_mb (only those it sets)
+    limits: tuple[dict, ...]
+    # Dispatch priority of the workflow, and of each task on top of it
+    priority: int
+    priorities: tuple[int, ...]
+    # Critical-path rank of each task with unit durations (see bottom_levels)
+    ranks: tuple[float, ...]
+    # The pool each task takes a slot of (None: no pool)
+    pools: tuple[str | None, ...]
+    # Per-workflow concurrency limits (None: unlimited)
+    max_active_runs: int | None
+    max_active_tasks: int | None
+    in_degree: array
+    down_offsets: array
+    down_targets: array
+    topo_order: tuple[int, ...] | None
+    nbytes: int
+
+    def __len__(self) -> int:
+        return len(self.task_ids)
+
+    def downstream(self, i: int) -> array:
+        return self.down_targets[self.down_offsets[i] : self.down_offsets[i + 1]]
+
+
+def compile_dag(
+    definition: dict, version: int = 0, source_size: int | None = None
+) -> CompiledDag:
+    """Compile a (structurally valid) definition into a ``CompiledDag``."""
+    tasks = definition["tasks"]
+    task_ids = tuple(t["id"] for t in tasks)
+    index = {tid: i for i, tid in enumerate(task_ids)}
+    n = len(task_ids)
+
+    in_degree = array("i", [0] * n)
+    children: list[list[int]] = [[] for _ in range(n)]
+    for i, task in enumerate(tasks):
+        for dep in task.get("dependencies", []):
+            children[index[dep]].append(i)
+            in_degree[i] += 1
+
+    down_offsets = array("i", [0] * (n + 1))
+    down_targets = array("i")
+    for i, kids in enumerate(children):
+        down_targets.extend(kids)
+        down_offsets[i + 1] = len(down_targets)
+
+    # Kahn's algorithm; leftover nodes mean the graph has a cycle
+    remaining = array("i", in_degree)
+    order = [i for i in range(n) if remaining[i] == 0]
+    for i in order:
+        for child in down_targets[down_offsets[i] : down_offsets[i + 1]]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                order.append(child)
+    topo_order = tuple(order) if len(order) == n else None
+
+    ranks = _bottom_levels(task_ids, topo_order, down_offsets, down_targets)
+
+    if source_size is None:
+        source_size = len(json.dumps(definition))
+    # Rough footprint: parsed JSON costs a few times its text size, plus
+    # the integer arrays themselves.
+    nbytes = (
+        3 * source_size
+        + sys.getsizeof(in_degree)
+        + sys.getsizeof(down_offsets)
+        + sys.getsizeof(down_targets)
+        + sys.getsizeof(ranks)
+    )
+
+    return CompiledDag(
+        workflow_id=definition.get("id", ""),
+        version=version,
+        definition=definition,
+        task_ids=task_ids,
+        index=MappingProxyType(index),
+        commands=tuple(t.get("command", "") for t in tasks),
+        callables=tuple(t.get("callable") for t in tasks),
+        limits=tuple(
+            {k: t[k] for k in LIMIT_FIELDS if t.get(k) is not None} for t in tasks
+        ),
+        priority=definition.get("priority", 0),
+        priorities=tuple(t.get("priority", 0) for t in tasks),
+        ranks=ranks,
+        pools=tuple(t.get("pool") for t in tasks),
+        max_active_runs=definition.get("max_active_runs"),
+        max_active_tasks=definition.get("max_active_tasks"),
+        in_degree=in_degree,
+        down_offsets=down_offsets,
+        down_targets=down_targets,
+        topo_order=topo_order,
+        nbytes=nbytes,
+    )
+
+
+def bottom_levels(
+    dag: CompiledDag, durations: dict[str, float] | None = None
+) -> tuple[float, ...]:
+    """Each task's bottom level: the longest path from its start to the end
+    of the DAG, counting its own duration.
+
+    Tasks with the highest rank are on the critical path; starting them
+    first shortens the makespan when more tasks are ready than there are
+    slots. ``durations`` maps task ids to seconds (e.g. historical means);
+    tasks without one count as the mean of the known ones, and with no
+    durations at all every task counts as 1. A cyclic DAG has all zeros.
+    """
+    return _bottom_levels(
+        dag.task_ids, dag.topo_order, dag.down_offsets, dag.down_targets, durations
+    )
+
+
+def _bottom_levels(
+    task_ids: tuple[str, ...],
+    topo_order: tuple[int, ...] | None,
+    down_offsets: array,
+    down_targets: array,
+    durations: dict[str, float] | None = None,
+) -> tuple[float, ...]:
+    if topo_order is None:
+        return (0.0,) * len(task_ids)
+    durations = durations or {}
+    known = [durations[t] for t in task_ids if t in durations]
+    default = sum(known) / len(known) if known else 1.0
+    rank = [0.0] * len(task_ids)
+    for i in reversed(topo_order):
+        children = down_targets[down_offsets[i] : down_offsets[i + 1]]
+        longest = max((rank[c] for c in children), default=0.0)
+        rank[i] = durations.get(task_ids[i], default) + longest
+    return tuple(rank)
+
+
+class DagCache:
+    """Thread-safe LRU cache of compiled DAGs keyed by workflow id.
+
+    Each entry remembers the workflow version it was compiled from; a
+    lookup with a different version recompiles, so updating a workflow
+    only requires bumping ``Workflow.version``. Entries are evicted least
+    recently used first once either bound is exceeded.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CompiledDag] = OrderedDict()
+        # workflow_id -> (version, computed at, ranks) from task durations
+        self._ranks: dict[str, tuple[int, float, tuple[float, ...]]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, workflow) -> CompiledDag:
+        """Return the compiled DAG for a ``Workflow`` row, compiling on a miss."""
+        with self._lock:
+            dag = self._entries.get(workflow.id)
+            if dag is not None and dag.version == workflow.version:
+                self._entries.move_to_end(workflow.id)
+                return dag
+
+        dag = compile_dag(
+            json.loads(workflow.definition),
+            version=workflow.version,
+            source_size=len(workflow.definition),
+        )
+        with self._lock:
+            self._store(workflow.id, dag)
+        return dag
+
+    def ranks(
+        self, dag: CompiledDag, load_durations, max_age: float
+    ) -> tuple[float, ...]:
+        """Critical-path ranks of a compiled DAG, weighted by task durations.
+
+        ``load_durations()`` returns the workflow's historical mean task
+        durations; it is called again (and the ranks recomputed) once the
+        ranks are ``max_age`` seconds old or the workflow version changed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._ranks.get(dag.workflow_id)
+        if (
+            cached is not None
+            and cached[0] == dag.version
+            and now - cached[1] < max_age
+        ):
+            return cached[2]
+        durations = load_durations()
+        ranks = bottom_levels(dag, durations) if durations else dag.ranks
+        with self._lock:
+            if dag.workflow_id in self._entries:
+                self._ranks[dag.workflow_id] = (dag.version, now, ranks)
+        return ranks
+
+    def invalidate(self, workflow_id: str):
+        with self._lock:
+            old = self._entries.pop(workflow_id, None)
+            self._ranks.pop(workflow_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ranks.clear()
+            self._bytes = 0
+
+    def _store(self, workflow_id: str, dag: CompiledDag):
+        current = self._entries.get(workflow_id)
+        if current is not None:
+            if current.version > dag.version:
+                # A concurrent caller already cached a newer version
+                return
+            self._bytes -= current.nbytes
+        self._entries[workflow_id] = dag
+        self._entries.move_to_end(workflow_id)
+        self._bytes += dag.nbytes
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            evicted_id, evicted = self._entries.popitem(last=False)
+            self._ranks.pop(evicted_id, None)
+            self._bytes -= evicted.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
-    for node in adj:
-        if color[node] == WHITE:
-            if dfs(node):
-                return True
-    return False
+dag_cache = DagCache(config.DAG_CACHE_MAX_ENTRIES, config.DAG_CACHE_MAX_BYTES)
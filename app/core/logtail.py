@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from collections import deque
+
+import httpx
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Largest range read from a worker in one request
+FETCH_BYTES = 1024 * 1024
+# Small appends are merged into the last buffered chunk up to this size
+_MERGE_BYTES = 64 * 1024
+
+
+class LogTail:
+    """One shared follower of a task's log file on its worker.
+
+    A single poller asks the worker only for the bytes past ``end``
+    (``Range: bytes=<end>-``) and keeps the latest ``buffer_bytes`` in
+    memory; every subscriber reads that buffer at its own offset. A
+    subscriber that starts (or falls) behind the buffer reads just the
+    missing range from the worker, so N tailers cost one poll per interval
+    rather than N reads of the file from the start. Only the API's event
+    loop touches a tail, so it needs no locking.
+    """
+
+    def __init__(
+        self, url: str, fetch, is_finished, poll_interval: float, buffer_bytes: int
+    ):
+        self.url = url
+        self._fetch = fetch
+        self._is_finished = is_finished
+        self.poll_interval = poll_interval
+        self.buffer_bytes = buffer_bytes
+        # (offset, data) of the buffered bytes, oldest first
+        self._chunks: deque[tuple[int, bytes]] = deque()
+        # Offset of the first buffered byte, and just past the last one read
+        self.start = 0
+        self.end = 0
+        self.finished = False
+        self.subscribers = 0
+        self._generation = 0
+        self._changed: asyncio.Event | None = None
+        self._poller: asyncio.Task | None = None
+
+    async def follow(self, offset: int = 0):
+        """Yield ``(offset, data)`` from ``offset`` on until the task is over."""
+        self.subscribers += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            while True:
+                since = self._generation
+                if offset < self.start:
+                    end = min(self.start, offset + FETCH_BYTES)
+                    data = await self._fetch(self.url, offset, end)
+                    if not data:
+                        # Gone from the worker too; continue with what we have
+                        offset = self.start
+                        continue
+                elif offset < self.end:
+                    data = self._read_buffer(offset)
+                elif self.finished:
+                    return
+                else:
+                    await self._wait(since)
+                    continue
+                yield offset, data
+                offset += len(data)
+        finally:
+            self.subscribers -= 1
+
+    async def _poll(self):
+        try:
+            while self.subscribers and not self.finished:
+                data = await self._fetch(self.url, self.end, self.end + FETCH_BYTES)
+                if data:
+                    self._append(data)
+                    if len(data) == FETCH_BYTES:
+                        continue
+                elif await self._is_finished():
+                    # Workers write the whole log before reporting the result,
+                    # so reading until empty now gets everything
+                    while data := await self._fetch(
+                        self.url, self.end, self.end + FETCH_BYTES
+                    ):
+                        self._append(data)
+                    self.finished = True
+                    self._notify()
+                    return
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logger.warning("Tailing %s failed: %s", self.url, e)
+            self.finished = True
+            self._notify()
+
+    def _append(self, data: bytes):
+        merge_below = min(_MERGE_BYTES, self.buffer_bytes // 16)
+        if self._chunks and len(self._chunks[-1][1]) < merge_below:
+            offset, last = self._chunks.pop()
+            self._chunks.append((offset, last + data))
+        else:
+            self._chunks.append((self.end, data))
+        self.end += len(data)
+        # Drop old chunks while the rest still fill the buffer
+        while (
+            len(self._chunks) > 1
+            and self.end - self._chunks[1][0] >= self.buffer_bytes
+        ):
+            self._chunks.popleft()
+        self.start = self._chunks[0][0]
+        self._notify()
+
+    def _read_buffer(self, offset: int) -> bytes:
+        parts = []
+        for chunk_offset, data in self._chunks:
+            if chunk_offset + len(data) > offset:
+                parts.append(data[max(0, offset - chunk_offset) :])
+        return b"".join(parts)
+
+    def _notify(self):
+        self._generation += 1
+        event, self._changed = self._changed, None
+        if event is not None:
+            event.set()
+
+    async def _wait(self, since: int):
+        if self._generation != since:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        await self._changed.wait()
+
+
+class LogTails:
+    """Live log tails shared by everyone following the same task attempt."""
+
+    def __init__(
+        self, poll_interval: float | None = None, buffer_bytes: int | None = None
+    ):
+        self.poll_interval = (
+            config.LOG_TAIL_POLL_INTERVAL if poll_interval is None else poll_interval
+        )
+        self.buffer_bytes = (
+            config.LOG_TAIL_BUFFER_BYTES if buffer_bytes is None else buffer_bytes
+        )
+        self._tails: dict[str, LogTail] = {}
+        self._client: httpx.AsyncClient | None = None
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    async def follow(self, key: str, url: str, is_finished, offset: int = 0):
+        """Yield ``(offset, data)`` of the log at ``url`` from ``offset``.
+
+        ``key`` identifies one attempt of a task; followers of the same key
+        share one poller and buffer. ``is_finished`` is an async callable
+        telling whether that attempt is over.
+        """
+        tail = self._tails.get(key)
+        if tail is None:
+            tail = self._tails[key] = LogTail(
+                url, self._fetch, is_finished, self.poll_interval, self.buffer_bytes
+            )
+        try:
+            async for item in tail.follow(offset):
+                yield item
+        finally:
+            if not tail.subscribers and self._tails.get(key) is tail:
+                del self._tails[key]
+
+    async def _fetch(self, url: str, start: int, end: int) -> bytes:
+        """Bytes ``[start, end)`` of a worker log; empty if none are there yet."""
+        try:
+            response = await self._http().get(
+                url, headers={"Range": f"bytes={start}-{end - 1}"}
+            )
+        except httpx.HTTPError as e:
+            logger.debug("Fetching %s failed: %s", url, e)
+            return b""
+        if response.status_code == 206:
+            return response.content
+        if response.status_code == 200:
+            # Server ignored the range
+            return response.content[start:end]
+        # 404: not started writing yet, 416: nothing past ``start``
+        return b""
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=config.DISPATCH_TIMEOUT)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
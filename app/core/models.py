@@ -3,10 +3,14 @@ from enum import Enum
 
 class TaskState(str, Enum):
     PENDING = "PENDING"
+    # Ready and waiting for a worker to claim it (pull dispatch mode)
+    QUEUED = "QUEUED"
     RUNNING = "RUNNING"
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
     RETRYING = "RETRYING"
+    # Never ran because a task it depends on failed for good
+    UPSTREAM_FAILED = "UPSTREAM_FAILED"
 
 
 class RunState(str, Enum):
@@ -0,0 +1,257 @@
+import random
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class WorkerState:
+    """What the master knows about one worker."""
+
+    url: str
+    worker_id: str | None = None
+    # Monotonic time of the last heartbeat; None for statically configured
+    # workers that never sent one (those are never expired)
+    last_seen: float | None = None
+    # Execution slots the worker reported (None until it has answered once)
+    slots: int | None = None
+    # Free slots from the worker's latest load report
+    free_slots: int | None = None
+    # Tasks the master has placed on the worker that are still RUNNING
+    in_flight: int = 0
+    # Cores and memory (MB) the worker reported (None: not known, no limit)
+    cpus: float | None = None
+    memory_mb: int | None = None
+    # What the in-flight tasks requested of them
+    reserved_cpus: float = 0.0
+    reserved_memory_mb: int = 0
+    # Monotonic time until which the worker is skipped after saying "busy"
+    busy_until: float = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.slots or 1)
+
+    @property
+    def utilisation(self) -> float:
+        return self.in_flight / self.capacity
+
+    def fits(self, cpus: float, memory_mb: int) -> bool:
+        return fits(
+            cpus,
+            memory_mb,
+            None if self.cpus is None else self.cpus - self.reserved_cpus,
+            None if self.memory_mb is None else self.memory_mb - self.reserved_memory_mb,
+            idle=not (self.reserved_cpus or self.reserved_memory_mb),
+        )
+
+
+def fits(
+    cpus: float,
+    memory_mb: int,
+    free_cpus: float | None,
+    free_memory_mb: int | None,
+    idle: bool,
+) -> bool:
+    """Whether a task's requested cores and memory fit what a worker has free.
+
+    Unknown capacity (None) never blocks. A task asking for more than a
+    whole worker still runs on an idle one (nothing else reserved there),
+    rather than never.
+    """
+    if idle:
+        return True
+    return (free_cpus is None or cpus <= free_cpus + 1e-9) and (
+        free_memory_mb is None or memory_mb <= free_memory_mb
+    )
+
+
+def round_robin(candidates: list[WorkerState], registry: "WorkerRegistry") -> WorkerState:
+    worker = candidates[registry.rotation % len(candidates)]
+    registry.rotation += 1
+    return worker
+
+
+def least_loaded(candidates: list[WorkerState], registry: "WorkerRegistry") -> WorkerState:
+    return min(candidates, key=lambda w: w.in_flight)
+
+
+def power_of_two(candidates: list[WorkerState], registry: "WorkerRegistry") -> WorkerState:
+    """Sample two workers at random and keep the less utilised one."""
+    if len(candidates) < 2:
+        return candidates[0]
+    a, b = registry.rng.sample(candidates, 2)
+    return a if a.utilisation <= b.utilisation else b
+
+
+def weighted(candidates: list[WorkerState], registry: "WorkerRegistry") -> WorkerState:
+    """Lowest in-flight tasks per slot, so bigger workers take more work."""
+    return min(candidates, key=lambda w: (w.utilisation, -w.capacity))
+
+
+STRATEGIES = {
+    "round_robin": round_robin,
+    "least_loaded": least_loaded,
+    "power_of_two": power_of_two,
+    "weighted": weighted,
+}
+
+
+class WorkerRegistry:
+    """Tracks per-worker load and places tasks with a pluggable strategy.
+
+    In-flight counts come from the master's own bookkeeping: every task
+    placed with ``assign`` counts against its worker until ``release``
+    (result arrived, dispatch reverted). ``update_load`` records the
+    capacity the worker reports with each dispatch response. Membership
+    is live: ``heartbeat`` adds or refreshes a worker, ``expire`` drops
+    the ones whose heartbeats stopped.
+
+    The registry is not locked: only code on the scheduler's event loop
+    may use it (API handlers read it from ``async`` routes). Other threads
+    may only read ``members``, a frozen set of the member URLs that is
+    replaced, never changed, when membership changes.
+    """
+
+    def __init__(self, urls: list[str], strategy: str = "least_loaded", seed=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown placement strategy {strategy!r} "
+                f"(expected one of {', '.join(STRATEGIES)})"
+            )
+        self.strategy = strategy
+        self._choose = STRATEGIES[strategy]
+        self.workers: dict[str, WorkerState] = {url: WorkerState(url) for url in urls}
+        self.members: frozenset[str] = frozenset(self.workers)
+        # task instance id -> (worker url, cpus, memory_mb), for tasks
+        # counted in ``in_flight`` and the reservations
+        self._placed: dict[str, tuple[str, float, int]] = {}
+        self.rotation = 0
+        self.rng = random.Random(seed)
+
+    @property
+    def urls(self) -> list[str]:
+        return list(self.workers)
+
+    def pick(
+        self, now: float | None = None, cpus: float = 0.0, memory_mb: int = 0
+    ) -> str | None:
+        """Choose a worker for one task, or None if every worker is busy.
+
+        Only workers with ``cpus`` cores and ``memory_mb`` MB unreserved are
+        candidates, so heavy tasks never pile onto one worker.
+        """
+        now = time.monotonic() if now is None else now
+        candidates = [
+            w
+            for w in self.workers.values()
+            if w.busy_until <= now and w.fits(cpus, memory_mb)
+        ]
+        if not candidates:
+            return None
+        return self._choose(candidates, self).url
+
+    def heartbeat(
+        self, url: str, worker_id: str | None, load: dict | None, now: float
+    ) -> bool:
+        """Record a heartbeat; returns True if the worker just joined."""
+        worker = self.workers.get(url)
+        joined = worker is None
+        if joined:
+            # Tasks it still runs from before (e.g. a master restart) count
+            worker = self.workers[url] = WorkerState(url)
+            self.members = frozenset(self.workers)
+            for placed_url, cpus, memory_mb in self._placed.values():
+                if placed_url == url:
+                    self._reserve(worker, 1, cpus, memory_mb)
+        worker.worker_id = worker_id or worker.worker_id
+        worker.last_seen = now
+        self.update_load(url, load)
+        return joined
+
+    def remove(self, url: str) -> WorkerState | None:
+        """Stop placing tasks on a worker; returns it if it was a member."""
+        worker = self.workers.pop(url, None)
+        if worker is not None:
+            self.members = frozenset(self.workers)
+        return worker
+
+    def expire(self, deadline: float) -> list[WorkerState]:
+        """Remove workers whose last heartbeat is older than ``deadline``."""
+        stale = [
+            w
+            for w in self.workers.values()
+            if w.last_seen is not None and w.last_seen < deadline
+        ]
+        for worker in stale:
+            self.remove(worker.url)
+        return stale
+
+    def assign(
+        self, task_instance_id: str, url: str, cpus: float = 0.0, memory_mb: int = 0
+    ):
+        """Count a task, and the cores and memory it requested, against
+        ``url`` (idempotent per task).
+
+        Placements on workers that are not members (yet) are remembered and
+        counted once the worker joins.
+        """
+        previous = self._placed.get(task_instance_id)
+        if previous is not None and previous[0] == url:
+            return
+        if previous is not None:
+            self.release(task_instance_id)
+        self._placed[task_instance_id] = (url, cpus, memory_mb)
+        worker = self.workers.get(url)
+        if worker is not None:
+            self._reserve(worker, 1, cpus, memory_mb)
+
+    def release(self, task_instance_id: str):
+        placed = self._placed.pop(task_instance_id, None)
+        worker = self.workers.get(placed[0]) if placed else None
+        if worker is not None and worker.in_flight > 0:
+            self._reserve(worker, -1, -placed[1], -placed[2])
+
+    @staticmethod
+    def _reserve(worker: WorkerState, tasks: int, cpus: float, memory_mb: int):
+        worker.in_flight += tasks
+        worker.reserved_cpus += cpus
+        worker.reserved_memory_mb += memory_mb
+        if not worker.in_flight:
+            # No float drift once idle
+            worker.reserved_cpus = 0.0
+            worker.reserved_memory_mb = 0
+
+    def update_load(self, url: str, load: dict | None):
+        worker = self.workers.get(url)
+        if worker is None or not load:
+            return
+        worker.slots = load.get("slots", worker.slots)
+        worker.free_slots = load.get("free_slots", worker.free_slots)
+        worker.cpus = load.get("cpus", worker.cpus)
+        worker.memory_mb = load.get("memory_mb", worker.memory_mb)
+
+    def mark_busy(self, url: str, until: float):
+        worker = self.workers.get(url)
+        if worker is not None:
+            worker.busy_until = until
+
+    def snapshot(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": w.url,
+                "worker_id": w.worker_id,
+                "last_seen_seconds_ago": (
+                    None if w.last_seen is None else round(now - w.last_seen, 3)
+                ),
+                "busy": w.busy_until > now,
+                "slots": w.slots,
+                "free_slots": w.free_slots,
+                "in_flight": w.in_flight,
+                "cpus": w.cpus,
+                "memory_mb": w.memory_mb,
+                "reserved_cpus": round(w.reserved_cpus, 3),
+                "reserved_memory_mb": w.reserved_memory_mb,
+            }
+            for w in list(self.workers.values())
+        ]
@@ -0,0 +1,313 @@
+import heapq
+import itertools
+from array import array
+from collections import deque
+
+from app.core.concurrency import ACTIVE_STATES, ConcurrencyLimits
+from app.core.dag import CompiledDag
+from app.core.models import TaskState
+
+# States a task ends in; a run whose tasks all are in them is finished
+TERMINAL_STATES = frozenset(
+    (TaskState.SUCCESS, TaskState.FAILED, TaskState.UPSTREAM_FAILED)
+)
+
+
+class RunReadiness:
+    """In-memory readiness tracking for one active workflow run.
+
+    Holds, per task index of the run's ``CompiledDag``, the number of
+    upstream dependencies that have not yet succeeded, plus a queue of
+    PENDING tasks whose counter reached zero. State changes are applied
+    with ``mark`` so that a scheduling pass only looks at tasks that just
+    became runnable instead of rescanning the run.
+
+    A task that failed for good moves its PENDING downstream tasks to
+    UPSTREAM_FAILED here, so the run can finish; the scheduler persists
+    them from ``pop_upstream_failed``.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        dag: CompiledDag,
+        instances: list,
+        ranks: tuple[float, ...] | None = None,
+        limits: ConcurrencyLimits | None = None,
+    ):
+        self.run_id = run_id
+        self.dag = dag
+        # Critical-path rank of each task (default: with unit durations)
+        self.ranks = dag.ranks if ranks is None else ranks
+        # Told about every task entering or leaving an active state
+        self.limits = limits
+        # Set once the scheduler stops tracking the run
+        self.closed = False
+        n = len(dag)
+        self.status: list[str] = [TaskState.PENDING] * n
+        self.instance_ids: list[str | None] = [None] * n
+        for ti in instances:
+            i = dag.index[ti.task_id]
+            self.status[i] = ti.status
+            self.instance_ids[i] = ti.id
+
+        self.waiting_on = array("i", dag.in_degree)
+        for i in range(n):
+            if self.status[i] == TaskState.SUCCESS:
+                for child in dag.downstream(i):
+                    self.waiting_on[child] -= 1
+
+        self.terminal = sum(1 for s in self.status if s in TERMINAL_STATES)
+        # Tasks moved to UPSTREAM_FAILED that are not yet written back
+        self._upstream_failed: list[int] = []
+        for i, status in enumerate(self.status):
+            if status in (TaskState.FAILED, TaskState.UPSTREAM_FAILED):
+                self._fail_downstream(i)
+        if limits is not None:
+            for i, status in enumerate(self.status):
+                if status in ACTIVE_STATES:
+                    limits.change(dag, i, 1)
+        self._ready: deque[int] = deque()
+        self._queued: set[int] = set()
+        for i, status in enumerate(self.status):
+            if status == TaskState.PENDING and self.waiting_on[i] == 0:
+                self._enqueue(i)
+
+    def _enqueue(self, i: int):
+        if i not in self._queued:
+            self._queued.add(i)
+            self._ready.append(i)
+
+    @property
+    def has_work(self) -> bool:
+        return bool(self._ready)
+
+    @property
+    def finished(self) -> bool:
+        """Whether every task succeeded, failed for good or can never run."""
+        return self.terminal == len(self.dag)
+
+    @property
+    def started(self) -> bool:
+        """Whether any task has left PENDING."""
+        return any(s != TaskState.PENDING for s in self.status)
+
+    def mark(self, i: int, status: str):
+        """Apply a state transition for task index ``i`` and update the counters."""
+        previous = self.status[i]
+        if previous == status:
+            return
+        self.status[i] = status
+
+        if previous == TaskState.SUCCESS:
+            # Should not happen, but keep the counters honest if it does
+            for child in self.dag.downstream(i):
+                self.waiting_on[child] += 1
+        self.terminal += (status in TERMINAL_STATES) - (previous in TERMINAL_STATES)
+        active = (status in ACTIVE_STATES) - (previous in ACTIVE_STATES)
+        if active and self.limits is not None:
+            self.limits.change(self.dag, i, active)
+
+        if status == TaskState.SUCCESS:
+            for child in self.dag.downstream(i):
+                self.waiting_on[child] -= 1
+                if (
+                    self.waiting_on[child] == 0
+                    and self.status[child] == TaskState.PENDING
+                ):
+                    self._enqueue(child)
+        elif status == TaskState.PENDING and self.waiting_on[i] == 0:
+            self._enqueue(i)
+        elif status == TaskState.FAILED:
+            self._fail_downstream(i)
+
+    def _fail_downstream(self, i: int):
+        """Move every PENDING task downstream of task ``i`` to UPSTREAM_FAILED."""
+        stack = [i]
+        while stack:
+            for child in self.dag.downstream(stack.pop()):
+                if self.status[child] == TaskState.PENDING:
+                    self.status[child] = TaskState.UPSTREAM_FAILED
+                    self.terminal += 1
+                    self._upstream_failed.append(child)
+                    stack.append(child)
+
+    def pop_upstream_failed(self) -> list[int]:
+        """Drain and return the tasks moved to UPSTREAM_FAILED since last asked."""
+        blocked, self._upstream_failed = self._upstream_failed, []
+        return blocked
+
+    def requeue(self, i: int):
+        """Put a popped-but-not-dispatched PENDING task back in the ready queue."""
+        self._enqueue(i)
+
+    def pop_ready(self) -> list[int]:
+        """Drain and return the indices of the tasks that are currently runnable."""
+        ready = []
+        while self._ready:
+            i = self._ready.popleft()
+            self._queued.discard(i)
+            if self.status[i] == TaskState.PENDING and self.waiting_on[i] == 0:
+                ready.append(i)
+        return ready
+
+
+class ReadyQueue:
+    """The runnable tasks of every active run, in the order to dispatch them.
+
+    Higher priority (the workflow's plus the task's) always goes first.
+    Among equal priorities, workflows share dispatches fairly (start-time
+    fair queuing): each workflow's virtual time counts the tasks dispatched
+    for it, and the one furthest behind goes next. A workflow that had
+    nothing queued rejoins at the current virtual time, so it gets its share
+    from then on rather than a burst for the time it was idle; a small run
+    triggered while a huge one is queued is served alongside it instead of
+    after it. Within a run, tasks go by priority, then critical-path rank
+    (longest remaining path first), then definition order.
+
+    The heap holds one entry per run that has queued tasks, keyed on its
+    best task, so ``push`` and ``pop`` cost O(log runs + log tasks).
+    """
+
+    def __init__(self):
+        # run_id -> its queued tasks
+        self._runs: dict[str, _QueuedRun] = {}
+        # (-priority, virtual time, run order, run_id); entries whose key is
+        # no longer the run's current one are skipped when popped
+        self._heap: list[tuple] = []
+        # workflow_id -> virtual time, and how many of its tasks are queued
+        self._vtime: dict[str, int] = {}
+        self._waiting: dict[str, int] = {}
+        self._clock = 0
+        self._order = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, readiness: RunReadiness, i: int):
+        """Queue task ``i`` of a run (once; pushing it again does nothing)."""
+        run = self._runs.get(readiness.run_id)
+        if run is None:
+            run = self._runs[readiness.run_id] = _QueuedRun(
+                readiness, next(self._order)
+            )
+        if i in run.members:
+            return
+        workflow_id = readiness.dag.workflow_id
+        if not self._waiting.get(workflow_id):
+            self._vtime[workflow_id] = max(
+                self._vtime.get(workflow_id, 0), self._clock
+            )
+        self._waiting[workflow_id] = self._waiting.get(workflow_id, 0) + 1
+        run.members.add(i)
+        heapq.heappush(
+            run.tasks, (-readiness.dag.priorities[i], -readiness.ranks[i], i)
+        )
+        self._size += 1
+        self._schedule(run)
+
+    def pop(self) -> tuple[RunReadiness, int] | None:
+        """Take the next task to dispatch, or None if nothing is queued.
+
+        Tasks that stopped being runnable while queued are dropped.
+        """
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            run = self._runs.get(entry[-1])
+            if run is None or entry[:-1] != run.key:
+                continue
+            key = self._key(run)
+            if key != run.key:
+                # Its workflow was served through another run meanwhile
+                run.key = key
+                heapq.heappush(self._heap, (*key, entry[-1]))
+                continue
+            i = heapq.heappop(run.tasks)[-1]
+            self._remove(run, i)
+            readiness = run.readiness
+            if (
+                readiness.closed
+                or readiness.status[i] != TaskState.PENDING
+                or readiness.waiting_on[i]
+            ):
+                continue
+            workflow_id = readiness.dag.workflow_id
+            self._clock = self._vtime[workflow_id]
+            self._vtime[workflow_id] += 1
+            return readiness, i
+        return None
+
+    def requeue(self, readiness: RunReadiness, i: int):
+        """Put back a popped task that could not be dispatched, undoing its
+        charge to the workflow's share."""
+        self.refund(readiness)
+        self.push(readiness, i)
+
+    def refund(self, readiness: RunReadiness):
+        """Undo the share charged for a popped task that was not dispatched.
+
+        The pop also moved the clock to the workflow's virtual time, which
+        would make workflows that join later start from a charge nobody
+        incurred. So the clock is lowered to the least virtual time of the
+        workflows still queued (and this one), costing O(queued workflows).
+        """
+        workflow_id = readiness.dag.workflow_id
+        self._vtime[workflow_id] -= 1
+        self._clock = min(
+            self._clock,
+            self._vtime[workflow_id],
+            *(self._vtime[w] for w in self._waiting),
+        )
+
+    def discard(self, run_id: str):
+        """Drop every queued task of a run (it finished or was removed)."""
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        workflow_id = run.readiness.dag.workflow_id
+        self._size -= len(run.members)
+        self._waiting[workflow_id] -= len(run.members)
+        if not self._waiting[workflow_id]:
+            del self._waiting[workflow_id]
+
+    def _remove(self, run: "_QueuedRun", i: int):
+        run.members.discard(i)
+        self._size -= 1
+        workflow_id = run.readiness.dag.workflow_id
+        self._waiting[workflow_id] -= 1
+        if not self._waiting[workflow_id]:
+            del self._waiting[workflow_id]
+        run.key = None
+        if run.members:
+            self._schedule(run)
+        else:
+            del self._runs[run.readiness.run_id]
+
+    def _key(self, run: "_QueuedRun") -> tuple:
+        dag = run.readiness.dag
+        return (
+            run.tasks[0][0] - dag.priority,
+            self._vtime[dag.workflow_id],
+            run.order,
+        )
+
+    def _schedule(self, run: "_QueuedRun"):
+        key = self._key(run)
+        if run.key is None or key < run.key:
+            run.key = key
+            heapq.heappush(self._heap, (*key, run.readiness.run_id))
+
+
+class _QueuedRun:
+    __slots__ = ("readiness", "order", "tasks", "members", "key")
+
+    def __init__(self, readiness: RunReadiness, order: int):
+        self.readiness = readiness
+        # Runs triggered earlier win ties
+        self.order = order
+        # (-task priority, -rank, task index)
+        self.tasks: list[tuple[int, float, int]] = []
+        self.members: set[int] = set()
+        # The key of the run's live heap entry
+        self.key: tuple | None = None
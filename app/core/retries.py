@@ -0,0 +1,107 @@
+import heapq
+import itertools
+import random
+from datetime import datetime, timedelta
+
+from app import config
+from app.core.models import TaskState
+
+# Per-task retry policy fields a definition may declare (None: config default)
+RETRY_FIELDS = ("retry_delay", "retry_backoff", "max_retry_delay")
+
+
+def retry_delay(
+    retries_used: int,
+    delay: float | None = None,
+    backoff: float | None = None,
+    max_delay: float | None = None,
+    rng: random.Random | None = None,
+) -> float:
+    """Seconds to wait before retrying a task that used ``retries_used`` retries.
+
+    ``delay * backoff ** retries_used``, capped at ``max_delay``, minus a
+    random part of up to RETRY_JITTER of it, so tasks that failed together
+    (on the same outage, say) do not all come back at the same moment.
+    Policy fields left as None take RETRY_DELAY, RETRY_BACKOFF and
+    RETRY_MAX_DELAY.
+    """
+    delay = config.RETRY_DELAY if delay is None else delay
+    backoff = config.RETRY_BACKOFF if backoff is None else backoff
+    max_delay = config.RETRY_MAX_DELAY if max_delay is None else max_delay
+    try:
+        seconds = delay * backoff ** max(0, retries_used)
+    except OverflowError:
+        seconds = max_delay
+    seconds = min(seconds, max_delay)
+    jitter = min(max(config.RETRY_JITTER, 0.0), 1.0)
+    return seconds * (1 - jitter * (rng or random).random())
+
+
+def retry_at(task, now: datetime) -> str:
+    """When a failed ``task`` (a TaskInstance with retries left) may run
+    again, as the ISO timestamp stored in its ``not_before``."""
+    seconds = retry_delay(
+        task.max_retries - task.retries_left,
+        *(getattr(task, field) for field in RETRY_FIELDS),
+    )
+    return (now + timedelta(seconds=seconds)).isoformat()
+
+
+class RetryTimers:
+    """RETRYING tasks by the time their retry is due.
+
+    A heap of ``(due, seq, readiness, index)`` keyed on each task's
+    ``not_before``, so the scheduler only ever looks at the retries that
+    are due instead of rescanning every task waiting out its backoff. The
+    timers are rebuilt from the RETRYING rows when a run is loaded, which
+    is what carries them across master restarts. Pushing a task again
+    replaces its timer; replaced timers, and tasks that moved on or whose
+    run was dropped, are skipped when they come up.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple] = []
+        # (run_id, index) -> seq of its current timer
+        self._current: dict[tuple[str, int], int] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def push(self, readiness, i: int, not_before: str | None):
+        """Time task ``i`` of a run to retry at ``not_before`` (None: now)."""
+        due = datetime.fromisoformat(not_before).timestamp() if not_before else 0.0
+        seq = next(self._seq)
+        self._current[(readiness.run_id, i)] = seq
+        heapq.heappush(self._heap, (due, seq, readiness, i))
+
+    def next_due(self) -> float | None:
+        """Epoch seconds of the earliest pending retry, if any."""
+        while self._heap and not self._live(self._heap[0]):
+            self._pop()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[tuple]:
+        """The tasks whose retry is due at ``now``, as (readiness, index)."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            live = self._live(self._heap[0])
+            _, _, readiness, i = self._pop()
+            if live:
+                due.append((readiness, i))
+        return due
+
+    def _pop(self) -> tuple:
+        entry = heapq.heappop(self._heap)
+        _, seq, readiness, i = entry
+        if self._current.get((readiness.run_id, i)) == seq:
+            del self._current[(readiness.run_id, i)]
+        return entry
+
+    def _live(self, entry: tuple) -> bool:
+        _, seq, readiness, i = entry
+        return (
+            self._current.get((readiness.run_id, i)) == seq
+            and not readiness.closed
+            and readiness.status[i] == TaskState.RETRYING
+        )
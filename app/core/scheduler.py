@@ -1,134 +1,742 @@
 import asyncio
-import json
+import heapq
 import logging
-from datetime import datetime, timezone
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
 
 import httpx
 
 from app import config
-from app.core.models import TaskState
+from app.core.concurrency import ConcurrencyLimits
+from app.core.dag import dag_cache
+from app.core.models import RunState, TaskState
+from app.core.placement import WorkerRegistry
+from app.core.readiness import ReadyQueue, RunReadiness
+from app.core.retries import RetryTimers
 from app.db import repository
 from app.db.database import SessionLocal
 
 logger = logging.getLogger(__name__)
 
+# Per-task outcomes of a dispatch request
+ACCEPTED = "accepted"
+BUSY = "busy"
+REJECTED = "rejected"
+FAILED = "failed"
+# The request went out but no answer came back: the worker may be running it
+UNKNOWN = "unknown"
+# Why a worker rejects a task it is running already (e.g. a re-dispatch
+# after its lease ran out); it reports that copy's result as this attempt's
+_ALREADY_RUNNING = "already running"
+
+# Consecutive failed /health probes before a static worker counts as lost
+PROBE_FAILURES_BEFORE_LOST = 2
+
+
+def task_payload(
+    task_instance_id: str,
+    task_id: str,
+    command: str,
+    spec: dict | None = None,
+    limits: dict | None = None,
+    attempt: str | None = None,
+) -> dict:
+    """What a worker needs to run one task and report its result.
+
+    ``spec`` is the task's Python callable, for callable tasks; ``limits``
+    its declared timeout / cpus / memory_mb. ``attempt`` identifies this
+    attempt (its ``started_at``); the worker echoes it with the result so
+    a late result of an earlier attempt is not applied to this one.
+    """
+    payload = {
+        "task_instance_id": task_instance_id,
+        "task_id": task_id,
+        "command": command,
+        "callback_url": f"{config.MASTER_URL}/internal/task-result",
+        "results_url": f"{config.MASTER_URL}/internal/task-results",
+    }
+    if spec is not None:
+        payload["callable"] = spec
+    if limits:
+        payload.update(limits)
+    if attempt is not None:
+        payload["attempt"] = attempt
+    return payload
+
+
+def _already_running(answer: dict) -> bool:
+    """Whether a worker's rejection (a 409 body or a batch result) says the
+    task is running there already, which counts as accepted."""
+    return answer.get("detail", answer.get("reason")) == _ALREADY_RUNNING
+
+
+def _requests(limits: dict) -> tuple[float, int]:
+    """The cores and memory a task reserves on its worker."""
+    return limits.get("cpus", 0.0), limits.get("memory_mb", 0)
+
+
+def lease_expiry() -> str:
+    """When a lease taken or renewed now runs out."""
+    expires = datetime.now(timezone.utc) + timedelta(seconds=config.TASK_LEASE_SECONDS)
+    return expires.isoformat()
+
 
 class Scheduler:
     def __init__(self):
-        self.worker_urls = [
-            f"http://127.0.0.1:{port}" for port in config.WORKER_PORTS
-        ]
-        self._worker_index = 0
+        self.workers = WorkerRegistry(
+            [f"http://127.0.0.1:{port}" for port in config.WORKER_PORTS],
+            strategy=config.WORKER_PLACEMENT,
+        )
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
 
-    def _next_worker_url(self) -> str | None:
-        if not self.worker_urls:
-            return None
-        url = self.worker_urls[self._worker_index % len(self.worker_urls)]
-        self._worker_index += 1
-        return url
+        # run_id -> readiness tracker for every RUNNING run we know about
+        self._runs: dict[str, RunReadiness] = {}
+        # Runs with ready tasks that the next tick must look at
+        self._dirty: set[str] = set()
+        # RETRYING tasks of all runs, by when their retry is due
+        self._retries = RetryTimers()
+        # Runnable tasks of all runs, in priority / fair-share order
+        self._ready = ReadyQueue()
+        # Pool, per-workflow and overall slots of QUEUED / RUNNING tasks
+        self.limits = ConcurrencyLimits(config.POOLS, config.MAX_RUNNING_TASKS)
+        # Runs whose tasks may be dispatched: per workflow, at most its
+        # max_active_runs; the rest wait, oldest first
+        self._admitted: set[str] = set()
+        self._active_runs: Counter = Counter()
+        self._waiting_runs: dict[str, list[tuple[str, str, RunReadiness]]] = {}
+        # State changes reported by the API; drained by the scheduler loop so
+        # that readiness trackers are only ever mutated from one thread.
+        self._events: deque[tuple] = deque()
+        self._last_resync = float("-inf")
+
+        # Long-lived pooled HTTP client (created on first use, inside the
+        # scheduler's event loop) and the cap on in-flight dispatch requests
+        self._client: httpx.AsyncClient | None = None
+        self._dispatch_slots = asyncio.Semaphore(config.DISPATCH_CONCURRENCY)
+        # Background send batches, so a slow worker never blocks a tick
+        self._inflight: set[asyncio.Task] = set()
+        # Pull mode: bumped (and the event set, then replaced) whenever tasks
+        # become claimable, to wake long-polling claim requests
+        self.work_generation = 0
+        self._work_available: asyncio.Event | None = None
+        # worker url -> consecutive failed /health probes
+        self._probe_failures: dict[str, int] = {}
+
+    @property
+    def worker_urls(self) -> list[str]:
+        return self.workers.urls
+
+    def _mark_busy(self, worker_url: str):
+        """Skip a worker that reported it is at capacity for a short cooldown."""
+        self.workers.mark_busy(
+            worker_url, time.monotonic() + config.WORKER_BUSY_COOLDOWN
+        )
+        if self._loop is not None:
+            self._loop.call_later(config.WORKER_BUSY_COOLDOWN, self.wake)
+
+    def wake(self):
+        """Ask the scheduler to run a tick as soon as possible.
+
+        Safe to call from any thread (sync FastAPI handlers run in a
+        threadpool). Wakeups that arrive while a tick is in progress are
+        coalesced into a single follow-up tick.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    def run_created(self, run_id: str):
+        """Record that a new run was triggered and wake the scheduler."""
+        self._events.append(("run", run_id))
+        self.wake()
+
+    def task_state_changed(
+        self, run_id: str, task_id: str, status: str, not_before: str | None = None
+    ):
+        """Record a task transition made outside the scheduler and wake it.
+
+        ``not_before`` is when a RETRYING task's retry is due.
+        """
+        self._events.append(("task", run_id, task_id, status, not_before))
+        self.wake()
+
+    def worker_heartbeat(self, url: str, worker_id: str | None, load: dict | None):
+        """Record a worker heartbeat; a worker that just joined wakes the loop."""
+        self._events.append(("heartbeat", url, worker_id, load, time.monotonic()))
+        if url not in self.workers.members:
+            self.wake()
+
+    def worker_left(self, url: str):
+        """Record that a worker shut down (it deregistered itself)."""
+        self._events.append(("left", url))
+        self.wake()
 
     async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
         logger.info(
-            "Scheduler started (interval: %ss, workers: %s)",
+            "Scheduler started (safety-net interval: %ss, workers: %s, placement: %s)",
             config.SCHEDULER_INTERVAL,
             self.worker_urls,
+            self.workers.strategy,
         )
-        while True:
-            try:
-                await self._tick()
-            except Exception as e:
-                logger.error("Scheduler tick error: %s", e)
-            await asyncio.sleep(config.SCHEDULER_INTERVAL)
+        try:
+            while True:
+                # Clear before ticking so that wakeups raised during the tick
+                # trigger another pass instead of being lost.
+                self._wakeup.clear()
+                try:
+                    await self._tick()
+                except Exception as e:
+                    logger.error("Scheduler tick error: %s", e)
+                await self._wait_for_wakeup()
+        finally:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+    async def _wait_for_wakeup(self):
+        """Sleep until woken, until the next retry is due, or until the
+        periodic safety-net tick is due."""
+        timeout = config.SCHEDULER_INTERVAL
+        due = self._retries.next_due()
+        if due is not None:
+            timeout = min(timeout, max(0.0, due - time.time()))
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
 
     async def _tick(self):
         db = SessionLocal()
         try:
-            active_runs = repository.get_active_runs(db)
-            for run in active_runs:
-                await self._process_run(db, run)
+            if time.monotonic() - self._last_resync >= config.SCHEDULER_INTERVAL:
+                self._resync(db)
+            self._apply_events(db)
+            self._expire_workers(db)
+            self._requeue_due_retries(db)
+            dirty, self._dirty = self._dirty, set()
+            runs = [self._runs[r] for r in dirty if r in self._runs]
+            self._dispatch_ready(db, runs)
         finally:
             db.close()
 
-    async def _process_run(self, db, run):
-        tasks = repository.get_task_instances(db, run.id)
-        workflow = repository.get_workflow(db, run.workflow_id)
-        definition = json.loads(workflow.definition)
-        dep_map = {
-            t["id"]: t.get("dependencies", []) for t in definition["tasks"]
-        }
-
-        # Build a mutable status map
-        task_status = {t.task_id: t.status for t in tasks}
-
-        # Move RETRYING tasks back to PENDING (with decremented retries)
-        for task in tasks:
-            if task.status == TaskState.RETRYING:
-                repository.update_task_status(
-                    db,
-                    task.id,
-                    TaskState.PENDING,
-                    retries_left=task.retries_left - 1,
-                    started_at=None,
-                    finished_at=None,
+    def _load_run(self, db, run_id: str) -> RunReadiness | None:
+        """Build the readiness tracker for ``run_id`` from the database."""
+        run = repository.get_run(db, run_id)
+        if run is None or run.status != RunState.RUNNING:
+            return None
+        dag = dag_cache.get(repository.get_workflow(db, run.workflow_id))
+        ranks = dag_cache.ranks(
+            dag,
+            lambda: repository.task_durations(
+                db, run.workflow_id, config.RANK_HISTORY_RUNS
+            ),
+            config.RANK_REFRESH_INTERVAL,
+        )
+        instances = repository.get_task_instances(db, run_id)
+        readiness = RunReadiness(run_id, dag, instances, ranks, self.limits)
+        self._fail_downstream(db, readiness)
+        if readiness.finished:
+            # Its last tasks were blocked by a failure just written back
+            return None
+        for ti in instances:
+            if ti.status == TaskState.RUNNING and ti.worker_id:
+                self.workers.assign(
+                    ti.id, ti.worker_id, *_requests(dag.limits[dag.index[ti.task_id]])
                 )
-                task_status[task.task_id] = TaskState.PENDING
+            elif ti.status == TaskState.RETRYING:
+                # After a restart this is what brings the backoff timers back
+                self._retries.push(readiness, dag.index[ti.task_id], ti.not_before)
+        self._runs[run_id] = readiness
+        self._admit(readiness, run.started_at)
+        return readiness
+
+    def _admit(self, readiness: RunReadiness, started_at: str):
+        """Let a run dispatch now, or queue it behind its workflow's
+        max_active_runs (a run that already started always goes ahead)."""
+        workflow_id = readiness.dag.workflow_id
+        limit = readiness.dag.max_active_runs
+        if (
+            limit is not None
+            and not readiness.started
+            and self._active_runs[workflow_id] >= limit
+        ):
+            heapq.heappush(
+                self._waiting_runs.setdefault(workflow_id, []),
+                (started_at, readiness.run_id, readiness),
+            )
+            return
+        self._admitted.add(readiness.run_id)
+        self._active_runs[workflow_id] += 1
+        if readiness.has_work:
+            self._dirty.add(readiness.run_id)
+
+    def _run_done(self, readiness: RunReadiness):
+        """A run finished or was dropped: admit the next waiting run(s)."""
+        if readiness.run_id not in self._admitted:
+            return
+        self._admitted.discard(readiness.run_id)
+        workflow_id = readiness.dag.workflow_id
+        self._active_runs[workflow_id] -= 1
+        if not self._active_runs[workflow_id]:
+            del self._active_runs[workflow_id]
+        waiting = self._waiting_runs.get(workflow_id)
+        while waiting:
+            started_at, run_id, queued = waiting[0]
+            limit = queued.dag.max_active_runs
+            if self._runs.get(run_id) is queued:
+                if limit is not None and self._active_runs[workflow_id] >= limit:
+                    break
+                self._admit(queued, started_at)
+            heapq.heappop(waiting)
+        if waiting is not None and not waiting:
+            del self._waiting_runs[workflow_id]
+
+    def _fail_downstream(self, db, readiness: RunReadiness):
+        """Write back the tasks a failure left unable to run (UPSTREAM_FAILED),
+        finishing the run if nothing else can run."""
+        blocked = readiness.pop_upstream_failed()
+        if not blocked:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        repository.transition_tasks(
+            db,
+            [readiness.instance_ids[i] for i in blocked],
+            TaskState.PENDING,
+            TaskState.UPSTREAM_FAILED,
+            finished_at=now,
+        )
+        repository.check_run_completion(db, readiness.run_id)
 
-        # Find and dispatch runnable tasks
-        for task in tasks:
-            if task_status.get(task.task_id) != TaskState.PENDING:
+    def _resync(self, db):
+        """Reconcile in-memory trackers with the set of RUNNING runs.
+
+        Runs on startup (rebuilding state after a master restart) and then
+        every SCHEDULER_INTERVAL as a safety net. Only runs that are new to
+        the scheduler are loaded task by task.
+        """
+        self._last_resync = time.monotonic()
+        self._reap_expired_leases(db)
+        self._start_probes()
+        active = {run.id: run.started_at for run in repository.get_active_runs(db)}
+        for run_id in list(self._runs):
+            if run_id not in active:
+                self._drop_run(run_id)
+        # Oldest first, so waiting runs are admitted in trigger order
+        for run_id in sorted(active.keys() - self._runs.keys(), key=active.get):
+            self._load_run(db, run_id)
+
+    def _drop_run(self, run_id: str):
+        """Stop tracking a run that is no longer RUNNING."""
+        readiness = self._runs.pop(run_id)
+        readiness.closed = True
+        for task_instance_id in readiness.instance_ids:
+            self.workers.release(task_instance_id)
+        self.limits.forget(readiness)
+        self._dirty.discard(run_id)
+        self._ready.discard(run_id)
+        self._run_done(readiness)
+
+    def _apply_events(self, db):
+        while self._events:
+            event = self._events.popleft()
+            if event[0] == "heartbeat":
+                if self.workers.heartbeat(*event[1:]):
+                    logger.info("Worker %s joined (%s)", event[2], event[1])
+                continue
+            if event[0] == "left":
+                worker = self.workers.remove(event[1])
+                if worker is not None:
+                    logger.info("Worker %s left", event[1])
+                    self._worker_lost(db, worker.url, worker.worker_id)
                 continue
-            deps = dep_map.get(task.task_id, [])
-            if all(task_status.get(d) == TaskState.SUCCESS for d in deps):
-                await self._dispatch_task(db, task)
-                task_status[task.task_id] = TaskState.RUNNING
-
-    async def _dispatch_task(self, db, task):
-        worker_url = self._next_worker_url()
-        if not worker_url:
+            run_id = event[1]
+            readiness = self._runs.get(run_id)
+            if readiness is None:
+                # Unknown run (new, or created before a restart): the
+                # tracker built from the DB already reflects this event.
+                self._load_run(db, run_id)
+                continue
+            if event[0] == "task":
+                i = readiness.dag.index[event[2]]
+                readiness.mark(i, event[3])
+                if event[3] != TaskState.RUNNING:
+                    self.workers.release(readiness.instance_ids[i])
+                if event[3] == TaskState.RETRYING:
+                    self._retries.push(readiness, i, event[4])
+                self._fail_downstream(db, readiness)
+                if readiness.finished:
+                    self._run_done(readiness)
+                elif readiness.has_work:
+                    self._dirty.add(run_id)
+
+    def _expire_workers(self, db):
+        """Drop workers that missed their heartbeats for WORKER_HEARTBEAT_TIMEOUT."""
+        deadline = time.monotonic() - config.WORKER_HEARTBEAT_TIMEOUT
+        for worker in self.workers.expire(deadline):
+            logger.warning("Worker %s missed its heartbeats; removed", worker.url)
+            self._worker_lost(db, worker.url, worker.worker_id)
+
+    def _worker_lost(self, db, url: str, worker_id: str | None):
+        """Fail fast: end the leases of a lost worker's tasks and reap them."""
+        names = [url] + ([worker_id] if worker_id else [])
+        now = datetime.now(timezone.utc).isoformat()
+        if repository.expire_worker_leases(db, names, now):
+            self._reap_expired_leases(db)
+
+    def _reap_expired_leases(self, db):
+        """Retry (or fail) RUNNING tasks whose worker stopped renewing them."""
+        now = datetime.now(timezone.utc).isoformat()
+        reaped = repository.reap_expired_leases(db, now)
+        if not reaped:
+            return
+        logger.warning("Reaped %d task(s) with expired leases", len(reaped))
+        for task in reaped:
+            self.workers.release(task.id)
+            readiness = self._runs.get(task.run_id)
+            if readiness is not None:
+                i = readiness.dag.index[task.task_id]
+                readiness.mark(i, task.status)
+                if task.status == TaskState.RETRYING:
+                    self._retries.push(readiness, i, task.not_before)
+                self._fail_downstream(db, readiness)
+                if readiness.finished:
+                    self._run_done(readiness)
+                elif readiness.has_work:
+                    self._dirty.add(task.run_id)
+        for run_id in {t.run_id for t in reaped if t.status == TaskState.FAILED}:
+            repository.check_run_completion(db, run_id)
+
+    def _requeue_due_retries(self, db):
+        """Move RETRYING tasks whose backoff ran out back to PENDING (with
+        decremented retries), all of them in one statement.
+
+        Only the due timers are popped; tasks still waiting are not looked at.
+        """
+        due = self._retries.pop_due(time.time())
+        if not due:
+            return
+        owners = {readiness.instance_ids[i]: (readiness, i) for readiness, i in due}
+        for task_instance_id in repository.requeue_retrying_tasks(db, list(owners)):
+            readiness, i = owners[task_instance_id]
+            readiness.mark(i, TaskState.PENDING)
+            if readiness.has_work:
+                self._dirty.add(readiness.run_id)
+
+    def _dispatch_ready(self, db, runs: list[RunReadiness]):
+        """Dispatch ready tasks, highest priority and fairest share first.
+
+        Tasks of admitted runs that became runnable join the global ready
+        queue. Tasks are then taken off it while MAX_RUNNING_TASKS leaves
+        room; one whose pool or workflow has no free slot is parked until a
+        slot frees up there. The chosen tasks are claimed (PENDING ->
+        RUNNING) in one transaction, and the HTTP requests are sent
+        concurrently in the background so that the tick (and every other
+        run) never waits on a slow worker. In pull mode they are only queued
+        for workers to claim.
+        """
+        for readiness in runs:
+            if readiness.run_id in self._admitted:
+                for i in readiness.pop_ready():
+                    self._ready.push(readiness, i)
+        for readiness, i in self.limits.pop_released():
+            self._ready.push(readiness, i)
+        if not self._ready:
+            return
+        pull = config.DISPATCH_MODE == "pull"
+        if not pull and not self.worker_urls:
             logger.warning("No workers configured")
+
+        budget = self.limits.budget()
+        chosen: list[tuple[RunReadiness, int]] = []
+        assignments: dict[str, list[tuple[RunReadiness, int]]] = {}
+        skipped = []
+        taken = Counter()
+        while budget is None or len(chosen) < budget:
+            item = self._ready.pop()
+            if item is None:
+                break
+            readiness, i = item
+            blocker = self.limits.blocker(readiness.dag, i, taken)
+            if blocker is not None:
+                self._ready.refund(readiness)
+                self.limits.block(blocker, readiness, i)
+                continue
+            if not pull:
+                requests = _requests(readiness.dag.limits[i])
+                worker_url = self.workers.pick(None, *requests)
+                if worker_url is None:
+                    # Keep it queued until cores and memory are released
+                    skipped.append(item)
+                    if not any(requests) or self.workers.pick() is None:
+                        # Every worker is busy: so is every task after this one
+                        break
+                    continue
+                # Counted right away so the next pick in this pass sees the load
+                self.workers.assign(readiness.instance_ids[i], worker_url, *requests)
+                assignments.setdefault(worker_url, []).append(item)
+            self.limits.take(readiness.dag, i, taken)
+            chosen.append(item)
+        for readiness, i in skipped:
+            self._ready.requeue(readiness, i)
+        if pull:
+            self._queue_ready(db, chosen)
+            return
+        if not assignments:
             return
 
         now = datetime.now(timezone.utc).isoformat()
-        callback_url = (
-            f"http://{config.MASTER_HOST}:{config.MASTER_PORT}"
-            f"/internal/task-result"
+        claimed = set(
+            repository.mark_tasks_running(
+                db,
+                {
+                    url: [r.instance_ids[i] for r, i in items]
+                    for url, items in assignments.items()
+                },
+                started_at=now,
+                lease_expires_at=lease_expiry(),
+            )
         )
 
-        # Mark as RUNNING before dispatching
-        repository.update_task_status(
-            db, task.id, TaskState.RUNNING, started_at=now, worker_id=worker_url
-        )
+        sends = []
+        for worker_url, items in assignments.items():
+            for readiness, i in items:
+                if readiness.instance_ids[i] not in claimed:
+                    # Moved by someone else; a later event or resync
+                    # brings the tracker back in line.
+                    self.workers.release(readiness.instance_ids[i])
+                    self.limits.unblock(readiness.dag, i)
+                    continue
+                readiness.mark(i, TaskState.RUNNING)
+                sends.append((readiness, i, worker_url))
+
+        if sends:
+            task = asyncio.create_task(self._send_batch(sends, now))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    def _queue_ready(self, db, ready: list[tuple[RunReadiness, int]]):
+        """Pull mode: PENDING -> QUEUED in one statement, then wake claimers."""
+        owners = {readiness.instance_ids[i]: (readiness, i) for readiness, i in ready}
+        now = datetime.now(timezone.utc).isoformat()
+        queued = repository.queue_tasks(db, list(owners), queued_at=now)
+        for task_instance_id in queued:
+            readiness, i = owners.pop(task_instance_id)
+            readiness.mark(i, TaskState.QUEUED)
+        for readiness, i in owners.values():
+            self.limits.unblock(readiness.dag, i)
+        if queued:
+            self._notify_work()
+
+    def _notify_work(self):
+        self.work_generation += 1
+        event, self._work_available = self._work_available, None
+        if event is not None:
+            event.set()
 
-        payload = {
-            "task_instance_id": task.id,
-            "task_id": task.task_id,
-            "command": task.command,
-            "callback_url": callback_url,
-        }
+    async def wait_for_work(self, since: int, timeout: float):
+        """Pull mode: sleep until tasks were queued after ``work_generation``
+        was ``since``, or until ``timeout`` passes.
 
+        Must be awaited on the scheduler's event loop (the API's loop).
+        """
+        if self.work_generation != since:
+            return
+        if self._work_available is None:
+            self._work_available = asyncio.Event()
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(
-                    f"{worker_url}/execute", json=payload, timeout=5.0
+            await asyncio.wait_for(self._work_available.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _send_batch(
+        self, sends: list[tuple[RunReadiness, int, str]], attempt: str
+    ):
+        """Send claimed tasks grouped per worker and revert the ones not accepted.
+
+        Tasks bound for the same worker go out in requests of up to
+        DISPATCH_BATCH_SIZE tasks; requests to different workers (and
+        successive chunks) are sent concurrently. ``attempt`` is the
+        ``started_at`` the tasks were claimed with.
+        """
+        per_worker: dict[str, list[tuple[RunReadiness, int]]] = {}
+        for readiness, i, worker_url in sends:
+            per_worker.setdefault(worker_url, []).append((readiness, i))
+
+        size = max(1, config.DISPATCH_BATCH_SIZE)
+        chunks = [
+            (worker_url, items[start : start + size])
+            for worker_url, items in per_worker.items()
+            for start in range(0, len(items), size)
+        ]
+        results = await asyncio.gather(
+            *(
+                self._send_limited(
+                    worker_url, [self._payload(r, i, attempt) for r, i in items]
                 )
-                if resp.status_code != 200:
-                    logger.error(
-                        "Worker %s rejected task: %s", worker_url, resp.text
-                    )
-                    repository.update_task_status(
+                for worker_url, items in chunks
+            )
+        )
+        failed = {}
+        busy = False
+        for (worker_url, items), statuses in zip(chunks, results):
+            if BUSY in statuses or FAILED in statuses or UNKNOWN in statuses:
+                # At capacity or unreachable: route around the worker for a
+                # while instead of hammering it (a dead one expires soon)
+                self._mark_busy(worker_url)
+                busy = True
+            for (readiness, i), status in zip(items, statuses):
+                # UNKNOWN tasks stay RUNNING under their lease: if the worker
+                # did start them it renews it, otherwise the reaper retries
+                # them. Sending them again could run them twice.
+                if status not in (ACCEPTED, UNKNOWN):
+                    failed[readiness.instance_ids[i]] = (readiness, i)
+        if not failed:
+            return
+
+        # Revert to PENDING so they get picked up next tick
+        db = SessionLocal()
+        try:
+            reverted = repository.unclaim_tasks(db, list(failed))
+        finally:
+            db.close()
+        for task_instance_id in reverted:
+            self.workers.release(task_instance_id)
+            readiness, i = failed[task_instance_id]
+            if self._runs.get(readiness.run_id) is readiness:
+                readiness.mark(i, TaskState.PENDING)
+                self._dirty.add(readiness.run_id)
+        if busy:
+            # Other workers may have room right now
+            self.wake()
+
+    def _payload(self, readiness: RunReadiness, i: int, attempt: str) -> dict:
+        return task_payload(
+            readiness.instance_ids[i],
+            readiness.dag.task_ids[i],
+            readiness.dag.commands[i],
+            readiness.dag.callables[i],
+            readiness.dag.limits[i],
+            attempt,
+        )
+
+    def _start_probes(self):
+        """Probe ``/health`` of static workers, which send no heartbeats."""
+        urls = [w.url for w in self.workers.workers.values() if w.last_seen is None]
+        if not urls or self._loop is None:
+            return
+        task = asyncio.create_task(self._probe_workers(urls))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _probe_workers(self, urls: list[str]):
+        """Renew leases of what each worker reports running; a worker that
+        fails PROBE_FAILURES_BEFORE_LOST probes in a row is treated as lost."""
+        results = await asyncio.gather(*(self._probe(url) for url in urls))
+        db = SessionLocal()
+        try:
+            for url, health in zip(urls, results):
+                if health is None:
+                    failures = self._probe_failures.get(url, 0) + 1
+                    self._probe_failures[url] = failures
+                    self._mark_busy(url)
+                    if failures == PROBE_FAILURES_BEFORE_LOST:
+                        logger.warning("Worker %s failed its health probes", url)
+                        self._worker_lost(db, url, None)
+                    continue
+                self._probe_failures.pop(url, None)
+                self.workers.update_load(url, health.get("load"))
+                if health.get("running"):
+                    repository.renew_leases(
                         db,
-                        task.id,
-                        TaskState.PENDING,
-                        started_at=None,
-                        worker_id=None,
+                        [url, health.get("worker_id", url)],
+                        health["running"],
+                        lease_expiry(),
                     )
-        except httpx.HTTPError as e:
-            logger.error("Failed to dispatch to %s: %s", worker_url, e)
-            # Revert to PENDING so it gets picked up next tick
-            repository.update_task_status(
-                db,
-                task.id,
-                TaskState.PENDING,
-                started_at=None,
-                worker_id=None,
+        finally:
+            db.close()
+
+    async def _probe(self, url: str) -> dict | None:
+        try:
+            resp = await self._http().get(f"{url}/health")
+            resp.raise_for_status()
+            return resp.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=config.DISPATCH_CONCURRENCY,
+                max_keepalive_connections=config.DISPATCH_CONCURRENCY,
+            )
+            self._client = httpx.AsyncClient(
+                limits=limits, timeout=config.DISPATCH_TIMEOUT
             )
+        return self._client
+
+    async def _send_limited(self, worker_url: str, payloads: list[dict]) -> list[str]:
+        async with self._dispatch_slots:
+            return await self._send_to_worker(worker_url, payloads)
+
+    async def _send_to_worker(self, worker_url: str, payloads: list[dict]) -> list[str]:
+        """POST tasks to a worker.
+
+        Returns one status per payload: ``accepted``, ``busy`` (worker at
+        capacity), ``rejected``, ``failed`` (the request never reached the
+        worker) or ``unknown`` (it was sent, but the answer was lost, e.g.
+        a read timeout). The load the worker reports alongside is recorded
+        in the worker registry.
+        """
+        try:
+            if len(payloads) == 1:
+                resp = await self._http().post(
+                    f"{worker_url}/execute", json=payloads[0]
+                )
+                if resp.status_code == 200:
+                    self.workers.update_load(worker_url, resp.json().get("load"))
+                    return [ACCEPTED]
+                if resp.status_code == 429:
+                    self.workers.update_load(
+                        worker_url, resp.json()["detail"].get("load")
+                    )
+                    return [BUSY]
+                if resp.status_code == 409 and _already_running(resp.json()):
+                    return [ACCEPTED]
+            else:
+                resp = await self._http().post(
+                    f"{worker_url}/execute/batch", json={"tasks": payloads}
+                )
+                if resp.status_code == 200:
+                    body = resp.json()
+                    self.workers.update_load(worker_url, body.get("load"))
+                    statuses = {
+                        r["task_instance_id"]: (
+                            ACCEPTED if _already_running(r) else r["status"]
+                        )
+                        for r in body["results"]
+                    }
+                    result = [
+                        statuses.get(p["task_instance_id"], REJECTED) for p in payloads
+                    ]
+                    not_accepted = sum(1 for st in result if st != ACCEPTED)
+                    if not_accepted:
+                        logger.warning(
+                            "Worker %s did not accept %d of %d tasks",
+                            worker_url,
+                            not_accepted,
+                            len(payloads),
+                        )
+                    return result
+            logger.error("Worker %s rejected tasks: %s", worker_url, resp.text)
+            return [REJECTED] * len(payloads)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            logger.error("Failed to dispatch to %s: %s", worker_url, e)
+            return [FAILED] * len(payloads)
+        except httpx.HTTPError as e:
+            logger.error("No answer from %s to a dispatch: %s", worker_url, e)
+            return [UNKNOWN] * len(payloads)
@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import logging
+import zlib
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from app import config
+from app.core.cron import CronExpression
+from app.core.dag import dag_cache
+from app.db import repository
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Schedule:
+    """When a workflow's scheduled runs are due.
+
+    Schedule times come from a cron expression, or fall on the multiples of
+    a fixed interval since the epoch, so neither needs an anchor to be
+    restored after a restart. Each time is *fired* ``offset`` later: a
+    fixed jitter in ``[0, SCHEDULE_JITTER)`` (and under half the period)
+    derived from the workflow id, so hundreds of workflows on the same
+    schedule are spread out instead of triggered in the same second, while
+    each keeps a regular period.
+    """
+
+    def __init__(
+        self,
+        workflow_id: str,
+        cron: str | None = None,
+        interval: float | None = None,
+        max_catchup_runs: int | None = None,
+    ):
+        self.cron = CronExpression(cron) if cron is not None else None
+        self.interval = interval
+        self.max_catchup_runs = max(
+            1, max_catchup_runs or config.SCHEDULE_MAX_CATCHUP_RUNS
+        )
+        first = self.next_after(_EPOCH)
+        second = self.next_after(first)
+        # Seconds between schedule times (the first gap, for cron)
+        self.period = (second - first).total_seconds() if second else float("inf")
+        spread = min(config.SCHEDULE_JITTER, self.period / 2)
+        fraction = zlib.crc32(workflow_id.encode()) / 2**32
+        self.offset = timedelta(seconds=max(0.0, spread) * fraction)
+
+    @classmethod
+    def of(cls, definition: dict) -> "Schedule | None":
+        """The schedule a (valid) workflow definition declares, if any."""
+        cron = definition.get("schedule")
+        interval = definition.get("schedule_interval")
+        if cron is None and interval is None:
+            return None
+        return cls(
+            definition.get("id", ""),
+            cron,
+            interval,
+            definition.get("max_catchup_runs"),
+        )
+
+    def next_after(self, t: datetime) -> datetime | None:
+        """The first schedule time strictly after ``t`` (an aware datetime)."""
+        if self.cron is not None:
+            return self.cron.next_after(t)
+        k = int((t - _EPOCH).total_seconds() // self.interval) + 1
+        return _EPOCH + timedelta(seconds=k * self.interval)
+
+    def due(
+        self, next_run_at: datetime, now: datetime
+    ) -> tuple[list[datetime], datetime | None]:
+        """The schedule times from ``next_run_at`` on that fired by ``now``
+        and get a run (the latest ``max_catchup_runs`` of them), and the
+        first schedule time still to come.
+
+        After a long outage only a window of recent schedule times is
+        walked, widened until it holds enough of them, so catching up costs
+        the same after a day or a year.
+        """
+        limit = now - self.offset
+        span = (limit - next_run_at).total_seconds()
+        lookback = self.period * (self.max_catchup_runs + 1)
+        while True:
+            t = next_run_at
+            if lookback < span:
+                t = self.next_after(limit - timedelta(seconds=lookback))
+            kept: deque[datetime] = deque(maxlen=self.max_catchup_runs)
+            while t is not None and t <= limit:
+                kept.append(t)
+                t = self.next_after(t)
+            if len(kept) == self.max_catchup_runs or lookback >= span:
+                return list(kept), t
+            lookback *= 2
+
+
+class RunTrigger:
+    """Creates the runs of scheduled workflows when they are due.
+
+    Every scheduled workflow has one entry in a heap keyed on when its next
+    schedule time fires, so the loop sleeps until exactly then and only
+    ever looks at the workflows that are due, instead of scanning them all
+    on a timer. The next schedule time is stored on the workflow
+    (``next_run_at``) and moved on in the same transaction that creates the
+    runs, which both rebuilds the heap after a restart and keeps two
+    masters from creating the same run twice.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        # (fires at, workflow_id, next_run_at); entries whose next_run_at
+        # is no longer the workflow's current one are skipped when popped
+        self._heap: list[tuple[float, str, str]] = []
+        self._next: dict[str, str] = {}
+        self._schedules: dict[str, Schedule] = {}
+        # Workflows registered since the last pass
+        self._events: deque[str] = deque()
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def wake(self):
+        """Ask the trigger loop to run a pass as soon as possible (thread-safe)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    def workflow_registered(self, workflow_id: str):
+        """Record that a scheduled workflow was registered and wake the loop."""
+        self._events.append(workflow_id)
+        self.wake()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        db = SessionLocal()
+        try:
+            for workflow in repository.get_scheduled_workflows(db):
+                self._load(workflow)
+        finally:
+            db.close()
+        logger.info("Run trigger started (%d scheduled workflows)", len(self))
+        while True:
+            self._wakeup.clear()
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("Run trigger error: %s", e)
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - _now().timestamp())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _tick(self):
+        db = SessionLocal()
+        try:
+            while self._events:
+                workflow = repository.get_workflow(db, self._events.popleft())
+                if workflow is not None:
+                    self._load(workflow)
+            now = _now()
+            while self._heap and self._heap[0][0] <= now.timestamp():
+                _, workflow_id, next_run_at = heapq.heappop(self._heap)
+                if self._next.get(workflow_id) != next_run_at:
+                    continue
+                del self._next[workflow_id]
+                try:
+                    self._fire(db, workflow_id, next_run_at, now)
+                except Exception:
+                    logger.exception("Triggering workflow %s failed", workflow_id)
+                    db.rollback()
+                    # Try again a little later rather than in a tight loop
+                    self._push(workflow_id, next_run_at, retry=True)
+        finally:
+            db.close()
+
+    def _load(self, workflow):
+        """Time the next schedule time stored on a workflow."""
+        if workflow.next_run_at is None:
+            return
+        schedule = self._schedules.get(workflow.id)
+        if schedule is None:
+            schedule = Schedule.of(dag_cache.get(workflow).definition)
+            if schedule is None:
+                return
+            self._schedules[workflow.id] = schedule
+        self._push(workflow.id, workflow.next_run_at)
+
+    def _push(self, workflow_id: str, next_run_at: str, retry: bool = False):
+        offset = self._schedules[workflow_id].offset
+        fires_at = (datetime.fromisoformat(next_run_at) + offset).timestamp()
+        if retry:
+            fires_at = max(fires_at, _now().timestamp() + config.SCHEDULER_INTERVAL)
+        self._next[workflow_id] = next_run_at
+        heapq.heappush(self._heap, (fires_at, workflow_id, next_run_at))
+
+    def _fire(self, db, workflow_id: str, next_run_at: str, now: datetime):
+        """Create the runs of a workflow's due schedule times and time the next."""
+        schedule = self._schedules[workflow_id]
+        due, following = schedule.due(datetime.fromisoformat(next_run_at), now)
+        workflow = repository.get_workflow(db, workflow_id)
+        runs = repository.create_scheduled_runs(
+            db,
+            workflow_id,
+            dag_cache.get(workflow).definition["tasks"],
+            [t.isoformat() for t in due],
+            next_run_at,
+            following.isoformat() if following is not None else None,
+        )
+        if runs is None:
+            # Moved on by someone else: follow what is stored now
+            db.expire_all()
+            self._load(repository.get_workflow(db, workflow_id))
+            return
+        if due and due[0].isoformat() != next_run_at:
+            logger.warning(
+                "Workflow %s: skipped the schedule times from %s to %s "
+                "(max_catchup_runs)",
+                workflow_id,
+                next_run_at,
+                due[0].isoformat(),
+            )
+        for run in runs:
+            self.scheduler.run_created(run.id)
+        if following is not None:
+            self._push(workflow_id, following.isoformat())
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
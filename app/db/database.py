@@ -1,23 +1,91 @@
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, literal, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app import config
+from app.db.backends import get_backend
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(
-    config.DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+def make_engine(url: str):
+    """Create an engine configured by the storage backend for ``url``."""
+    return get_backend(url).create_engine(url)
+
+
+backend = get_backend(config.DATABASE_URL)
+engine = backend.create_engine(config.DATABASE_URL)
 
 SessionLocal = sessionmaker(bind=engine)
 
 
-def init_db():
+def init_db(bind=None):
     from app.db import tables  # noqa: F401 - registers table models
-    Base.metadata.create_all(bind=engine)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    added = _add_missing_columns(bind)
+    _create_missing_indexes(bind)
+    if any(
+        table == "workflow_runs" and column.endswith("_count")
+        for table, column in added
+    ):
+        _backfill_run_counters(bind)
+
+
+def _add_missing_columns(bind):
+    """Bring DB files created by older versions up to the current schema.
+
+    ``create_all`` only creates missing tables, so columns added to an
+    existing table are appended here with ``ALTER TABLE ... ADD COLUMN``.
+    New columns must therefore be nullable or have a scalar default.
+    Returns the ``(table, column)`` pairs that were added.
+    """
+    added = []
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                    f"{column.type.compile(dialect=bind.dialect)}"
+                )
+                if column.default is not None and column.default.is_scalar:
+                    value = literal(column.default.arg).compile(
+                        dialect=bind.dialect,
+                        compile_kwargs={"literal_binds": True},
+                    )
+                    ddl += f" DEFAULT {value}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append((table.name, column.name))
+    return added
+
+
+def _backfill_run_counters(bind):
+    """Initialise per-run task counters for runs created before they existed."""
+    from app.db import repository
+
+    db = sessionmaker(bind=bind)()
+    try:
+        repository.recompute_run_counters(db)
+    finally:
+        db.close()
+
+
+def _create_missing_indexes(bind):
+    """Create indexes declared on tables that already existed.
+
+    Like columns, ``create_all`` skips the indexes of existing tables.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
 
 
 def get_db():
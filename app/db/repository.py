@@ -1,18 +1,42 @@
 import json
 import uuid
+from collections import Counter
 from datetime import datetime, timezone
 
+from sqlalchemy import func, literal, select, update
 from sqlalchemy.orm import Session
 
 from app.core.models import RunState, TaskState
+from app.core.placement import fits
+from app.core.retries import RETRY_FIELDS, retry_at
+from app.db.backends import get_backend
 from app.db.tables import TaskInstance, Workflow, WorkflowRun
 
+# Keeps "WHERE id IN (...)" well under SQLite's bound-parameter limit
+_IN_CHUNK_SIZE = 500
+# Queued tasks a claim with a resource budget looks at per round
+_CLAIM_WINDOW = 100
 
-def create_workflow(db: Session, workflow_id: str, definition: dict) -> Workflow:
+# Per-state task counters kept on WorkflowRun
+COUNTER_COLUMNS = {
+    TaskState.PENDING: "pending_count",
+    TaskState.QUEUED: "queued_count",
+    TaskState.RUNNING: "running_count",
+    TaskState.SUCCESS: "success_count",
+    TaskState.FAILED: "failed_count",
+    TaskState.RETRYING: "retrying_count",
+    TaskState.UPSTREAM_FAILED: "upstream_failed_count",
+}
+
+
+def create_workflow(
+    db: Session, workflow_id: str, definition: dict, next_run_at: str | None = None
+) -> Workflow:
     workflow = Workflow(
         id=workflow_id,
         definition=json.dumps(definition),
         created_at=datetime.now(timezone.utc).isoformat(),
+        next_run_at=next_run_at,
     )
     db.add(workflow)
     db.commit()
@@ -28,7 +52,50 @@ def list_workflows(db: Session) -> list[Workflow]:
     return db.query(Workflow).all()
 
 
+def get_scheduled_workflows(db: Session) -> list[Workflow]:
+    """Workflows with a scheduled run still to come."""
+    return db.query(Workflow).filter(Workflow.next_run_at.isnot(None)).all()
+
+
 def create_run(db: Session, workflow_id: str, tasks: list[dict]) -> WorkflowRun:
+    run = _add_run(db, workflow_id, tasks)
+    db.commit()
+    db.refresh(run)
+    return run
+
+
+def create_scheduled_runs(
+    db: Session,
+    workflow_id: str,
+    tasks: list[dict],
+    scheduled_at: list[str],
+    next_run_at: str,
+    following_run_at: str | None,
+) -> list[WorkflowRun] | None:
+    """Create the runs of a workflow's schedule times ``scheduled_at`` and
+    move its ``next_run_at`` on to ``following_run_at``, in one transaction.
+
+    The move is a compare-and-set on ``next_run_at``: if it no longer is
+    ``next_run_at`` (another master got there first), nothing is created
+    and None is returned.
+    """
+    moved = db.execute(
+        update(Workflow)
+        .where(Workflow.id == workflow_id, Workflow.next_run_at == next_run_at)
+        .values(next_run_at=following_run_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        db.rollback()
+        return None
+    runs = [_add_run(db, workflow_id, tasks, at) for at in scheduled_at]
+    db.commit()
+    return runs
+
+
+def _add_run(
+    db: Session, workflow_id: str, tasks: list[dict], scheduled_at: str | None = None
+) -> WorkflowRun:
     run_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
 
@@ -37,6 +104,8 @@ def create_run(db: Session, workflow_id: str, tasks: list[dict]) -> WorkflowRun:
         workflow_id=workflow_id,
         status=RunState.RUNNING,
         started_at=now,
+        scheduled_at=scheduled_at,
+        pending_count=len(tasks),
     )
     db.add(run)
 
@@ -45,15 +114,19 @@ def create_run(db: Session, workflow_id: str, tasks: list[dict]) -> WorkflowRun:
             id=str(uuid.uuid4()),
             run_id=run_id,
             task_id=task["id"],
-            command=task["command"],
+            command=task.get("command", ""),
+            callable=json.dumps(task["callable"]) if task.get("callable") else None,
+            timeout=task.get("timeout"),
+            cpus=task.get("cpus"),
+            memory_mb=task.get("memory_mb"),
+            retry_delay=task.get("retry_delay"),
+            retry_backoff=task.get("retry_backoff"),
+            max_retry_delay=task.get("max_retry_delay"),
             status=TaskState.PENDING,
             retries_left=task.get("max_retries", 0),
             max_retries=task.get("max_retries", 0),
         )
         db.add(instance)
-
-    db.commit()
-    db.refresh(run)
     return run
 
 
@@ -69,6 +142,46 @@ def get_active_runs(db: Session) -> list[WorkflowRun]:
     )
 
 
+def task_durations(db: Session, workflow_id: str, runs: int = 10) -> dict[str, float]:
+    """Mean seconds each task of a workflow took to succeed, over its last
+    ``runs`` runs.
+
+    Uses the measured wall time, or ``finished_at - started_at`` for tasks
+    recorded without one. Tasks that never succeeded are left out.
+    """
+    recent = (
+        select(WorkflowRun.id)
+        .where(WorkflowRun.workflow_id == workflow_id)
+        .order_by(WorkflowRun.started_at.desc())
+        .limit(runs)
+    )
+    rows = db.execute(
+        select(
+            TaskInstance.task_id,
+            TaskInstance.wall_seconds,
+            TaskInstance.started_at,
+            TaskInstance.finished_at,
+        ).where(
+            TaskInstance.run_id.in_(recent.scalar_subquery()),
+            TaskInstance.status == TaskState.SUCCESS,
+        )
+    ).all()
+    totals: dict[str, list[float]] = {}
+    for task_id, wall_seconds, started_at, finished_at in rows:
+        if wall_seconds is None:
+            try:
+                wall_seconds = (
+                    datetime.fromisoformat(finished_at)
+                    - datetime.fromisoformat(started_at)
+                ).total_seconds()
+            except (TypeError, ValueError):
+                continue
+        total = totals.setdefault(task_id, [0.0, 0])
+        total[0] += max(0.0, wall_seconds)
+        total[1] += 1
+    return {task_id: seconds / n for task_id, (seconds, n) in totals.items()}
+
+
 def update_run_status(
     db: Session, run_id: str, status: str, finished_at: str | None = None
 ):
@@ -80,6 +193,27 @@ def update_run_status(
         db.commit()
 
 
+def check_run_completion(db: Session, run_id: str):
+    """Finish the run if its task counters say so (constant time)."""
+    run = get_run(db, run_id)
+    if not run or run.status != RunState.RUNNING:
+        return
+    counts = run_task_counts(run)
+    now = datetime.now(timezone.utc).isoformat()
+
+    if counts[TaskState.SUCCESS] == sum(counts.values()):
+        update_run_status(db, run_id, RunState.SUCCESS, finished_at=now)
+    elif counts[TaskState.FAILED]:
+        still_active = (
+            counts[TaskState.PENDING]
+            + counts[TaskState.QUEUED]
+            + counts[TaskState.RUNNING]
+            + counts[TaskState.RETRYING]
+        )
+        if not still_active:
+            update_run_status(db, run_id, RunState.FAILED, finished_at=now)
+
+
 def get_task_instances(db: Session, run_id: str) -> list[TaskInstance]:
     return db.query(TaskInstance).filter(TaskInstance.run_id == run_id).all()
 
@@ -90,6 +224,87 @@ def get_task_instance(db: Session, task_instance_id: str) -> TaskInstance | None
     )
 
 
+def get_task_instance_by_task_id(
+    db: Session, run_id: str, task_id: str
+) -> TaskInstance | None:
+    return (
+        db.query(TaskInstance)
+        .filter(TaskInstance.run_id == run_id, TaskInstance.task_id == task_id)
+        .first()
+    )
+
+
+def get_task_instances_by_ids(
+    db: Session, task_instance_ids: list[str]
+) -> list[TaskInstance]:
+    tasks: list[TaskInstance] = []
+    for start in range(0, len(task_instance_ids), _IN_CHUNK_SIZE):
+        chunk = task_instance_ids[start : start + _IN_CHUNK_SIZE]
+        tasks.extend(db.query(TaskInstance).filter(TaskInstance.id.in_(chunk)).all())
+    return tasks
+
+
+def update_task_instances(
+    db: Session, changes: list[tuple[TaskInstance, dict]]
+) -> list[str]:
+    """Set column values on many loaded task instances with a single commit.
+
+    Each row is updated only while it is still in the status it was loaded
+    with (a compare-and-set), and the counters follow the rows the update
+    returned, so a concurrent transition is neither overwritten nor counted
+    twice. Returns the ids that were written.
+    """
+    written: list[str] = []
+    deltas: dict[str, Counter] = {}
+    for task, values in changes:
+        status = task.status
+        stmt = (
+            update(TaskInstance)
+            .where(TaskInstance.id == task.id, TaskInstance.status == status)
+            .values(**values)
+            .returning(TaskInstance.run_id, TaskInstance.status)
+            .execution_options(synchronize_session=False)
+        )
+        for run_id, new_status in db.execute(stmt):
+            written.append(task.id)
+            _count_transition(deltas, run_id, status, new_status)
+    _apply_counter_deltas(db, deltas)
+    db.commit()
+    return written
+
+
+def record_task_results(
+    db: Session, results: list[tuple[TaskInstance, dict]]
+) -> list[str]:
+    """Write the results of loaded RUNNING task instances with a single commit.
+
+    Each row is updated with ``UPDATE ... WHERE id = :id AND status =
+    'RUNNING' AND started_at = :started_at``, a compare-and-set on the
+    attempt the task was loaded on: a task the lease reaper retried or
+    failed meanwhile is left alone. Returns the ids that were written.
+    """
+    written: list[str] = []
+    deltas: dict[str, Counter] = {}
+    for task, values in results:
+        stmt = (
+            update(TaskInstance)
+            .where(
+                TaskInstance.id == task.id,
+                TaskInstance.status == TaskState.RUNNING,
+                TaskInstance.started_at == task.started_at,
+            )
+            .values(**values)
+            .returning(TaskInstance.run_id)
+            .execution_options(synchronize_session=False)
+        )
+        for (run_id,) in db.execute(stmt):
+            written.append(task.id)
+            _count_transition(deltas, run_id, TaskState.RUNNING, values["status"])
+    _apply_counter_deltas(db, deltas)
+    db.commit()
+    return written
+
+
 def update_task_status(
     db: Session,
     task_instance_id: str,
@@ -104,6 +319,8 @@ def update_task_status(
         db.query(TaskInstance).filter(TaskInstance.id == task_instance_id).first()
     )
     if task:
+        deltas: dict[str, Counter] = {}
+        _count_transition(deltas, task.run_id, task.status, status)
         task.status = status
         if worker_id is not None:
             task.worker_id = worker_id
@@ -115,4 +332,397 @@ def update_task_status(
             task.finished_at = finished_at
         if retries_left is not None:
             task.retries_left = retries_left
+        _apply_counter_deltas(db, deltas)
         db.commit()
+
+
+def transition_tasks(
+    db: Session,
+    task_instance_ids: list[str],
+    from_status: str,
+    to_status: str,
+    commit: bool = True,
+    **values,
+) -> list[str]:
+    """Move many task instances from ``from_status`` to ``to_status``.
+
+    Issues ``UPDATE ... WHERE id IN (...) AND status = :from_status`` so
+    the transition is a compare-and-set: rows that were concurrently moved
+    to another state are left alone. ``values`` are extra columns to set
+    (``None`` clears a column). Returns the ids that actually transitioned.
+    """
+    moved: list[str] = []
+    deltas: dict[str, Counter] = {}
+    for start in range(0, len(task_instance_ids), _IN_CHUNK_SIZE):
+        chunk = task_instance_ids[start : start + _IN_CHUNK_SIZE]
+        stmt = (
+            update(TaskInstance)
+            .where(TaskInstance.id.in_(chunk), TaskInstance.status == from_status)
+            .values(status=to_status, **values)
+            .returning(TaskInstance.id, TaskInstance.run_id)
+            .execution_options(synchronize_session=False)
+        )
+        for task_instance_id, run_id in db.execute(stmt):
+            moved.append(task_instance_id)
+            _count_transition(deltas, run_id, from_status, to_status)
+    _apply_counter_deltas(db, deltas)
+    if commit:
+        db.commit()
+    return moved
+
+
+# What a task's previous attempt left behind, cleared before it runs again
+# so neither the API nor a log tail shows it as the new attempt's
+_ATTEMPT_RESET = {
+    "started_at": None,
+    "finished_at": None,
+    "worker_id": None,
+    "output": None,
+    "log_url": None,
+    "lease_expires_at": None,
+    "peak_rss_kb": None,
+    "cpu_seconds": None,
+    "wall_seconds": None,
+}
+
+
+def requeue_retrying_tasks(db: Session, task_instance_ids: list[str]) -> list[str]:
+    """RETRYING -> PENDING in one statement, consuming one retry each."""
+    return transition_tasks(
+        db,
+        task_instance_ids,
+        TaskState.RETRYING,
+        TaskState.PENDING,
+        retries_left=TaskInstance.retries_left - 1,
+        not_before=None,
+        **_ATTEMPT_RESET,
+    )
+
+
+def unclaim_tasks(db: Session, task_instance_ids: list[str]) -> list[str]:
+    """RUNNING -> PENDING for dispatched tasks no worker accepted.
+
+    The compare-and-set keeps tasks whose result already arrived intact.
+    """
+    return transition_tasks(
+        db, task_instance_ids, TaskState.RUNNING, TaskState.PENDING, **_ATTEMPT_RESET
+    )
+
+
+def mark_tasks_running(
+    db: Session,
+    assignments: dict[str, list[str]],
+    started_at: str,
+    lease_expires_at: str | None = None,
+) -> list[str]:
+    """PENDING -> RUNNING for tasks grouped by worker, in a single commit.
+
+    ``assignments`` maps a worker URL to the task instance ids sent to it;
+    each task's ``log_url`` points at that worker. Returns the ids that
+    were claimed (still PENDING at update time).
+    """
+    claimed: list[str] = []
+    for worker_id, ids in assignments.items():
+        ids = _lock_claimable(db, ids, TaskState.PENDING)
+        claimed.extend(
+            transition_tasks(
+                db,
+                ids,
+                TaskState.PENDING,
+                TaskState.RUNNING,
+                commit=False,
+                started_at=started_at,
+                worker_id=worker_id,
+                lease_expires_at=lease_expires_at,
+                log_url=_log_url(worker_id),
+            )
+        )
+    db.commit()
+    return claimed
+
+
+def _log_url(worker_url: str | None):
+    """SQL expression for the URL of a task's log on ``worker_url``."""
+    if not worker_url:
+        return None
+    return literal(f"{worker_url.rstrip('/')}/logs/") + TaskInstance.id
+
+
+def _lock_claimable(db: Session, task_instance_ids: list[str], status: str) -> list[str]:
+    """Row-lock the tasks still in ``status`` that nobody else is claiming.
+
+    On backends with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL),
+    rows locked by a concurrent claimer are skipped instead of waited on,
+    and the locks are held until the caller commits. Other backends
+    return the ids unchanged and rely on the compare-and-set UPDATE.
+    """
+    if not get_backend(db.get_bind().dialect.name).supports_skip_locked:
+        return task_instance_ids
+    lockable: list[str] = []
+    for start in range(0, len(task_instance_ids), _IN_CHUNK_SIZE):
+        chunk = task_instance_ids[start : start + _IN_CHUNK_SIZE]
+        stmt = (
+            select(TaskInstance.id)
+            .where(TaskInstance.id.in_(chunk), TaskInstance.status == status)
+            .with_for_update(skip_locked=True)
+        )
+        lockable.extend(db.execute(stmt).scalars().all())
+    return lockable
+
+
+# ── Pull dispatch mode and task leases ─────────────────────────────────────
+
+
+def queue_tasks(db: Session, task_instance_ids: list[str], queued_at: str) -> list[str]:
+    """PENDING -> QUEUED: make ready tasks claimable by workers."""
+    return transition_tasks(
+        db, task_instance_ids, TaskState.PENDING, TaskState.QUEUED, queued_at=queued_at
+    )
+
+
+def claim_queued_tasks(
+    db: Session,
+    worker_id: str,
+    limit: int,
+    started_at: str,
+    lease_expires_at: str,
+    worker_url: str | None = None,
+    free_cpus: float | None = None,
+    free_memory_mb: int | None = None,
+    idle: bool = True,
+) -> list[TaskInstance]:
+    """QUEUED -> RUNNING for up to ``limit`` of the oldest queued tasks.
+
+    Candidates come oldest-first off ``ix_task_instances_status_queued_at``;
+    the compare-and-set UPDATE makes the claim atomic, so concurrent
+    claimers never get the same task. Candidates taken by a concurrent
+    claimer are replaced by the next ones in line. ``worker_url``, when the
+    worker advertises one, is where the tasks' live logs can be read.
+
+    With ``free_cpus`` / ``free_memory_mb`` (what the claiming worker has
+    unreserved), tasks whose requests do not fit are skipped and stay
+    queued for other workers; up to ``_CLAIM_WINDOW`` candidates are looked
+    at per round.
+    """
+    budgeted = free_cpus is not None or free_memory_mb is not None
+    skip_locked = get_backend(db.get_bind().dialect.name).supports_skip_locked
+    claimed: list[str] = []
+    seen: set[str] = set()
+    while len(claimed) < limit:
+        stmt = (
+            select(TaskInstance.id, TaskInstance.cpus, TaskInstance.memory_mb)
+            .where(TaskInstance.status == TaskState.QUEUED)
+            .order_by(TaskInstance.queued_at)
+            .limit(_CLAIM_WINDOW if budgeted else limit - len(claimed))
+        )
+        if skip_locked:
+            stmt = stmt.with_for_update(skip_locked=True)
+        ids = []
+        for task_instance_id, cpus, memory_mb in db.execute(stmt).all():
+            if task_instance_id in seen or len(claimed) + len(ids) >= limit:
+                continue
+            seen.add(task_instance_id)
+            cpus, memory_mb = cpus or 0.0, memory_mb or 0
+            if budgeted:
+                if not fits(cpus, memory_mb, free_cpus, free_memory_mb, idle):
+                    continue
+                if free_cpus is not None:
+                    free_cpus -= cpus
+                if free_memory_mb is not None:
+                    free_memory_mb -= memory_mb
+                idle = False
+            ids.append(task_instance_id)
+        if not ids:
+            break
+        claimed.extend(
+            transition_tasks(
+                db,
+                ids,
+                TaskState.QUEUED,
+                TaskState.RUNNING,
+                started_at=started_at,
+                worker_id=worker_id,
+                lease_expires_at=lease_expires_at,
+                log_url=_log_url(worker_url),
+            )
+        )
+    return get_task_instances_by_ids(db, claimed)
+
+
+def renew_leases(
+    db: Session,
+    worker_ids: list[str],
+    task_instance_ids: list[str],
+    lease_expires_at: str,
+) -> int:
+    """Extend the leases of tasks a worker still runs; returns rows renewed.
+
+    ``worker_ids`` are the names the worker is recorded under (its URL for
+    pushed tasks, its worker id for claimed ones).
+    """
+    renewed = 0
+    for start in range(0, len(task_instance_ids), _IN_CHUNK_SIZE):
+        chunk = task_instance_ids[start : start + _IN_CHUNK_SIZE]
+        result = db.execute(
+            update(TaskInstance)
+            .where(
+                TaskInstance.id.in_(chunk),
+                TaskInstance.status == TaskState.RUNNING,
+                TaskInstance.worker_id.in_(worker_ids),
+            )
+            .values(lease_expires_at=lease_expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        renewed += result.rowcount
+    db.commit()
+    return renewed
+
+
+def expire_worker_leases(db: Session, worker_ids: list[str], now: str) -> int:
+    """End the leases of everything a lost worker was running, right away."""
+    result = db.execute(
+        update(TaskInstance)
+        .where(
+            TaskInstance.status == TaskState.RUNNING,
+            TaskInstance.worker_id.in_(worker_ids),
+            TaskInstance.lease_expires_at.is_not(None),
+        )
+        .values(lease_expires_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def reap_expired_leases(db: Session, now: str, limit: int = 1000) -> list[TaskInstance]:
+    """Fail RUNNING tasks whose lease ran out, with the usual retry rules.
+
+    Tasks with retries left go to RETRYING with their backoff's
+    ``not_before`` (the scheduler requeues them when it is due, consuming a
+    retry), the rest to FAILED. Candidates are a range scan of
+    ``ix_task_instances_status_lease``, so the cost follows the number of
+    expired tasks rather than the number of RUNNING ones.
+    """
+    rows = db.execute(
+        select(
+            TaskInstance.id,
+            TaskInstance.retries_left,
+            TaskInstance.max_retries,
+            *(getattr(TaskInstance, field) for field in RETRY_FIELDS),
+        )
+        .where(
+            TaskInstance.status == TaskState.RUNNING,
+            TaskInstance.lease_expires_at <= now,
+        )
+        .limit(limit)
+    ).all()
+    output = "Lease expired: the worker stopped reporting this task"
+    moved: list[str] = []
+    for to_status, ids in (
+        (TaskState.RETRYING, [r.id for r in rows if r.retries_left > 0]),
+        (TaskState.FAILED, [r.id for r in rows if r.retries_left <= 0]),
+    ):
+        moved.extend(
+            transition_tasks(
+                db,
+                ids,
+                TaskState.RUNNING,
+                to_status,
+                commit=False,
+                finished_at=now,
+                output=output,
+                lease_expires_at=None,
+            )
+        )
+    reaped = set(moved)
+    failed_at = datetime.fromisoformat(now)
+    timed = [
+        {"id": r.id, "not_before": retry_at(r, failed_at)}
+        for r in rows
+        if r.retries_left > 0 and r.id in reaped
+    ]
+    if timed:
+        db.execute(update(TaskInstance), timed)
+    db.commit()
+    return get_task_instances_by_ids(db, moved)
+
+
+# ── Per-run task counters ───────────────────────────────────────────────────
+
+
+def run_task_counts(run: WorkflowRun) -> dict[str, int]:
+    """The run's stored per-state task counts, keyed by TaskState."""
+    return {state: getattr(run, column) for state, column in COUNTER_COLUMNS.items()}
+
+
+def _count_transition(deltas: dict[str, Counter], run_id: str, old: str, new: str):
+    if old == new:
+        return
+    delta = deltas.setdefault(run_id, Counter())
+    delta[old] -= 1
+    delta[new] += 1
+
+
+def _apply_counter_deltas(db: Session, deltas: dict[str, Counter]):
+    """Increment run counters in SQL so concurrent writers never lose updates."""
+    for run_id, delta in deltas.items():
+        values = {
+            COUNTER_COLUMNS[state]: getattr(WorkflowRun, COUNTER_COLUMNS[state]) + n
+            for state, n in delta.items()
+            if n and state in COUNTER_COLUMNS
+        }
+        if values:
+            db.execute(
+                update(WorkflowRun)
+                .where(WorkflowRun.id == run_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+
+def count_task_states(
+    db: Session, run_ids: list[str] | None = None
+) -> dict[str, dict[str, int]]:
+    """Recount task states from ``task_instances`` (a full scan without run_ids)."""
+    query = db.query(TaskInstance.run_id, TaskInstance.status, func.count()).group_by(
+        TaskInstance.run_id, TaskInstance.status
+    )
+    if run_ids is not None:
+        query = query.filter(TaskInstance.run_id.in_(run_ids))
+    counts: dict[str, dict[str, int]] = {}
+    for run_id, status, n in query:
+        counts.setdefault(run_id, dict.fromkeys(COUNTER_COLUMNS, 0))[status] = n
+    return counts
+
+
+def find_counter_drift(
+    db: Session, run_ids: list[str] | None = None
+) -> list[tuple[str, dict[str, int], dict[str, int]]]:
+    """Return ``(run_id, stored, actual)`` for every run whose counters drifted."""
+    actual = count_task_states(db, run_ids)
+    query = db.query(WorkflowRun)
+    if run_ids is not None:
+        query = query.filter(WorkflowRun.id.in_(run_ids))
+    drift = []
+    for run in query:
+        stored = run_task_counts(run)
+        expected = actual.get(run.id, dict.fromkeys(COUNTER_COLUMNS, 0))
+        if stored != expected:
+            drift.append((run.id, stored, expected))
+    return drift
+
+
+def recompute_run_counters(db: Session, run_ids: list[str] | None = None) -> int:
+    """Overwrite drifted counters with recounted values; returns runs fixed."""
+    drift = find_counter_drift(db, run_ids)
+    for run_id, _, expected in drift:
+        db.execute(
+            update(WorkflowRun)
+            .where(WorkflowRun.id == run_id)
+            .values(
+                **{COUNTER_COLUMNS[state]: n for state, n in expected.items()}
+            )
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return len(drift)
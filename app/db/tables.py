@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey
+from sqlalchemy import Column, Float, String, Integer, Text, ForeignKey, Index
 from app.db.database import Base
 
 
@@ -8,29 +8,83 @@ class Workflow(Base):
     id = Column(String, primary_key=True)
     definition = Column(Text, nullable=False)
     created_at = Column(String, nullable=False)
+    # Bumped whenever the definition changes; keys the compiled-DAG cache
+    version = Column(Integer, nullable=False, default=1)
+    # Scheduled workflows: the schedule time of the next run to create
+    # (None: not scheduled, or the schedule has no time left)
+    next_run_at = Column(String, nullable=True)
 
 
 class WorkflowRun(Base):
     __tablename__ = "workflow_runs"
+    __table_args__ = (
+        Index("ix_workflow_runs_status", "status"),
+        # Latest runs of a workflow (task duration history)
+        Index("ix_workflow_runs_workflow_id_started_at", "workflow_id", "started_at"),
+    )
 
     id = Column(String, primary_key=True)
     workflow_id = Column(String, ForeignKey("workflows.id"), nullable=False)
     status = Column(String, nullable=False, default="PENDING")
     started_at = Column(String, nullable=False)
     finished_at = Column(String, nullable=True)
+    # Runs created by the workflow's schedule: the schedule time they are for
+    scheduled_at = Column(String, nullable=True)
+    # Task instances of this run per state, maintained in the same
+    # transaction as every task transition (see repository.py)
+    pending_count = Column(Integer, nullable=False, default=0)
+    queued_count = Column(Integer, nullable=False, default=0)
+    running_count = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    retrying_count = Column(Integer, nullable=False, default=0)
+    upstream_failed_count = Column(Integer, nullable=False, default=0)
 
 
 class TaskInstance(Base):
     __tablename__ = "task_instances"
+    __table_args__ = (
+        Index("ix_task_instances_run_id_status", "run_id", "status"),
+        # Oldest-first claims of QUEUED tasks in pull dispatch mode
+        Index("ix_task_instances_status_queued_at", "status", "queued_at"),
+        # Lease reaper: expired RUNNING tasks without scanning all of them
+        Index("ix_task_instances_status_lease", "status", "lease_expires_at"),
+    )
 
     id = Column(String, primary_key=True)
     run_id = Column(String, ForeignKey("workflow_runs.id"), nullable=False)
     task_id = Column(String, nullable=False)
+    # Empty for callable tasks
     command = Column(Text, nullable=False)
+    # Python callable tasks: JSON {"target", "args", "kwargs"}
+    callable = Column(Text, nullable=True)
     status = Column(String, nullable=False, default="PENDING")
     retries_left = Column(Integer, nullable=False, default=0)
     max_retries = Column(Integer, nullable=False, default=0)
     started_at = Column(String, nullable=True)
     finished_at = Column(String, nullable=True)
+    # Head and tail of the task's output; the full log stays on the worker
     output = Column(Text, nullable=True)
     worker_id = Column(String, nullable=True)
+    # Worker endpoint serving the full log of the latest attempt
+    log_url = Column(String, nullable=True)
+    # Pull dispatch mode: when the task became claimable
+    queued_at = Column(String, nullable=True)
+    # RUNNING tasks: until when the worker holds the task without renewing
+    # (heartbeats, /health probes, claims); after that it is reaped
+    lease_expires_at = Column(String, nullable=True)
+    # Declared limits and requests (None: worker default / nothing reserved)
+    timeout = Column(Float, nullable=True)
+    cpus = Column(Float, nullable=True)
+    memory_mb = Column(Integer, nullable=True)
+    # Retry backoff policy (None: the master's RETRY_* defaults)
+    retry_delay = Column(Float, nullable=True)
+    retry_backoff = Column(Float, nullable=True)
+    max_retry_delay = Column(Float, nullable=True)
+    # RETRYING tasks: when the retry is due; the scheduler rebuilds its
+    # retry timers from it after a restart
+    not_before = Column(String, nullable=True)
+    # Measured by the worker for the latest attempt
+    peak_rss_kb = Column(Integer, nullable=True)
+    cpu_seconds = Column(Float, nullable=True)
+    wall_seconds = Column(Float, nullable=True)
@@ -5,7 +5,9 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.api.routes import router
+from app.core.logtail import LogTails
 from app.core.scheduler import Scheduler
+from app.core.triggers import RunTrigger
 from app.db.database import init_db
 
 logging.basicConfig(
@@ -14,15 +16,25 @@ logging.basicConfig(
 )
 
 scheduler = Scheduler()
+trigger = RunTrigger(scheduler)
+log_tails = LogTails()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    task = asyncio.create_task(scheduler.start())
+    tasks = [
+        asyncio.create_task(scheduler.start()),
+        asyncio.create_task(trigger.start()),
+    ]
     yield
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    await log_tails.close()
 
 
 app = FastAPI(title="Airflow Mini", lifespan=lifespan)
+app.state.scheduler = scheduler
+app.state.trigger = trigger
+app.state.log_tails = log_tails
 app.include_router(router)
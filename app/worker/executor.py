@@ -1,21 +1,274 @@
+import asyncio
+import os
+import signal
 import subprocess
+import sys
+import threading
+import time
 
+from app.worker.logs import CHUNK_SIZE, LogFile, OutputCapture
 
-def execute_command(command: str, timeout: int = 300) -> tuple[bool, str]:
-    """Run a shell command and return (success, output)."""
+
+def execute_command(
+    command: str,
+    timeout: float = 300,
+    log_path: str | None = None,
+    head_bytes: int = 8192,
+    tail_bytes: int = 8192,
+    memory_mb: int | None = None,
+    cpu_seconds: int | None = None,
+    usage: dict | None = None,
+    log_max_bytes: int = 0,
+) -> tuple[bool, str]:
+    """Run a shell command and return (success, output).
+
+    stdout and stderr are read as one stream in fixed-size chunks and
+    appended to ``log_path`` as they arrive; the returned output keeps
+    only the first ``head_bytes`` and last ``tail_bytes``, so memory use
+    does not grow with what the command prints. With ``log_max_bytes`` the
+    log keeps only its head and tail too (see ``LogFile``). ``memory_mb`` and
+    ``cpu_seconds`` become rlimits of every process the command starts
+    (see ``limited``); ``usage``, if given, receives what it consumed.
+    """
+    capture = OutputCapture(head_bytes, tail_bytes)
+    started = time.monotonic()
     try:
-        result = subprocess.run(
-            command,
+        proc = subprocess.Popen(
+            limited(command, memory_mb, cpu_seconds),
             shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Own process group, so a timeout also kills the shell's children
+            start_new_session=True,
+        )
+    except Exception as e:
+        return False, f"Execution error: {e}"
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        kill_process_group(proc.pid)
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    rusage = None
+    try:
+        log = _open_log(log_path, log_max_bytes)
+        try:
+            for chunk in iter(lambda: proc.stdout.read1(CHUNK_SIZE), b""):
+                capture.write(chunk)
+                if log is not None:
+                    log.write(chunk)
+        finally:
+            if log is not None:
+                log.close(bytes(capture.tail))
+        returncode, rusage = _wait_with_usage(proc)
+    except Exception as e:
+        kill()
+        proc.wait()
+        return False, f"Execution error: {e}"
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+        _record_usage(usage, started, rusage)
+
+    if timed_out.is_set():
+        return False, _timed_out(capture)
+    return returncode == 0, capture.text()
+
+
+async def execute_command_async(
+    command: str,
+    timeout: float = 300,
+    log_path: str | None = None,
+    head_bytes: int = 8192,
+    tail_bytes: int = 8192,
+    memory_mb: int | None = None,
+    cpu_seconds: int | None = None,
+    usage: dict | None = None,
+    log_max_bytes: int = 0,
+) -> tuple[bool, str]:
+    """``execute_command`` for an event loop; no thread waits on the command.
+
+    A timeout, or cancelling the awaiting task, kills the command's whole
+    process group. CPU time and peak RSS are only measured where the pidfd
+    child watcher reaps the command (Python < 3.12).
+    """
+    capture = OutputCapture(head_bytes, tail_bytes)
+    started = time.monotonic()
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            limited(command, memory_mb, cpu_seconds),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
         )
-        output = result.stdout
-        if result.stderr:
-            output += result.stderr
-        return result.returncode == 0, output.strip()
-    except subprocess.TimeoutExpired:
-        return False, "Command timed out"
     except Exception as e:
         return False, f"Execution error: {e}"
+
+    async def pump() -> int:
+        log = _open_log(log_path, log_max_bytes)
+        try:
+            while chunk := await proc.stdout.read(CHUNK_SIZE):
+                capture.write(chunk)
+                if log is not None:
+                    log.write(chunk)
+        finally:
+            if log is not None:
+                log.close(bytes(capture.tail))
+        return await proc.wait()
+
+    try:
+        returncode = await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        kill_process_group(proc.pid)
+        await proc.wait()
+        return False, _timed_out(capture)
+    except BaseException as e:
+        # Cancelled (or failed): never leave the command running
+        kill_process_group(proc.pid)
+        await asyncio.shield(proc.wait())
+        if isinstance(e, Exception):
+            return False, f"Execution error: {e}"
+        raise
+    finally:
+        _record_usage(usage, started, _child_usage.pop(proc.pid, None))
+    return returncode == 0, capture.text()
+
+
+def limited(command: str, memory_mb: int | None, cpu_seconds: int | None) -> str:
+    """``command`` behind ``ulimit``s, which every process it starts inherits.
+
+    Memory is capped as address space (RLIMIT_AS, stricter than RSS) and
+    CPU as seconds of CPU time per process (RLIMIT_CPU). If a limit cannot
+    be set the command does not run.
+    """
+    limits = []
+    if memory_mb:
+        limits.append(f"ulimit -v {int(memory_mb) * 1024} || exit 126\n")
+    if cpu_seconds:
+        limits.append(f"ulimit -t {int(cpu_seconds)} || exit 126\n")
+    return "".join(limits) + command
+
+
+def kill_process_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _wait_with_usage(proc: subprocess.Popen):
+    """Reap ``proc`` like ``wait()``, also returning its resource usage.
+
+    The usage covers the shell and the children it waited for.
+    """
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except InterruptedError:
+            continue
+        except ChildProcessError:
+            # Reaped elsewhere
+            return proc.wait(), None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, rusage
+
+
+def _record_usage(usage: dict | None, started: float, rusage):
+    if usage is None:
+        return
+    usage["wall_seconds"] = round(time.monotonic() - started, 3)
+    if rusage is not None:
+        usage["cpu_seconds"] = round(rusage.ru_utime + rusage.ru_stime, 3)
+        # Kilobytes on Linux, bytes on macOS
+        scale = 1024 if sys.platform == "darwin" else 1
+        usage["peak_rss_kb"] = rusage.ru_maxrss // scale
+
+
+def _open_log(log_path: str | None, max_bytes: int = 0) -> LogFile | None:
+    if not log_path:
+        return None
+    return LogFile(log_path, max_bytes)
+
+
+def _timed_out(capture: OutputCapture) -> str:
+    return "\n".join(filter(None, (capture.text(), "Command timed out")))
+
+
+# pid -> resource usage of asyncio subprocesses the child watcher reaped,
+# until ``execute_command_async`` picks it up
+_child_usage: dict = {}
+
+
+def use_pidfd_child_watcher():
+    """Wait for subprocesses with pidfds instead of a thread per child.
+
+    Python 3.12+ does this by itself; before that the default watcher
+    blocks one thread in ``waitpid`` for every running subprocess, and the
+    stock ``PidfdChildWatcher`` only serves a single attached loop.
+    """
+    if sys.version_info >= (3, 12) or isinstance(
+        _child_watcher(), _PidfdChildWatcher
+    ):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    asyncio.set_child_watcher(_PidfdChildWatcher())
+
+
+def _child_watcher():
+    policy = asyncio.get_event_loop_policy()
+    return getattr(policy, "_watcher", None)
+
+
+if sys.version_info < (3, 12):
+
+    class _PidfdChildWatcher(asyncio.AbstractChildWatcher):
+        """The Python 3.12 pidfd watcher: works for whichever loop is running.
+
+        It also keeps the resource usage of the children in ``_child_usage``.
+        """
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def is_active(self):
+            return True
+
+        def close(self):
+            pass
+
+        def attach_loop(self, loop):
+            pass
+
+        def add_child_handler(self, pid, callback, *args):
+            loop = asyncio.get_running_loop()
+            pidfd = os.pidfd_open(pid)
+            loop.add_reader(pidfd, self._do_wait, loop, pid, pidfd, callback, args)
+
+        def _do_wait(self, loop, pid, pidfd, callback, args):
+            loop.remove_reader(pidfd)
+            try:
+                _, status, rusage = os.wait4(pid, 0)
+            except ChildProcessError:
+                # Already reaped elsewhere
+                returncode = 255
+            else:
+                returncode = os.waitstatus_to_exitcode(status)
+                _child_usage[pid] = rusage
+            os.close(pidfd)
+            callback(pid, returncode, *args)
+
+        def remove_child_handler(self, pid):
+            return True
+
+else:
+    _PidfdChildWatcher = None
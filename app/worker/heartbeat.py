@@ -0,0 +1,70 @@
+import logging
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Registers a worker with the master and keeps its membership alive.
+
+    A background thread POSTs ``{worker_id, url, load, running}`` to the
+    master's heartbeat endpoint every ``interval`` seconds; the first beat
+    doubles as registration, a master that restarted learns about the
+    worker again on the next beat, and the leases of the ``running`` tasks
+    are renewed. ``stop`` deregisters so the master stops placing tasks
+    here right away instead of waiting for the timeout.
+    """
+
+    def __init__(
+        self,
+        master_url: str,
+        worker_id: str,
+        worker_url: str,
+        interval: float,
+        load=None,
+        running=None,
+        post=None,
+    ):
+        self.master_url = master_url.rstrip("/")
+        self.worker_id = worker_id
+        self.worker_url = worker_url
+        self.interval = interval
+        self._load = load or (lambda: None)
+        self._running = running or (lambda: [])
+        self._post = post or self._http_post
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="worker-heartbeat", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+        self._send("deregister")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._send("heartbeat")
+            self._stop.wait(self.interval)
+
+    def _send(self, kind: str):
+        payload = {
+            "worker_id": self.worker_id,
+            "url": self.worker_url,
+            "load": self._load(),
+            "running": self._running(),
+        }
+        try:
+            self._post(f"{self.master_url}/internal/workers/{kind}", payload)
+        except Exception as e:
+            logger.warning("[%s] Worker %s to master failed: %s", self.worker_id, kind, e)
+
+    def _http_post(self, url: str, payload: dict):
+        httpx.post(url, json=payload, timeout=self.interval).raise_for_status()
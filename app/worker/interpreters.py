@@ -0,0 +1,329 @@
+import contextlib
+import importlib
+import logging
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection, Pipe
+
+from app.worker.executor import kill_process_group
+from app.worker.logs import OutputCapture
+
+logger = logging.getLogger(__name__)
+
+
+class InterpreterPool:
+    """Warm Python processes that run ``module:function`` tasks.
+
+    Each process imports ``preload`` once and then runs one task after
+    another, so a task costs a pipe round trip instead of a fork, a shell
+    and an interpreter start. Processes are started on first use (or all
+    at once by ``start``) and kept while they are healthy. A process is
+    replaced after ``max_tasks`` tasks, once its RSS passes
+    ``max_rss_bytes``, or when a task times out or kills it. Any number of
+    threads may call ``run``; they wait while all ``size`` processes are busy.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        preload: tuple[str, ...] = (),
+        max_tasks: int = 1000,
+        max_rss_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.size = size
+        self.preload = tuple(preload)
+        self.max_tasks = max_tasks
+        self.max_rss_bytes = max_rss_bytes
+        # Most recently used first, for the warmest caches; None is a free
+        # place for a process that has not been started (or was retired)
+        self._idle: queue.LifoQueue[_Interpreter | None] = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+        self._lock = threading.Lock()
+        self._live: set[_Interpreter] = set()
+        self._closed = False
+
+    def start(self):
+        """Start every process now instead of on first use."""
+        taken = []
+        try:
+            while True:
+                taken.append(self._idle.get_nowait())
+        except queue.Empty:
+            pass
+        for k, interpreter in enumerate(taken):
+            if interpreter is None:
+                taken[k] = self._spawn()
+        for interpreter in taken:
+            self._idle.put(interpreter)
+
+    def run(
+        self,
+        target: str,
+        args: list | None = None,
+        kwargs: dict | None = None,
+        timeout: float = 300,
+        log_path: str | None = None,
+        head_bytes: int = 8192,
+        tail_bytes: int = 8192,
+        memory_mb: int | None = None,
+        cpu_seconds: int | None = None,
+        usage: dict | None = None,
+    ) -> tuple[bool, str]:
+        """Call ``target`` ("package.module:function") and return (success, output).
+
+        What it prints (and a non-None return value, printed last) goes to
+        ``log_path``; the output keeps its first ``head_bytes`` and last
+        ``tail_bytes``, like ``execute_command``. An exception fails the
+        task with its traceback as output. ``memory_mb`` and ``cpu_seconds``
+        are the interpreter's soft rlimits while the task runs; ``usage``,
+        if given, receives what the task consumed.
+        """
+        started = time.monotonic()
+        temporary = log_path is None
+        if temporary:
+            fd, log_path = tempfile.mkstemp(prefix="airflow-mini-", suffix=".log")
+            os.close(fd)
+        else:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        try:
+            success, error = self._call(
+                (target, args or [], kwargs or {}, log_path, memory_mb, cpu_seconds),
+                timeout,
+                usage,
+            )
+            capture = OutputCapture.from_file(log_path, head_bytes, tail_bytes)
+        finally:
+            if temporary:
+                os.unlink(log_path)
+            if usage is not None:
+                usage["wall_seconds"] = round(time.monotonic() - started, 3)
+        if error:
+            return False, "\n".join(filter(None, (capture.text(), error)))
+        return success, capture.text()
+
+    def _call(self, job: tuple, timeout: float, usage: dict | None) -> tuple[bool, str | None]:
+        interpreter = self._checkout()
+        keep = False
+        try:
+            try:
+                interpreter.conn.send(job)
+                if not interpreter.conn.poll(timeout):
+                    return False, "Command timed out"
+                success, rss, task_usage = interpreter.conn.recv()
+            except (EOFError, OSError) as e:
+                return False, f"Execution error: interpreter exited ({e!r})"
+            if usage is not None:
+                usage.update(task_usage)
+            interpreter.tasks += 1
+            keep = interpreter.tasks < self.max_tasks and rss < self.max_rss_bytes
+            return success, None
+        finally:
+            self._checkin(interpreter, keep)
+
+    def _checkout(self) -> "_Interpreter":
+        if self._closed:
+            raise RuntimeError("Interpreter pool is closed")
+        interpreter = self._idle.get()
+        if interpreter is None:
+            try:
+                interpreter = self._spawn()
+            except BaseException:
+                self._idle.put(None)
+                raise
+        return interpreter
+
+    def _checkin(self, interpreter: "_Interpreter", keep: bool):
+        if keep and not self._closed:
+            self._idle.put(interpreter)
+            return
+        self._retire(interpreter)
+        self._idle.put(None)
+
+    def _spawn(self) -> "_Interpreter":
+        interpreter = _Interpreter(self.preload)
+        with self._lock:
+            self._live.add(interpreter)
+        return interpreter
+
+    def _retire(self, interpreter: "_Interpreter"):
+        with self._lock:
+            self._live.discard(interpreter)
+        interpreter.stop()
+
+    def close(self):
+        """Stop every process, killing the tasks still running in them."""
+        self._closed = True
+        with self._lock:
+            live, self._live = self._live, set()
+        for interpreter in live:
+            interpreter.stop()
+
+
+class _Interpreter:
+    """One pooled process and the parent's end of its pipe."""
+
+    def __init__(self, preload: tuple[str, ...]):
+        self.conn, child = Pipe()
+        try:
+            # Its own session, so stopping it also kills what a task started
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", __name__, str(child.fileno()), *preload],
+                stdin=subprocess.DEVNULL,
+                env=_child_env(),
+                pass_fds=(child.fileno(),),
+                start_new_session=True,
+            )
+        finally:
+            child.close()
+        self.tasks = 0
+
+    def stop(self):
+        if self.process.poll() is None:
+            kill_process_group(self.process.pid)
+        self.process.wait()
+        self.conn.close()
+
+
+def _child_env() -> dict:
+    # "-m app.worker.interpreters" must work whatever the worker's cwd is
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    path = os.environ.get("PYTHONPATH")
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (root, path)))}
+
+
+def _serve(conn: Connection, preload: list[str]):
+    """Process main loop: run tasks from ``conn`` until the parent goes away."""
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            logger.exception("Preloading %s failed", name)
+    while True:
+        try:
+            target, args, kwargs, log_path, memory_mb, cpu_seconds = conn.recv()
+        except (EOFError, OSError):
+            return
+        cpu_before = _cpu_seconds()
+        _reset_peak_rss()
+        with _limits(memory_mb, cpu_seconds):
+            success = _run_task(target, args, kwargs, log_path)
+        usage = {"cpu_seconds": round(_cpu_seconds() - cpu_before, 3)}
+        peak = _peak_rss_kb()
+        if peak is not None:
+            usage["peak_rss_kb"] = peak
+        conn.send((success, _rss_bytes(), usage))
+
+
+def _run_task(target: str, args: list, kwargs: dict, log_path: str) -> bool:
+    """Call the task with fds 1 and 2 (and sys.stdout/stderr) on its log."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    # Unbuffered, so readers of the log see output as it arrives
+    with open(log_path, "wb", buffering=0) as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+    try:
+        try:
+            result = resolve(target)(*args, **kwargs)
+            if result is not None:
+                print(result)
+            return True
+        except BaseException:
+            traceback.print_exc()
+            return False
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+@contextlib.contextmanager
+def _limits(memory_mb: int | None, cpu_seconds: int | None):
+    """Lower the soft rlimits for one task, then put them back.
+
+    Only soft limits change (never above the hard ones), so they can be
+    raised again for the next task. A task over its CPU time gets SIGXCPU,
+    which ends the interpreter; the pool then replaces it.
+    """
+    changed = []
+    if memory_mb:
+        changed.append((resource.RLIMIT_AS, int(memory_mb) * 1024 * 1024))
+    if cpu_seconds:
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        spent = int(used.ru_utime + used.ru_stime)
+        changed.append((resource.RLIMIT_CPU, spent + int(cpu_seconds)))
+    saved = []
+    for which, value in changed:
+        soft, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(which, (value, hard))
+        saved.append((which, soft, hard))
+    try:
+        yield
+    finally:
+        for which, soft, hard in saved:
+            resource.setrlimit(which, (soft, hard))
+
+
+def _cpu_seconds() -> float:
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        used = resource.getrusage(who)
+        total += used.ru_utime + used.ru_stime
+    return total
+
+
+def _reset_peak_rss():
+    # Linux: writing 5 resets VmHWM, so the next reading is this task's peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_kb() -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def resolve(target: str):
+    """The object named by ``"package.module:attribute.path"``."""
+    module_name, _, attribute = target.partition(":")
+    obj = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak rather than current RSS, but it only ever triggers a recycle
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+if __name__ == "__main__":
+    _serve(Connection(int(sys.argv[1])), sys.argv[2:])
@@ -0,0 +1,241 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class OutputCapture:
+    """Keeps the first ``head_bytes`` and last ``tail_bytes`` of a stream.
+
+    Everything in between is only counted, so memory stays bounded however
+    much a task prints; the full output lives in the task's log file.
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    @classmethod
+    def from_file(cls, path: str, head_bytes: int, tail_bytes: int) -> "OutputCapture":
+        """The capture of a finished log, reading only its head and tail."""
+        capture = cls(head_bytes, tail_bytes)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            capture.head += f.read(head_bytes)
+            f.seek(max(len(capture.head), size - tail_bytes))
+            capture.tail += f.read(size - f.tell())
+        capture.total = size
+        return capture
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk and self.tail_bytes > 0:
+            self.tail += chunk[-self.tail_bytes:]
+            del self.tail[: max(0, len(self.tail) - self.tail_bytes)]
+
+    @property
+    def omitted(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        if self.omitted:
+            data = (
+                bytes(self.head)
+                + f"\n... [{self.omitted} bytes omitted, see the task log] ...\n".encode()
+                + bytes(self.tail)
+            )
+        else:
+            data = bytes(self.head + self.tail)
+        return data.decode("utf-8", errors="replace").strip()
+
+
+class LogFile:
+    """A task's log file, written unbuffered so readers see output as it arrives.
+
+    With ``max_bytes``, only the first ``max_bytes`` of the output are
+    written as it arrives; the rest is only counted, and ``close`` appends
+    the last bytes of the output it is given (the capture's tail) after an
+    omission marker. The file then keeps its head and tail, like the
+    captured output, and a chatty task cannot fill the worker's disk.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.dropped = 0
+        self._file = open(path, "wb", buffering=0)
+
+    def write(self, chunk: bytes):
+        if self.max_bytes:
+            room = max(0, self.max_bytes - self.written)
+            self.dropped += max(0, len(chunk) - room)
+            chunk = chunk[:room]
+        if chunk:
+            self._file.write(chunk)
+            self.written += len(chunk)
+
+    def close(self, tail: bytes = b""):
+        try:
+            if self.dropped:
+                tail = tail[len(tail) - min(len(tail), self.dropped) :]
+                omitted = self.dropped - len(tail)
+                if omitted:
+                    self._file.write(
+                        f"\n... [{omitted} bytes omitted from the log] ...\n".encode()
+                    )
+                self._file.write(tail)
+        finally:
+            self._file.close()
+
+
+def sweep_logs(
+    log_dir: str,
+    max_age: float,
+    max_bytes: int,
+    keep=(),
+    now: float | None = None,
+) -> list[str]:
+    """Delete task logs past the retention limits; returns the deleted paths.
+
+    Logs last written more than ``max_age`` seconds ago go first, then the
+    oldest ones while the directory holds more than ``max_bytes`` (0
+    disables either limit). The logs of the task instances in ``keep``
+    (the ones still running) are never deleted.
+    """
+    now = time.time() if now is None else now
+    keep = {f"{task_instance_id}.log" for task_instance_id in keep}
+    logs = []
+    try:
+        with os.scandir(log_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".log") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                logs.append((stat.st_mtime, stat.st_size, entry.name))
+    except FileNotFoundError:
+        return []
+    logs.sort()
+    total = sum(size for _, size, _ in logs)
+    deleted = []
+    for mtime, size, name in logs:
+        if name in keep:
+            continue
+        too_old = max_age > 0 and now - mtime > max_age
+        too_big = max_bytes > 0 and total > max_bytes
+        if not (too_old or too_big):
+            continue
+        path = os.path.join(log_dir, name)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted.append(path)
+    return deleted
+
+
+class LogSweeper:
+    """Applies ``sweep_logs`` to a worker's log directory every ``interval``
+    seconds on a background thread; ``running`` returns the task instances
+    whose logs must stay."""
+
+    def __init__(
+        self,
+        log_dir: str,
+        interval: float,
+        max_age: float,
+        max_bytes: int,
+        running=None,
+    ):
+        self.log_dir = log_dir
+        self.interval = interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._running = running or (lambda: [])
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="log-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                deleted = sweep_logs(
+                    self.log_dir, self.max_age, self.max_bytes, self._running()
+                )
+                if deleted:
+                    logger.info("Deleted %d old task logs", len(deleted))
+            except Exception:
+                logger.exception("Sweeping task logs failed")
+            self._stop.wait(self.interval)
+
+
+def log_path(task_instance_id: str) -> str:
+    """Where the worker streams a task's output (the latest attempt)."""
+    if not task_instance_id or os.path.basename(task_instance_id) != task_instance_id:
+        raise ValueError(f"Invalid task instance id {task_instance_id!r}")
+    return os.path.join(config.WORKER_LOG_DIR, f"{task_instance_id}.log")
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse a single ``Range: bytes=...`` header into ``(start, end)``.
+
+    ``end`` is exclusive. Returns None without a header; raises ValueError
+    if the range is malformed or starts past the end of the file.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(f"Unsupported range {header!r}")
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        return max(0, size - int(last)), size
+    start = int(first)
+    end = size if not last else min(size, int(last) + 1)
+    if start >= size or start >= end:
+        raise ValueError(f"Range {header!r} not satisfiable for {size} bytes")
+    return start, end
+
+
+def read_range(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+    """Yield the bytes ``[start, end)`` of a file in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
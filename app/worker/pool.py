@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.worker.executor import use_pidfd_child_watcher
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionPool:
+    """A fixed number of execution slots in front of a bounded wait queue.
+
+    ``try_submit`` refuses work once every slot is busy and the queue is
+    full, so a burst of dispatches can never start more than ``slots``
+    tasks at once or pile up unbounded threads.
+    """
+
+    def __init__(self, slots: int, queue_size: int):
+        self.slots = slots
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        # Notified whenever a task finishes and frees a slot
+        self._slot_freed = threading.Condition(self._lock)
+        self._running = 0
+        self._queued = 0
+        self._executor = self._make_executor()
+
+    def _make_executor(self):
+        return ThreadPoolExecutor(
+            max_workers=self.slots, thread_name_prefix="task-slot"
+        )
+
+    def try_submit(self, fn, *args) -> bool:
+        if not self._reserve():
+            return False
+        self._executor.submit(self._run, fn, args)
+        return True
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._running + self._queued >= self.slots + self.queue_size:
+                return False
+            self._queued += 1
+            return True
+
+    def _started(self):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+
+    def _finished(self):
+        with self._lock:
+            self._running -= 1
+            self._slot_freed.notify_all()
+
+    def _run(self, fn, args):
+        self._started()
+        try:
+            fn(*args)
+        except Exception:
+            # Nobody reads the future: log it rather than lose it
+            logger.exception("Task %s failed", getattr(fn, "__name__", fn))
+        finally:
+            self._finished()
+
+    def wait_for_free_slot(self, timeout: float) -> bool:
+        """Block until a slot is free (nothing queued for it) or ``timeout``."""
+        with self._lock:
+            return self._slot_freed.wait_for(
+                lambda: self._running + self._queued < self.slots, timeout
+            )
+
+    def load(self) -> dict:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "running": self._running,
+                "queued": self._queued,
+                "queue_size": self.queue_size,
+                "free_slots": max(0, self.slots - self._running - self._queued),
+            }
+
+    def shutdown(self):
+        """Stop accepting work; running threads finish their tasks."""
+        self._executor.shutdown(wait=False)
+
+
+class AsyncExecutionPool(ExecutionPool):
+    """The same slots and queue, with tasks run as coroutines on one loop.
+
+    A task that mostly waits (on a subprocess, on HTTP) then costs a
+    coroutine instead of an OS thread, so one worker can supervise
+    thousands of them. The event loop runs in its own thread; submitted
+    functions must be coroutine functions, and ``try_submit`` may be
+    called from any thread. Blocking calls a task cannot avoid go through
+    ``run_blocking``. ``shutdown`` cancels whatever is still running.
+    """
+
+    def _make_executor(self):
+        use_pidfd_child_watcher()
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(self.slots)
+        self._tasks: set[asyncio.Task] = set()
+        # One thread per slot, so every running task can block at once;
+        # the loop's default executor has min(32, cpus + 4) threads
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.slots, thread_name_prefix="task-slot"
+        )
+        thread = threading.Thread(
+            target=self._loop.run_forever, name="task-loop", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def try_submit(self, fn, *args) -> bool:
+        if not self._reserve():
+            return False
+        self._loop.call_soon_threadsafe(self._spawn, fn, args)
+        return True
+
+    async def run_blocking(self, fn, *args):
+        """Call blocking ``fn`` from a task, on one of the pool's threads."""
+        return await self._loop.run_in_executor(self._threads, fn, *args)
+
+    def _spawn(self, fn, args):
+        task = self._loop.create_task(self._run_async(fn, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_async(self, fn, args):
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            with self._lock:
+                self._queued -= 1
+            raise
+        self._started()
+        try:
+            await fn(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Task %s failed", getattr(fn, "__name__", fn))
+        finally:
+            self._semaphore.release()
+            self._finished()
+
+    def shutdown(self, timeout: float = 5.0):
+        async def cancel_all():
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self._loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), self._loop).result(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._threads.shutdown(wait=False)
@@ -0,0 +1,94 @@
+import logging
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class WorkPuller:
+    """Claims tasks from the master whenever this worker has free slots.
+
+    Used in pull dispatch mode instead of ``/execute``: a background thread
+    long-polls ``/internal/work/claim`` for up to ``claim_size`` tasks (never
+    more than the free slots) and hands them to ``start``. Every request
+    also renews the leases of the tasks in ``running()``; when all slots
+    are busy it sends a renew-only request every ``renew_interval`` seconds
+    so that long tasks are not handed out again. ``load``, when given,
+    returns the load sent with each claim (free cores and memory included),
+    so the master only hands out tasks whose requests fit.
+    """
+
+    def __init__(
+        self,
+        master_url: str,
+        worker_id: str,
+        pool,
+        claim_size: int,
+        wait: float,
+        renew_interval: float,
+        running,
+        start,
+        worker_url: str | None = None,
+        post=None,
+        load=None,
+    ):
+        self.master_url = master_url.rstrip("/")
+        self.worker_id = worker_id
+        self.pool = pool
+        self.claim_size = claim_size
+        self.wait = wait
+        self.renew_interval = renew_interval
+        self._running = running
+        self._start = start
+        self.worker_url = worker_url
+        self._post = post or self._http_post
+        self._load = load
+        self._client: httpx.Client | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="work-puller", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            limit = min(self.claim_size, self.pool.load()["free_slots"])
+            if not limit and self.pool.wait_for_free_slot(self.renew_interval):
+                continue
+            request = {
+                "worker_id": self.worker_id,
+                "max_tasks": limit,
+                "wait": self.wait if limit else 0.0,
+                "running": list(self._running()),
+            }
+            if self.worker_url:
+                # Lets the master find the live logs of what we claim
+                request["url"] = self.worker_url
+            if self._load is not None:
+                request["load"] = self._load()
+            try:
+                body = self._post(f"{self.master_url}/internal/work/claim", request)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning("[%s] Claiming work failed: %s", self.worker_id, e)
+                self._stop.wait(min(self.renew_interval, 0.1 * 2**failures))
+                continue
+            for task in body["tasks"]:
+                self._start(task)
+
+    def _http_post(self, url: str, payload: dict) -> dict:
+        if self._client is None:
+            # One keep-alive connection for the life of the worker
+            self._client = httpx.Client()
+        resp = self._client.post(url, json=payload, timeout=payload["wait"] + 10.0)
+        resp.raise_for_status()
+        return resp.json()
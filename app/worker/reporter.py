@@ -0,0 +1,124 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ResultReporter:
+    """Buffers task results and flushes them to the master in batches.
+
+    A background thread sends a batch as soon as ``batch_size`` results are
+    waiting, the oldest result is ``flush_interval`` seconds old, or
+    ``is_idle()`` says no other results are about to arrive. Failed sends
+    are retried with exponential backoff and jitter for up to
+    ``retry_deadline`` seconds, keeping results in memory meanwhile; once
+    ``max_buffered`` results are waiting, ``report`` blocks the caller.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_buffered: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+        retry_deadline: float,
+        is_idle=None,
+        post=None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_deadline = retry_deadline
+        self._is_idle = is_idle or (lambda: False)
+        self._post = post or self._http_post
+        self._client: httpx.Client | None = None
+
+        self._buffer: deque[tuple[str, dict, float]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def report(self, url: str, result: dict):
+        """Queue ``result`` for delivery to the batch endpoint at ``url``."""
+        with self._cond:
+            while len(self._buffer) >= self.max_buffered:
+                self._cond.wait()
+            self._buffer.append((url, result, time.monotonic()))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="result-reporter", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            by_url: dict[str, list[dict]] = {}
+            for url, result, _ in batch:
+                by_url.setdefault(url, []).append(result)
+            for url, results in by_url.items():
+                self._deliver(url, results)
+
+    def _next_batch(self) -> list[tuple[str, dict, float]]:
+        with self._cond:
+            while not self._buffer:
+                self._cond.wait()
+            while len(self._buffer) < self.batch_size and not self._is_idle():
+                remaining = self._buffer[0][2] + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            self._cond.notify_all()
+            return batch
+
+    def _deliver(self, url: str, results: list[dict]):
+        deadline = time.monotonic() + self.retry_deadline
+        delay = self.retry_base_delay
+        attempt = 1
+        while True:
+            try:
+                if self._post(url, {"results": results}):
+                    return
+            except Exception as e:
+                logger.warning(
+                    "Result delivery to %s failed (attempt %d): %s", url, attempt, e
+                )
+            # Full jitter keeps many workers from retrying in lockstep
+            sleep_for = random.uniform(0, delay)
+            if time.monotonic() + sleep_for > deadline:
+                logger.error(
+                    "Giving up on %d results for %s after %d attempts",
+                    len(results),
+                    url,
+                    attempt,
+                )
+                return
+            time.sleep(sleep_for)
+            delay = min(delay * 2, self.retry_max_delay)
+            attempt += 1
+
+    def _http_post(self, url: str, body: dict) -> bool:
+        """POST a batch; True once the master has taken it (or can never take it)."""
+        if self._client is None:
+            self._client = httpx.Client(timeout=10.0)
+        resp = self._client.post(url, json=body)
+        if resp.status_code >= 500:
+            logger.warning("Master returned %s for result batch", resp.status_code)
+            return False
+        if resp.status_code != 200:
+            logger.error("Master rejected result batch: %s", resp.text)
+        return True
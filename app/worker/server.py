@@ -1,56 +1,425 @@
+import asyncio
 import logging
+import math
 import os
 import threading
+from contextlib import asynccontextmanager
 
 import httpx
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.worker.executor import execute_command
+from app import config
+from app.worker.executor import execute_command, execute_command_async
+from app.core.placement import fits
+from app.worker.heartbeat import Heartbeat
+from app.worker.interpreters import InterpreterPool
+from app.worker.logs import LogSweeper, log_path, parse_range, read_range
+from app.worker.pool import AsyncExecutionPool, ExecutionPool
+from app.worker.puller import WorkPuller
+from app.worker.reporter import ResultReporter
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Airflow Mini Worker")
-
 WORKER_ID = os.getenv("WORKER_ID", "worker-unknown")
 
+# Task instances currently executing on this worker, with the cores and
+# memory (MB) they requested; the totals are kept alongside
+_running: dict[str, tuple[float, int]] = {}
+_running_lock = threading.Lock()
+# The attempt each running task reports its result as: the latest one the
+# master sent, so a re-dispatch of a task still running here adopts it
+_attempts: dict[str, str | None] = {}
+_reserved_cpus = 0.0
+_reserved_memory_mb = 0
+
+# "thread": one OS thread per running task; "asyncio": tasks are coroutines
+# on one event loop, for many mostly-waiting tasks per worker
+pool = (AsyncExecutionPool if config.WORKER_EXECUTOR == "asyncio" else ExecutionPool)(
+    config.WORKER_SLOTS, config.WORKER_QUEUE_SIZE
+)
+# Warm Python processes for callable tasks
+interpreters = InterpreterPool(
+    config.WORKER_PYTHON_PROCESSES,
+    preload=config.WORKER_PYTHON_PRELOAD,
+    max_tasks=config.WORKER_PYTHON_MAX_TASKS,
+    max_rss_bytes=config.WORKER_PYTHON_MAX_RSS_MB * 1024 * 1024,
+)
+# Callback client of the asyncio executor (created on the pool's loop)
+_async_client: httpx.AsyncClient | None = None
+
+reporter = ResultReporter(
+    batch_size=config.RESULT_BATCH_SIZE,
+    flush_interval=config.RESULT_FLUSH_INTERVAL,
+    max_buffered=config.RESULT_MAX_BUFFERED,
+    retry_base_delay=0.1,
+    retry_max_delay=config.RESULT_RETRY_MAX_DELAY,
+    retry_deadline=config.RESULT_RETRY_DEADLINE,
+    # Nothing else is running, so no other result is worth waiting for
+    is_idle=lambda: not _running,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.WORKER_PYTHON_PRELOAD:
+        # Warm every interpreter before the first task needs one
+        await asyncio.to_thread(interpreters.start)
+    # Old logs of finished tasks are deleted, so logs cannot fill the disk
+    sweeper = LogSweeper(
+        config.WORKER_LOG_DIR,
+        config.WORKER_LOG_SWEEP_INTERVAL,
+        config.WORKER_LOG_MAX_AGE,
+        config.WORKER_LOG_MAX_BYTES,
+        running=_running_ids,
+    )
+    sweeper.start()
+    # Join the master's live membership when we know our own address
+    heartbeat = None
+    if config.WORKER_URL:
+        heartbeat = Heartbeat(
+            master_url=config.MASTER_URL,
+            worker_id=WORKER_ID,
+            worker_url=config.WORKER_URL,
+            interval=config.WORKER_HEARTBEAT_INTERVAL,
+            load=_load,
+            running=_running_ids,
+        )
+        heartbeat.start()
+    puller = None
+    if config.DISPATCH_MODE == "pull":
+        # Renew leases well before they run out
+        renew_interval = config.TASK_LEASE_SECONDS / 3
+        puller = WorkPuller(
+            master_url=config.MASTER_URL,
+            worker_id=WORKER_ID,
+            pool=pool,
+            claim_size=config.CLAIM_BATCH_SIZE,
+            wait=min(config.CLAIM_WAIT, renew_interval),
+            renew_interval=renew_interval,
+            running=_running_ids,
+            start=lambda task: _start(ExecuteRequest(**task), config.WORKER_URL),
+            worker_url=config.WORKER_URL,
+            load=_load,
+        )
+        puller.start()
+    yield
+    if puller is not None:
+        puller.stop()
+    if heartbeat is not None:
+        heartbeat.stop()
+    sweeper.stop()
+    # The asyncio executor kills the commands still running
+    pool.shutdown()
+    interpreters.close()
+
+
+app = FastAPI(title="Airflow Mini Worker", lifespan=lifespan)
+
+
+class CallableTask(BaseModel):
+    target: str
+    args: list = []
+    kwargs: dict = {}
+
 
 class ExecuteRequest(BaseModel):
     task_instance_id: str
     task_id: str
-    command: str
+    command: str = ""
+    # Set for Python callable tasks, which run on the warm interpreters
+    callable: CallableTask | None = None
     callback_url: str
+    # Per-task limits; cores and memory are reserved while the task runs
+    timeout: float | None = None
+    cpus: float | None = None
+    memory_mb: int | None = None
+    # Batch endpoint for coalesced results; older masters only send callback_url
+    results_url: str | None = None
+    # Which attempt of the task this is, echoed back with the result
+    attempt: str | None = None
+
+
+class ExecuteBatchRequest(BaseModel):
+    tasks: list[ExecuteRequest]
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "worker_id": WORKER_ID}
+    return {
+        "status": "ok",
+        "worker_id": WORKER_ID,
+        "load": _load(),
+        # Lets the master renew the leases of these tasks
+        "running": _running_ids(),
+    }
+
+
+@app.get("/logs/{task_instance_id}")
+def get_task_log(task_instance_id: str, request: Request):
+    """Stream a task's log file; honours a single ``Range: bytes=`` header.
+
+    Works while the task is still running (the file grows), so callers can
+    follow it by asking for ``bytes=<offset>-`` repeatedly.
+    """
+    try:
+        path = log_path(task_instance_id)
+        size = os.path.getsize(path)
+    except (ValueError, OSError):
+        raise HTTPException(status_code=404, detail="No log for this task")
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        raise HTTPException(
+            status_code=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    start, end = byte_range or (0, size)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{max(start, end - 1)}/{size}"
+    return StreamingResponse(
+        read_range(path, start, end),
+        status_code=206 if byte_range is not None else 200,
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+    )
 
 
 @app.post("/execute")
-def execute_task(request: ExecuteRequest):
-    logger.info("[%s] Received task %s: %s", WORKER_ID, request.task_id, request.command)
-    thread = threading.Thread(target=_run_and_report, args=(request,), daemon=True)
-    thread.start()
-    return {"status": "accepted", "worker_id": WORKER_ID}
+def execute_task(request: ExecuteRequest, http_request: Request):
+    status, reason = _start(request, _base_url(http_request))
+    if status == "busy":
+        raise HTTPException(
+            status_code=429,
+            detail={"status": "busy", "worker_id": WORKER_ID, "load": _load()},
+        )
+    if status == "rejected":
+        raise HTTPException(status_code=409, detail=reason)
+    return {"status": "accepted", "worker_id": WORKER_ID, "load": _load()}
 
 
-def _run_and_report(request: ExecuteRequest):
-    success, output = execute_command(request.command)
-    status = "SUCCESS" if success else "FAILED"
+@app.post("/execute/batch")
+def execute_batch(request: ExecuteBatchRequest, http_request: Request):
+    """Accept many tasks in one round trip, reporting acceptance per task.
 
-    logger.info("[%s] Task %s finished: %s", WORKER_ID, request.task_id, status)
+    Tasks beyond the worker's capacity come back as ``busy`` (not as a
+    failure) so the master can place them elsewhere.
+    """
+    results = []
+    base_url = _base_url(http_request)
+    for task in request.tasks:
+        status, reason = _start(task, base_url)
+        result = {"task_instance_id": task.task_instance_id, "status": status}
+        if reason:
+            result["reason"] = reason
+        results.append(result)
+    return {"worker_id": WORKER_ID, "results": results, "load": _load()}
 
-    payload = {
-        "task_instance_id": request.task_instance_id,
-        "status": status,
-        "output": output,
-        "worker_id": WORKER_ID,
+
+def _running_ids() -> list[str]:
+    with _running_lock:
+        return list(_running)
+
+
+def _load() -> dict:
+    """The pool's slots plus this worker's cores and memory, total and free."""
+    with _running_lock:
+        free_cpus = config.WORKER_CPUS - _reserved_cpus
+        free_memory_mb = config.WORKER_MEMORY_MB - _reserved_memory_mb
+    return {
+        **pool.load(),
+        "cpus": config.WORKER_CPUS,
+        "memory_mb": config.WORKER_MEMORY_MB,
+        "free_cpus": round(free_cpus, 3),
+        "free_memory_mb": free_memory_mb,
+    }
+
+
+def _base_url(http_request: Request) -> str:
+    # The address the master reached us on, unless we advertise our own
+    return config.WORKER_URL or str(http_request.base_url)
+
+
+def _start(request: ExecuteRequest, base_url: str | None) -> tuple[str, str | None]:
+    """Admit a task into the execution pool.
+
+    Returns ``(status, reason)`` where status is ``accepted``, ``busy``
+    (no free slot or queue space, or not enough free cores or memory for
+    what the task requests) or ``rejected``.
+    """
+    global _reserved_cpus, _reserved_memory_mb
+    cpus, memory_mb = request.cpus or 0.0, request.memory_mb or 0
+    with _running_lock:
+        if request.task_instance_id in _running:
+            _attempts[request.task_instance_id] = request.attempt
+            return "rejected", "already running"
+        if not fits(
+            cpus,
+            memory_mb,
+            config.WORKER_CPUS - _reserved_cpus,
+            config.WORKER_MEMORY_MB - _reserved_memory_mb,
+            idle=not (_reserved_cpus or _reserved_memory_mb),
+        ):
+            return "busy", "not enough free cores or memory"
+        _running[request.task_instance_id] = (cpus, memory_mb)
+        _attempts[request.task_instance_id] = request.attempt
+        _reserved_cpus += cpus
+        _reserved_memory_mb += memory_mb
+    run = (
+        _run_and_report_async
+        if isinstance(pool, AsyncExecutionPool)
+        else _run_and_report
+    )
+    if not pool.try_submit(run, request, base_url):
+        _finished(request.task_instance_id)
+        return "busy", "at capacity"
+    logger.info(
+        "[%s] Received task %s: %s",
+        WORKER_ID,
+        request.task_id,
+        request.callable.target if request.callable else request.command,
+    )
+    return "accepted", None
+
+
+def _finished(task_instance_id: str) -> str | None:
+    """Forget a task and give back the cores and memory it reserved.
+
+    Returns the attempt its result is reported as.
+    """
+    global _reserved_cpus, _reserved_memory_mb
+    with _running_lock:
+        attempt = _attempts.pop(task_instance_id, None)
+        cpus, memory_mb = _running.pop(task_instance_id, (0.0, 0))
+        _reserved_cpus -= cpus
+        _reserved_memory_mb -= memory_mb
+        if not _running:
+            # No float drift once idle
+            _reserved_cpus = 0.0
+    return attempt
+
+
+def _limits(request: ExecuteRequest) -> dict:
+    """Timeout and rlimits for a task's execution.
+
+    CPU time is capped at the requested cores for the whole timeout, per
+    process; the cores themselves are only enforced by reservation.
+    """
+    timeout = request.timeout or config.TASK_TIMEOUT
+    return {
+        "timeout": timeout,
+        "memory_mb": request.memory_mb,
+        "cpu_seconds": math.ceil(request.cpus * timeout) if request.cpus else None,
     }
 
+
+def _run_and_report(request: ExecuteRequest, base_url: str | None):
+    usage = {}
+    try:
+        if request.callable:
+            success, output = _run_callable(request, usage)
+        else:
+            success, output = execute_command(
+                request.command,
+                log_path=log_path(request.task_instance_id),
+                head_bytes=config.OUTPUT_HEAD_BYTES,
+                tail_bytes=config.OUTPUT_TAIL_BYTES,
+                usage=usage,
+                log_max_bytes=config.WORKER_LOG_MAX_FILE_BYTES,
+                **_limits(request),
+            )
+    finally:
+        # Released before the callback so a retry may land here again
+        attempt = _finished(request.task_instance_id)
+    payload = _result_payload(request, base_url, success, output, usage, attempt)
+
+    if request.results_url:
+        reporter.report(request.results_url, payload)
+        return
+
     try:
         httpx.post(request.callback_url, json=payload, timeout=10.0)
     except Exception as e:
         logger.error(
             "[%s] Callback failed for task %s: %s", WORKER_ID, request.task_id, e
         )
+
+
+async def _run_and_report_async(request: ExecuteRequest, base_url: str | None):
+    """``_run_and_report`` for the asyncio executor: awaits, never blocks."""
+    global _async_client
+    usage = {}
+    try:
+        if request.callable:
+            # Waiting on an interpreter's pipe blocks, so it gets a thread
+            success, output = await pool.run_blocking(_run_callable, request, usage)
+        else:
+            success, output = await execute_command_async(
+                request.command,
+                log_path=log_path(request.task_instance_id),
+                head_bytes=config.OUTPUT_HEAD_BYTES,
+                tail_bytes=config.OUTPUT_TAIL_BYTES,
+                usage=usage,
+                log_max_bytes=config.WORKER_LOG_MAX_FILE_BYTES,
+                **_limits(request),
+            )
+    finally:
+        attempt = _finished(request.task_instance_id)
+    payload = _result_payload(request, base_url, success, output, usage, attempt)
+
+    if request.results_url:
+        # Only blocks when the reporter's buffer is full, so keep it off the loop
+        await asyncio.to_thread(reporter.report, request.results_url, payload)
+        return
+
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(timeout=10.0)
+    try:
+        await _async_client.post(request.callback_url, json=payload)
+    except Exception as e:
+        logger.error(
+            "[%s] Callback failed for task %s: %s", WORKER_ID, request.task_id, e
+        )
+
+
+def _run_callable(request: ExecuteRequest, usage: dict) -> tuple[bool, str]:
+    try:
+        return interpreters.run(
+            request.callable.target,
+            request.callable.args,
+            request.callable.kwargs,
+            log_path=log_path(request.task_instance_id),
+            head_bytes=config.OUTPUT_HEAD_BYTES,
+            tail_bytes=config.OUTPUT_TAIL_BYTES,
+            usage=usage,
+            **_limits(request),
+        )
+    except Exception as e:
+        return False, f"Execution error: {e}"
+
+
+def _result_payload(
+    request: ExecuteRequest,
+    base_url: str | None,
+    success: bool,
+    output: str,
+    usage: dict,
+    attempt: str | None,
+) -> dict:
+    status = "SUCCESS" if success else "FAILED"
+    logger.info("[%s] Task %s finished: %s", WORKER_ID, request.task_id, status)
+    return {
+        # peak_rss_kb, cpu_seconds, wall_seconds (as far as measured)
+        **usage,
+        "task_instance_id": request.task_instance_id,
+        "status": status,
+        "output": output,
+        "worker_id": WORKER_ID,
+        "attempt": attempt,
+        "log_url": (
+            f"{base_url.rstrip('/')}/logs/{request.task_instance_id}"
+            if base_url
+            else None
+        ),
+    }
@@ -0,0 +1,39 @@
+"""A worker stand-in that accepts tasks without running them.
+
+Used to measure the master's dispatch path in isolation. The response
+delay comes from ``FAKE_WORKER_DELAY`` (seconds) to simulate slow workers.
+"""
+
+import asyncio
+import os
+
+from fastapi import FastAPI
+
+DELAY = float(os.getenv("FAKE_WORKER_DELAY", "0"))
+
+app = FastAPI(title="Airflow Mini Fake Worker")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "worker_id": "fake"}
+
+
+@app.post("/execute")
+async def execute(payload: dict):
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    return {"status": "accepted", "worker_id": "fake"}
+
+
+@app.post("/execute/batch")
+async def execute_batch(payload: dict):
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    return {
+        "worker_id": "fake",
+        "results": [
+            {"task_instance_id": t["task_instance_id"], "status": "accepted"}
+            for t in payload["tasks"]
+        ],
+    }
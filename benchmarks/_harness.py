@@ -0,0 +1,150 @@
+"""Helpers for spinning up a throwaway master + workers for benchmarks.
+
+Each cluster gets its own temporary database and free ports, so benchmarks
+never touch a developer's ``airflow_mini.db``.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "bench-key"
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=0.5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+@contextmanager
+def cluster(num_workers: int = 2, extra_env: dict | None = None):
+    """Start a master and ``num_workers`` workers; yield the master base URL."""
+    tmpdir = tempfile.mkdtemp(prefix="airflow_mini_bench_")
+    master_port = free_port()
+    worker_ports = [free_port() for _ in range(num_workers)]
+
+    env = dict(os.environ)
+    env.update(
+        {
+            "AIRFLOW_MINI_API_KEY": API_KEY,
+            "AIRFLOW_MINI_DB_PATH": os.path.join(tmpdir, "bench.db"),
+            "AIRFLOW_MINI_PORT": str(master_port),
+            "AIRFLOW_MINI_WORKERS": ",".join(str(p) for p in worker_ports),
+        }
+    )
+    env.update(extra_env or {})
+
+    procs = []
+    try:
+        for port in worker_ports:
+            procs.append(
+                subprocess.Popen(
+                    [sys.executable, "run_worker.py", "--port", str(port)],
+                    cwd=ROOT,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+        procs.append(
+            subprocess.Popen(
+                [sys.executable, "run_master.py"],
+                cwd=ROOT,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+        for port in worker_ports:
+            _wait_until_up(f"http://127.0.0.1:{port}/health")
+        base_url = f"http://127.0.0.1:{master_port}"
+        _wait_until_up(f"{base_url}/docs")
+        yield base_url
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+@contextmanager
+def fake_workers(delays: list[float]):
+    """Start one fake worker per entry in ``delays``; yield their base URLs."""
+    procs = []
+    urls = []
+    try:
+        for delay in delays:
+            port = free_port()
+            env = dict(os.environ, FAKE_WORKER_DELAY=str(delay))
+            procs.append(
+                subprocess.Popen(
+                    [
+                        sys.executable, "-m", "uvicorn",
+                        "benchmarks._fake_worker:app",
+                        "--port", str(port), "--log-level", "warning",
+                    ],
+                    cwd=ROOT,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+            urls.append(f"http://127.0.0.1:{port}")
+        for url in urls:
+            _wait_until_up(f"{url}/health")
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def run_workflow(
+    client: httpx.Client, workflow: dict, timeout: float = 600.0
+) -> tuple[str, float]:
+    """Register ``workflow``, trigger one run, and wait for it to finish.
+
+    Returns the final run status and the wall time from trigger to finish.
+    """
+    resp = client.post("/workflows", json=workflow, headers=HEADERS)
+    resp.raise_for_status()
+
+    start = time.perf_counter()
+    resp = client.post(f"/workflows/{workflow['id']}/run", headers=HEADERS)
+    resp.raise_for_status()
+    run_id = resp.json()["id"]
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/runs/{run_id}", headers=HEADERS).json()["status"]
+        if status in ("SUCCESS", "FAILED"):
+            return status, time.perf_counter() - start
+        time.sleep(0.01)
+    raise TimeoutError(f"Run {run_id} did not finish within {timeout}s")
@@ -0,0 +1,96 @@
+"""Throughput of tiny Python tasks: shell commands vs warm interpreters.
+
+Runs ``--tasks`` copies of a tiny Python task through a worker
+``ExecutionPool`` with ``--slots`` slots, each writing its own log file:
+
+- ``shell``: the ``command`` path, ``python -c "..."`` under ``sh -c``
+  (a fork, a shell and an interpreter start per task)
+- ``callable``: the same function as a callable task on an
+  ``InterpreterPool`` with one warm process per slot
+
+The shell path is slow, so it runs ``--shell-tasks`` tasks (default: all
+of them) and its throughput is reported per second like the other.
+
+    python -m benchmarks.bench_callable_tasks --tasks 10000 --slots 4
+"""
+
+import argparse
+import os
+import shlex
+import sys
+import tempfile
+import threading
+import time
+
+from app.worker.executor import execute_command
+from app.worker.interpreters import InterpreterPool
+from app.worker.pool import ExecutionPool
+
+TARGET = "math:factorial"
+ARGS = [20]
+COMMAND = f"{shlex.quote(sys.executable)} -c 'import math; print(math.factorial(20))'"
+
+
+def run_all(tasks: int, slots: int, run_one) -> float:
+    """Submit ``tasks`` tasks as fast as the pool takes them; tasks/second."""
+    pool = ExecutionPool(slots=slots, queue_size=slots)
+    done = threading.Semaphore(0)
+    failures = []
+
+    def task(k: int):
+        success, output = run_one(k)
+        if not success or output != "2432902008176640000":
+            failures.append(output)
+        done.release()
+
+    started = time.perf_counter()
+    for k in range(tasks):
+        while not pool.try_submit(task, k):
+            pool.wait_for_free_slot(1.0)
+    for _ in range(tasks):
+        done.acquire()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    if failures:
+        raise SystemExit(f"{len(failures)} tasks failed, e.g. {failures[0]!r}")
+    return tasks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--shell-tasks", type=int)
+    parser.add_argument("--slots", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+    shell_tasks = args.shell_tasks or args.tasks
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def log(k: int) -> str:
+            return os.path.join(tmp, f"{k}.log")
+
+        interpreters = InterpreterPool(args.slots)
+        interpreters.start()
+        try:
+            callable_rate = run_all(
+                args.tasks,
+                args.slots,
+                lambda k: interpreters.run(TARGET, ARGS, log_path=log(k)),
+            )
+        finally:
+            interpreters.close()
+        shell_rate = run_all(
+            shell_tasks, args.slots, lambda k: execute_command(COMMAND, log_path=log(k))
+        )
+
+    print(f"tiny Python task ({TARGET}{tuple(ARGS)}), {args.slots} slots")
+    print(f"{'path':>9} {'tasks':>7} {'tasks/s':>9} {'ms/task':>8}")
+    for name, tasks, rate in (
+        ("shell", shell_tasks, shell_rate),
+        ("callable", args.tasks, callable_rate),
+    ):
+        print(f"{name:>9} {tasks:>7} {rate:>9.1f} {1000 / rate:>8.2f}")
+    print(f"speedup {callable_rate / shell_rate:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
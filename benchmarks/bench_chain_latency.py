@@ -0,0 +1,51 @@
+"""End-to-end latency of deep chains of no-op tasks.
+
+Every level of a chain has to wait for the scheduler to notice that its
+upstream finished, so this benchmark is dominated by scheduler reaction
+time rather than by task execution.
+
+    python -m benchmarks.bench_chain_latency --depths 5 10 20
+"""
+
+import argparse
+
+import httpx
+
+from benchmarks._harness import cluster, run_workflow
+
+
+def chain_workflow(workflow_id: str, depth: int) -> dict:
+    tasks = []
+    for i in range(depth):
+        tasks.append(
+            {
+                "id": f"t{i}",
+                "command": "true",
+                "dependencies": [f"t{i - 1}"] if i else [],
+            }
+        )
+    return {"id": workflow_id, "tasks": tasks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with cluster(num_workers=args.workers) as base_url:
+        with httpx.Client(base_url=base_url, timeout=10.0) as client:
+            print(f"{'depth':>6} {'run':>4} {'status':>8} {'total_s':>9} {'per_level_ms':>13}")
+            for depth in args.depths:
+                for i in range(args.repeat):
+                    wf = chain_workflow(f"chain_{depth}_{i}", depth)
+                    status, elapsed = run_workflow(client, wf)
+                    print(
+                        f"{depth:>6} {i:>4} {status:>8} {elapsed:>9.3f} "
+                        f"{elapsed / depth * 1000:>13.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Makespan of a wide-then-deep DAG per ready-task order.
+
+Discrete-event simulation (no HTTP, no database) driving the real
+``RunReadiness`` and ``ReadyQueue`` on ``--slots`` slots. The DAG has a
+root and a wide layer of ``--width`` short tasks. ``--chains`` of those
+start a chain of ``--depth`` more short tasks, and ``--heavy`` of them take
+``--heavy-seconds``. The chains and heavy tasks come last in the
+definition. Task durations vary by +-20% around each task's mean.
+Reports the makespan, as the median over several seeds, for:
+
+- ``definition``: ready tasks in definition order (no ranks)
+- ``unit``: critical-path ranks with every task counting as 1
+- ``history``: ranks weighted by the tasks' mean durations, as the
+  scheduler computes them from completed runs
+
+    python -m benchmarks.bench_critical_path --width 200 --slots 16
+"""
+
+import argparse
+import heapq
+import random
+import statistics
+
+from app.core.dag import bottom_levels, compile_dag
+from app.core.models import TaskState
+from app.core.readiness import ReadyQueue, RunReadiness
+
+
+def build(args) -> tuple[dict, dict[str, float]]:
+    """The workflow definition and each task's mean duration."""
+    tasks = [{"id": "root", "command": "true"}]
+    means = {"root": 1.0}
+    plain = args.width - args.chains - args.heavy
+    for k in range(args.width):
+        tid = f"w{k}"
+        tasks.append({"id": tid, "command": "true", "dependencies": ["root"]})
+        means[tid] = args.heavy_seconds if plain <= k < plain + args.heavy else 2.0
+    for c in range(args.chains):
+        parent = f"w{args.width - args.chains + c}"
+        for d in range(args.depth):
+            tid = f"c{c}-{d}"
+            tasks.append({"id": tid, "command": "true", "dependencies": [parent]})
+            means[tid] = 2.0
+            parent = tid
+    return {"id": "wide-then-deep", "tasks": tasks}, means
+
+
+def simulate(dag, ranks, durations: dict[str, float], slots: int) -> float:
+    readiness = RunReadiness("run", dag, [], ranks=ranks)
+    queue = ReadyQueue()
+    free = slots
+    events = []
+    now = 0.0
+
+    def fill():
+        nonlocal free
+        for i in readiness.pop_ready():
+            queue.push(readiness, i)
+        while free:
+            item = queue.pop()
+            if item is None:
+                return
+            _, i = item
+            readiness.mark(i, TaskState.RUNNING)
+            free -= 1
+            heapq.heappush(events, (now + durations[dag.task_ids[i]], i))
+
+    fill()
+    while events:
+        now, i = heapq.heappop(events)
+        free += 1
+        readiness.mark(i, TaskState.SUCCESS)
+        fill()
+    return now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=200)
+    parser.add_argument("--chains", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--heavy", type=int, default=4)
+    parser.add_argument("--heavy-seconds", type=float, default=40.0)
+    parser.add_argument("--slots", type=int, default=16)
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+
+    definition, means = build(args)
+    dag = compile_dag(definition)
+    orders = {
+        "definition": (0.0,) * len(dag),
+        "unit": dag.ranks,
+        "history": bottom_levels(dag, means),
+    }
+    total = sum(means.values())
+    print(
+        f"{len(dag)} tasks ({args.width} wide, {args.chains} chains of {args.depth}, "
+        f"{args.heavy} x {args.heavy_seconds:.0f}s), {args.slots} slots; "
+        f"lower bound {max(total / args.slots, bottom_levels(dag, means)[0]):.1f}s "
+        f"(median of {args.seeds} seeds)"
+    )
+    print(f"{'order':>11} {'makespan s':>11}")
+    for name, ranks in orders.items():
+        makespans = []
+        for seed in range(args.seeds):
+            rng = random.Random(seed)
+            durations = {t: m * rng.uniform(0.8, 1.2) for t, m in means.items()}
+            makespans.append(simulate(dag, ranks, durations, args.slots))
+        print(f"{name:>11} {statistics.median(makespans):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
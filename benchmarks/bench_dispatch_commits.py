@@ -0,0 +1,116 @@
+"""Database commits and wall time for a wide fan-out dispatch.
+
+Runs the scheduler in-process against a temporary SQLite file with the
+network send stubbed out, so only the scheduler's own database work is
+measured: one tick that dispatches N ready tasks, one tick that re-queues
+N RETRYING tasks whose retry is due and dispatches them again, and one
+tick while N RETRYING tasks are still waiting out their backoff.
+
+    python -m benchmarks.bench_dispatch_commits --fanout 50 200 1000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core import scheduler as scheduler_module
+from app.core.models import TaskState
+from app.db import repository
+from app.db.database import init_db
+
+
+def measure(fanout: int) -> tuple[int, float, int, float, int, float]:
+    path = os.path.join(tempfile.mkdtemp(prefix="airflow_mini_bench_"), "b.db")
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
+    )
+    init_db(engine)
+    session_factory = sessionmaker(bind=engine)
+    commits = 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    db = session_factory()
+    tasks = [
+        {"id": f"t{i}", "command": "true", "max_retries": 1} for i in range(fanout)
+    ]
+    workflow_id = f"fanout_{fanout}"
+    repository.create_workflow(db, workflow_id, {"id": workflow_id, "tasks": tasks})
+    run = repository.create_run(db, workflow_id, tasks)
+
+    scheduler_module.SessionLocal = session_factory
+    scheduler = scheduler_module.Scheduler()
+
+    async def accept(worker_url, payload):
+        return True
+
+    scheduler._send_to_worker = accept
+    event.listen(engine, "commit", count_commit)
+
+    start = time.perf_counter()
+    asyncio.run(scheduler._tick())
+    dispatch_time = time.perf_counter() - start
+    dispatch_commits = commits
+
+    for ti in repository.get_task_instances(db, run.id):
+        repository.update_task_status(db, ti.id, TaskState.RETRYING)
+        scheduler.task_state_changed(run.id, ti.task_id, TaskState.RETRYING)
+    commits = 0
+    start = time.perf_counter()
+    asyncio.run(scheduler._tick())
+    retry_time = time.perf_counter() - start
+    retry_commits = commits
+
+    not_before = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    for ti in repository.get_task_instances(db, run.id):
+        repository.update_task_status(db, ti.id, TaskState.RETRYING)
+        scheduler.task_state_changed(
+            run.id, ti.task_id, TaskState.RETRYING, not_before
+        )
+    commits = 0
+    # Keep the safety-net resync (due after the slow setup) out of the tick
+    scheduler._last_resync = time.monotonic()
+    start = time.perf_counter()
+    asyncio.run(scheduler._tick())
+    waiting_time = time.perf_counter() - start
+    db.close()
+    engine.dispose()
+    return (
+        dispatch_commits,
+        dispatch_time,
+        retry_commits,
+        retry_time,
+        commits,
+        waiting_time,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fanout", type=int, nargs="+", default=[50, 200, 1000])
+    args = parser.parse_args()
+
+    print(
+        f"{'fanout':>7} {'dispatch_commits':>17} {'dispatch_ms':>12} "
+        f"{'retry_commits':>14} {'retry_ms':>9} "
+        f"{'backoff_commits':>16} {'backoff_ms':>11}"
+    )
+    for fanout in args.fanout:
+        d_commits, d_time, r_commits, r_time, b_commits, b_time = measure(fanout)
+        print(
+            f"{fanout:>7} {d_commits:>17} {d_time * 1000:>12.1f} "
+            f"{r_commits:>14} {r_time * 1000:>9.1f} "
+            f"{b_commits:>16} {b_time * 1000:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
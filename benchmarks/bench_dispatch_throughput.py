@@ -0,0 +1,124 @@
+"""Scheduler dispatch throughput (tasks/s) against fake workers.
+
+Runs the scheduler in-process against a temporary SQLite file and fake
+workers that accept tasks without running them, then times one tick that
+dispatches a fan-out of N ready tasks until every request has completed.
+
+* ``serial``  - the previous behaviour: a new ``httpx.AsyncClient`` per
+  task and one request at a time
+* ``pooled``  - the shared keep-alive client with concurrent fan-out,
+  one ``/execute`` request per task
+* ``batched`` - as ``pooled``, with tasks grouped per worker into
+  ``/execute/batch`` requests of up to DISPATCH_BATCH_SIZE tasks
+
+``--slow-delay`` makes one of the workers answer slowly, which with
+serial dispatch holds up every task queued behind it.
+
+    python -m benchmarks.bench_dispatch_throughput --fanout 200 1000
+
+Fake workers share the machine with the scheduler, so on small boxes a
+high ``--concurrency`` mostly measures CPU contention.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.core import scheduler as scheduler_module
+from app.core.placement import WorkerRegistry
+from app.db import repository
+from app.db.database import init_db, make_engine
+from benchmarks._harness import fake_workers
+
+
+class SerialScheduler(scheduler_module.Scheduler):
+    """Emulates the old dispatch path for comparison."""
+
+    def __init__(self):
+        super().__init__()
+        self._dispatch_slots = asyncio.Semaphore(1)
+
+    async def _send_to_worker(self, worker_url: str, payloads: list[dict]) -> list[bool]:
+        results = []
+        for payload in payloads:
+            try:
+                async with httpx.AsyncClient() as client:
+                    resp = await client.post(
+                        f"{worker_url}/execute", json=payload, timeout=5.0
+                    )
+                    results.append(resp.status_code == 200)
+            except httpx.HTTPError:
+                results.append(False)
+        return results
+
+
+async def dispatch_once(scheduler) -> float:
+    start = time.perf_counter()
+    await scheduler._tick()
+    await asyncio.gather(*scheduler._inflight)
+    return time.perf_counter() - start
+
+
+def measure(mode: str, fanout: int, worker_urls: list[str], batch_size: int) -> float:
+    config.DISPATCH_BATCH_SIZE = batch_size if mode == "batched" else 1
+    path = os.path.join(tempfile.mkdtemp(prefix="airflow_mini_bench_"), "d.db")
+    engine = make_engine(f"sqlite:///{path}")
+    init_db(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    workflow_id = f"fanout_{mode}_{fanout}"
+    tasks = [{"id": f"t{i}", "command": "true"} for i in range(fanout)]
+    repository.create_workflow(db, workflow_id, {"id": workflow_id, "tasks": tasks})
+    repository.create_run(db, workflow_id, tasks)
+    db.close()
+
+    scheduler_module.SessionLocal = session_factory
+    scheduler = SerialScheduler() if mode == "serial" else scheduler_module.Scheduler()
+    scheduler.workers = WorkerRegistry(worker_urls, strategy="round_robin")
+
+    async def run() -> float:
+        try:
+            return await dispatch_once(scheduler)
+        finally:
+            if scheduler._client is not None:
+                await scheduler._client.aclose()
+
+    elapsed = asyncio.run(run())
+    engine.dispose()
+    return fanout / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fanout", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slow-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--concurrency", type=int, default=config.DISPATCH_CONCURRENCY
+    )
+    parser.add_argument("--batch-size", type=int, default=config.DISPATCH_BATCH_SIZE)
+    args = parser.parse_args()
+    config.DISPATCH_CONCURRENCY = args.concurrency
+
+    delays = [0.0] * args.workers
+    if args.slow_delay:
+        delays[0] = args.slow_delay
+
+    print(f"dispatch concurrency cap: {config.DISPATCH_CONCURRENCY}")
+    print(f"{'mode':>7} {'fanout':>7} {'tasks_per_s':>12}")
+    with fake_workers(delays) as urls:
+        for fanout in args.fanout:
+            for mode in ("serial", "pooled", "batched"):
+                rate = measure(mode, fanout, urls, args.batch_size)
+                print(f"{mode:>7} {fanout:>7} {rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
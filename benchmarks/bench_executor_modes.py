@@ -0,0 +1,124 @@
+"""Worker executors under many concurrent, mostly-waiting tasks.
+
+Runs ``--tasks`` concurrent ``sleep`` commands through each worker
+execution model, each in a fresh Python process so peak RSS is its own:
+
+- ``thread``: ``ExecutionPool`` + ``execute_command`` (a thread, and a
+  timeout timer thread, per running task)
+- ``asyncio``: ``AsyncExecutionPool`` + ``execute_command_async`` (one
+  event loop supervising every subprocess)
+
+Reports wall time, peak RSS, peak thread count and the scheduling jitter:
+how late each task finished compared to the burst's start + sleep
+duration (every task is submitted at once, so this includes the time
+spent starting all the other subprocesses first).
+
+    python -m benchmarks.bench_executor_modes --tasks 5000 --sleep 5
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def child(mode: str, tasks: int, sleep: float):
+    from app.worker.executor import execute_command, execute_command_async
+    from app.worker.pool import AsyncExecutionPool, ExecutionPool
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    log_dir = tempfile.mkdtemp(prefix="bench-exec-")
+    lateness: list[float] = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def finished(submitted: float, ok: bool):
+        with lock:
+            lateness.append(time.monotonic() - submitted - sleep)
+            if len(lateness) == tasks:
+                done.set()
+
+    def run_thread(k: int, submitted: float):
+        ok, _ = execute_command(f"sleep {sleep}", log_path=f"{log_dir}/{k}.log")
+        finished(submitted, ok)
+
+    async def run_async(k: int, submitted: float):
+        ok, _ = await execute_command_async(
+            f"sleep {sleep}", log_path=f"{log_dir}/{k}.log"
+        )
+        finished(submitted, ok)
+
+    if mode == "thread":
+        pool, run = ExecutionPool(slots=tasks, queue_size=0), run_thread
+    else:
+        pool, run = AsyncExecutionPool(slots=tasks, queue_size=0), run_async
+
+    peak_threads = threading.active_count()
+    started = time.monotonic()
+    for k in range(tasks):
+        assert pool.try_submit(run, k, started)
+    while not done.wait(0.05):
+        peak_threads = max(peak_threads, threading.active_count())
+    wall = time.monotonic() - started
+    pool.shutdown()
+
+    lateness.sort()
+    print(
+        json.dumps(
+            {
+                "wall": wall,
+                "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "threads": peak_threads,
+                "p50": statistics.median(lateness),
+                "p99": lateness[int(len(lateness) * 0.99) - 1],
+                "max": lateness[-1],
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--sleep", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", default=["thread", "asyncio"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.tasks, args.sleep)
+        return
+
+    print(f"{args.tasks} concurrent 'sleep {args.sleep}' tasks")
+    print(
+        f"{'mode':>8} {'wall s':>7} {'peak RSS MB':>12} {'threads':>8} "
+        f"{'late p50 s':>11} {'p99 s':>7} {'max s':>7}"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for mode in args.modes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_executor_modes",
+             "--child", mode, "--tasks", str(args.tasks), "--sleep", str(args.sleep)],
+            cwd=root,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            print(f"{mode:>8} failed: {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:>8} {r['wall']:>7.2f} {r['rss_mb']:>12.1f} {r['threads']:>8} "
+            f"{r['p50']:>11.3f} {r['p99']:>7.3f} {r['max']:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Completion latency of small runs while one huge run is active.
+
+Discrete-event simulation (no HTTP, no database) driving the real
+``RunReadiness`` trackers: a cluster with ``--slots`` task slots (the
+global concurrency limit) works through one big run of ``--big-tasks``
+independent tasks. Meanwhile, a small run (``--small-width`` parallel
+tasks and a join) is triggered every ``--interval`` seconds. Reports
+p50/p99 small-run completion latency (trigger to last task done) and the
+big run's makespan, per dispatch order:
+
+- ``fifo``: tasks run in the order they became ready, which is what
+  dispatching every ready task at once amounts to
+- ``fair``: the scheduler's ``ReadyQueue`` (fair share between workflows)
+- ``priority``: the same, with the small workflow at priority 1
+
+    python -m benchmarks.bench_fair_share --big-tasks 20000 --slots 32
+"""
+
+import argparse
+import heapq
+import random
+import statistics
+from collections import deque
+from types import SimpleNamespace
+
+from app.core.dag import compile_dag
+from app.core.models import TaskState
+from app.core.readiness import ReadyQueue, RunReadiness
+
+
+class FifoQueue:
+    """Ready tasks in arrival order."""
+
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, readiness: RunReadiness, i: int):
+        self._items.append((readiness, i))
+
+    def pop(self):
+        return self._items.popleft() if self._items else None
+
+
+def make_run(run_id: str, dag) -> RunReadiness:
+    instances = [
+        SimpleNamespace(id=f"{run_id}-{tid}", task_id=tid, status=TaskState.PENDING)
+        for tid in dag.task_ids
+    ]
+    return RunReadiness(run_id, dag, instances)
+
+
+def simulate(mode: str, args, seed: int) -> tuple[list[float], float]:
+    rng = random.Random(seed)
+    big_dag = compile_dag(
+        {
+            "id": "big",
+            "tasks": [{"id": f"b{k}", "command": "true"} for k in range(args.big_tasks)],
+        }
+    )
+    width = args.small_width
+    small_dag = compile_dag(
+        {
+            "id": "small",
+            "priority": 1 if mode == "priority" else 0,
+            "tasks": [{"id": f"s{k}", "command": "true"} for k in range(width)]
+            + [
+                {
+                    "id": "join",
+                    "command": "true",
+                    "dependencies": [f"s{k}" for k in range(width)],
+                }
+            ],
+        }
+    )
+    queue = ReadyQueue() if mode != "fifo" else FifoQueue()
+    free = args.slots
+    # (time, seq, kind, payload); kind 0 = task finished, 1 = run triggered
+    events = [(0.0, 0, 1, "big")]
+    events += [
+        (args.interval * (k + 1), k + 1, 1, f"small-{k}")
+        for k in range(args.small_runs)
+    ]
+    heapq.heapify(events)
+    seq = len(events)
+    triggered: dict[str, float] = {}
+    remaining: dict[str, int] = {}
+    latencies = []
+    makespan = 0.0
+
+    def enqueue(readiness: RunReadiness):
+        for i in readiness.pop_ready():
+            queue.push(readiness, i)
+
+    def fill(now: float):
+        nonlocal free, seq
+        while free:
+            item = queue.pop()
+            if item is None:
+                return
+            readiness, i = item
+            readiness.mark(i, TaskState.RUNNING)
+            free -= 1
+            if readiness.run_id == "big":
+                duration = rng.uniform(0.5, 1.5)
+            else:
+                duration = rng.uniform(0.1, 0.3)
+            seq += 1
+            heapq.heappush(events, (now + duration, seq, 0, (readiness, i)))
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == 1:
+            readiness = make_run(payload, big_dag if payload == "big" else small_dag)
+            triggered[payload] = now
+            remaining[payload] = len(readiness.dag)
+            enqueue(readiness)
+        else:
+            readiness, i = payload
+            free += 1
+            readiness.mark(i, TaskState.SUCCESS)
+            remaining[readiness.run_id] -= 1
+            if not remaining[readiness.run_id]:
+                if readiness.run_id == "big":
+                    makespan = now
+                else:
+                    latencies.append(now - triggered[readiness.run_id])
+            enqueue(readiness)
+        fill(now)
+    return latencies, makespan
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--big-tasks", type=int, default=20000)
+    parser.add_argument("--slots", type=int, default=32)
+    parser.add_argument("--small-runs", type=int, default=200)
+    parser.add_argument("--small-width", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between small runs")
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"big run of {args.big_tasks} tasks (0.5-1.5 s) on {args.slots} slots; "
+        f"{args.small_runs} small runs ({args.small_width} tasks + join, 0.1-0.3 s) "
+        f"every {args.interval}s (median of {args.seeds} seeds)"
+    )
+    print(f"{'order':>9} {'small p50 s':>12} {'small p99 s':>12} {'big makespan s':>15}")
+    for mode in ("fifo", "fair", "priority"):
+        runs = [simulate(mode, args, seed) for seed in range(args.seeds)]
+        p50 = statistics.median(percentile(r[0], 0.50) for r in runs)
+        p99 = statistics.median(percentile(r[0], 0.99) for r in runs)
+        makespan = statistics.median(r[1] for r in runs)
+        print(f"{mode:>9} {p50:>12.2f} {p99:>12.2f} {makespan:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
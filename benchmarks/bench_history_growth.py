@@ -0,0 +1,134 @@
+"""Scheduler/callback query latency as task history grows.
+
+Builds a temporary SQLite database holding N finished task instances
+(100 per run) plus a handful of RUNNING runs, then times the queries on
+the hot path with and without the storage-profile indexes:
+
+* ``resync``     - ``get_active_runs`` (the scheduler's safety-net tick)
+* ``run_tasks``  - ``get_task_instances`` for one active run (rebuilding
+  readiness, completion checks after a callback)
+* ``callback``   - one ``update_task_status`` commit
+
+    python -m benchmarks.bench_history_growth --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import RunState, TaskState
+from app.db import repository
+from app.db.database import init_db, make_engine
+
+TASKS_PER_RUN = 100
+ACTIVE_RUNS = 5
+
+
+def populate(path: str, history: int) -> list[str]:
+    engine = make_engine(f"sqlite:///{path}")
+    init_db(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO workflows (id, definition, created_at, version) "
+        "VALUES ('wf', '{}', '2024-01-01', 1)"
+    )
+    active = []
+    num_runs = history // TASKS_PER_RUN + ACTIVE_RUNS
+    for r in range(num_runs):
+        run_id = str(uuid.uuid4())
+        is_active = r >= num_runs - ACTIVE_RUNS
+        if is_active:
+            active.append(run_id)
+        conn.execute(
+            "INSERT INTO workflow_runs (id, workflow_id, status, started_at) "
+            "VALUES (?, 'wf', ?, '2024-01-01')",
+            (run_id, RunState.RUNNING if is_active else RunState.SUCCESS),
+        )
+        conn.executemany(
+            "INSERT INTO task_instances (id, run_id, task_id, command, status, "
+            "retries_left, max_retries) VALUES (?, ?, ?, 'true', ?, 0, 0)",
+            [
+                (
+                    str(uuid.uuid4()),
+                    run_id,
+                    f"t{i}",
+                    TaskState.PENDING if is_active else TaskState.SUCCESS,
+                )
+                for i in range(TASKS_PER_RUN)
+            ],
+        )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return active
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def measure(path: str, active: list[str], repeat: int) -> tuple[float, float, float]:
+    engine = make_engine(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine)()
+    task_id = repository.get_task_instances(db, active[0])[0].id
+
+    resync = timed(lambda: repository.get_active_runs(db), repeat)
+    run_tasks = timed(lambda: repository.get_task_instances(db, active[0]), repeat)
+    callback = timed(
+        lambda: repository.update_task_status(db, task_id, TaskState.PENDING),
+        repeat,
+    )
+    db.close()
+    engine.dispose()
+    return resync, run_tasks, callback
+
+
+def drop_indexes(path: str):
+    engine = make_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_workflow_runs_status"))
+        conn.execute(text("DROP INDEX ix_task_instances_run_id_status"))
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'history':>9} {'indexes':>8} {'resync_ms':>10} "
+        f"{'run_tasks_ms':>13} {'callback_ms':>12}"
+    )
+    for size in args.sizes:
+        path = os.path.join(tempfile.mkdtemp(prefix="airflow_mini_bench_"), "h.db")
+        active = populate(path, size)
+        for label in ("yes", "no"):
+            if label == "no":
+                drop_indexes(path)
+            resync, run_tasks, callback = measure(path, active, args.repeat)
+            print(
+                f"{size:>9} {label:>8} {resync:>10.2f} "
+                f"{run_tasks:>13.2f} {callback:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
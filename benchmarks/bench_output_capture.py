@@ -0,0 +1,61 @@
+"""Worker memory while capturing task output, buffered vs streamed.
+
+Runs commands printing increasing amounts of output and reports the peak
+Python heap (tracemalloc) of capturing it: once the old way, with
+``subprocess.run(capture_output=True)`` holding everything in memory, and
+once with ``execute_command`` streaming to a log file and keeping only a
+bounded head and tail. The streamed peak should stay flat.
+
+    python -m benchmarks.bench_output_capture --sizes-mb 1 16 64 256
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from app.worker.executor import execute_command
+
+
+def buffered(command: str, log_path: str) -> int:
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    output = (result.stdout + result.stderr).strip()
+    return len(output)
+
+
+def streamed(command: str, log_path: str) -> int:
+    _, output = execute_command(command, log_path=log_path)
+    return len(output)
+
+
+def measure(capture, command: str, log_path: str) -> tuple[float, float, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    kept = capture(command, log_path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, elapsed, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 16, 64, 256])
+    args = parser.parse_args()
+
+    print(f"{'output':>8} {'mode':>9} {'peak MiB':>9} {'time s':>7} {'kept bytes':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "task.log")
+        for size in args.sizes_mb:
+            command = f"head -c {size * 2**20} /dev/zero | tr '\\0' a"
+            for name, capture in (("buffered", buffered), ("streamed", streamed)):
+                peak, elapsed, kept = measure(capture, command, log_path)
+                print(
+                    f"{size:>6}MB {name:>9} {peak:>9.1f} {elapsed:>7.2f} {kept:>11}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Makespan of worker placement strategies on a simulated cluster.
+
+Discrete-event simulation (no HTTP, no database) driving the real
+``WorkerRegistry``: workers with different slot counts run tasks FIFO,
+bursts of tasks with heterogeneous durations (mostly short, a few very
+long) arrive over time, and every task is placed the moment it arrives,
+exactly as the scheduler does. Reports makespan and mean queueing delay
+per strategy, as the median over several seeds.
+
+    python -m benchmarks.bench_placement --tasks 2000 --slots 8 4 2 2
+"""
+
+import argparse
+import heapq
+import random
+import statistics
+from collections import deque
+
+from app.core.placement import STRATEGIES, WorkerRegistry
+
+
+def durations(rng: random.Random, n: int, long_share: float) -> list[float]:
+    return [
+        rng.uniform(20.0, 60.0) if rng.random() < long_share else rng.uniform(0.5, 2.0)
+        for _ in range(n)
+    ]
+
+
+def simulate(
+    strategy: str,
+    slots: list[int],
+    tasks: int,
+    burst: int,
+    interval: float,
+    long_share: float,
+    seed: int,
+) -> tuple[float, float]:
+    rng = random.Random(seed)
+    work = durations(rng, tasks, long_share)
+    urls = [f"w{k}" for k in range(len(slots))]
+    registry = WorkerRegistry(urls, strategy=strategy, seed=seed)
+    for url, n in zip(urls, slots):
+        registry.update_load(url, {"slots": n, "free_slots": n})
+
+    free = dict(zip(urls, slots))
+    queues = {url: deque() for url in urls}
+    # (time, seq, kind, payload); kind 0 = finish, 1 = arrival burst
+    events = [(b * interval, b, 1, b) for b in range((tasks + burst - 1) // burst)]
+    heapq.heapify(events)
+    seq = len(events)
+    waits = []
+    makespan = 0.0
+
+    def start(url: str, task: int, arrived: float, now: float):
+        nonlocal seq
+        free[url] -= 1
+        waits.append(now - arrived)
+        seq += 1
+        heapq.heappush(events, (now + work[task], seq, 0, (url, task)))
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == 1:
+            for task in range(payload * burst, min(tasks, (payload + 1) * burst)):
+                url = registry.pick(now)
+                registry.assign(str(task), url)
+                if free[url]:
+                    start(url, task, now, now)
+                else:
+                    queues[url].append((task, now))
+        else:
+            url, task = payload
+            makespan = now
+            registry.release(str(task))
+            free[url] += 1
+            if queues[url]:
+                queued, arrived = queues[url].popleft()
+                start(url, queued, arrived, now)
+    return makespan, statistics.fmean(waits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--slots", type=int, nargs="+", default=[8, 4, 2, 2])
+    parser.add_argument("--burst", type=int, default=4, help="tasks per arrival")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between bursts")
+    parser.add_argument("--long-share", type=float, default=0.05)
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{args.tasks} tasks, workers with {args.slots} slots, "
+        f"{args.burst} tasks every {args.interval}s, "
+        f"{args.long_share:.0%} long tasks (median of {args.seeds} seeds)"
+    )
+    print(f"{'strategy':>14} {'makespan s':>11} {'mean wait s':>12}")
+    for strategy in STRATEGIES:
+        runs = [
+            simulate(
+                strategy,
+                args.slots,
+                args.tasks,
+                args.burst,
+                args.interval,
+                args.long_share,
+                seed,
+            )
+            for seed in range(args.seeds)
+        ]
+        makespan = statistics.median(r[0] for r in runs)
+        wait = statistics.median(r[1] for r in runs)
+        print(f"{strategy:>14} {makespan:>11.1f} {wait:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
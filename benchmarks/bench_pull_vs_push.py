@@ -0,0 +1,73 @@
+"""Makespan of push vs pull dispatch under skewed task runtimes.
+
+Starts a real master and workers (each with a few execution slots) in
+each dispatch mode and runs a wide fan-out whose tasks are mostly short
+with a few long ones. In push mode the master sends every ready task at
+once, so short tasks can queue behind long ones on one worker while
+another is idle; in pull mode workers only claim tasks when a slot is
+free. The ideal makespan (total work / total slots, or the longest task)
+is printed for reference.
+
+    python -m benchmarks.bench_pull_vs_push --tasks 200 --workers 3 --slots 2
+"""
+
+import argparse
+import random
+
+import httpx
+
+from benchmarks._harness import cluster, run_workflow
+
+
+def skewed_workflow(
+    workflow_id: str, tasks: int, long_share: float, seed: int
+) -> tuple[dict, list[float]]:
+    rng = random.Random(seed)
+    durations = [
+        rng.choice((1.0, 2.0)) if rng.random() < long_share else 0.05
+        for _ in range(tasks)
+    ]
+    definition = {
+        "id": workflow_id,
+        "tasks": [
+            {"id": f"t{i}", "command": f"sleep {d}"} for i, d in enumerate(durations)
+        ],
+    }
+    return definition, durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=2, help="execution slots per worker")
+    parser.add_argument("--long-share", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    total_slots = args.workers * args.slots
+    print(
+        f"{args.tasks} tasks ({args.long_share:.0%} long), "
+        f"{args.workers} workers x {args.slots} slots"
+    )
+    print(f"{'mode':>6} {'run':>4} {'status':>8} {'makespan_s':>11} {'ideal_s':>8}")
+    for mode in ("push", "pull"):
+        env = {
+            "AIRFLOW_MINI_DISPATCH_MODE": mode,
+            "AIRFLOW_MINI_WORKER_SLOTS": str(args.slots),
+        }
+        with cluster(num_workers=args.workers, extra_env=env) as base_url:
+            with httpx.Client(base_url=base_url, timeout=30.0) as client:
+                for i in range(args.repeat):
+                    wf, durations = skewed_workflow(
+                        f"skew_{mode}_{i}", args.tasks, args.long_share, seed=i
+                    )
+                    ideal = max(sum(durations) / total_slots, max(durations))
+                    status, elapsed = run_workflow(client, wf)
+                    print(
+                        f"{mode:>6} {i:>4} {status:>8} {elapsed:>11.2f} {ideal:>8.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Result-callback write throughput per storage backend.
+
+Starts N threads that each apply task-result updates (one
+``update_task_status`` commit per result, as ``/internal/task-result``
+does) and reports results absorbed per second. Without ``--url`` a
+temporary SQLite file is used; pass a PostgreSQL URL to compare, e.g.
+
+    python -m benchmarks.bench_storage_throughput --threads 1 4 16 \\
+        --url sqlite:///tmp/bench.db postgresql+psycopg://postgres:pg@127.0.0.1/postgres
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import TaskState
+from app.db import repository
+from app.db.database import Base, init_db, make_engine
+
+
+def measure(url: str, threads: int, per_thread: int) -> float:
+    engine = make_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    init_db(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    tasks = [{"id": f"t{i}", "command": "true"} for i in range(threads * per_thread)]
+    repository.create_workflow(db, "wf", {"id": "wf", "tasks": tasks})
+    run = repository.create_run(db, "wf", tasks)
+    ids = [t.id for t in repository.get_task_instances(db, run.id)]
+    db.close()
+
+    def worker(chunk: list[str]):
+        session = session_factory()
+        for task_instance_id in chunk:
+            repository.update_task_status(
+                session, task_instance_id, TaskState.SUCCESS, output="ok"
+            )
+        session.close()
+
+    pool = [
+        threading.Thread(target=worker, args=(ids[t::threads],))
+        for t in range(threads)
+    ]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return len(ids) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", nargs="+", default=None)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--per-thread", type=int, default=250)
+    args = parser.parse_args()
+
+    urls = args.url or [
+        "sqlite:///"
+        + os.path.join(tempfile.mkdtemp(prefix="airflow_mini_bench_"), "s.db")
+    ]
+    print(f"{'backend':>12} {'threads':>8} {'results_per_s':>14}")
+    for url in urls:
+        for threads in args.threads:
+            rate = measure(url, threads, args.per_thread)
+            print(f"{url.split(':', 1)[0]:>12} {threads:>8} {rate:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import sys
+
+from app.db import repository
+from app.db.database import SessionLocal, init_db
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recount task states per run and report counter drift"
+    )
+    parser.add_argument(
+        "--run", action="append", help="Only check this run id (repeatable)"
+    )
+    parser.add_argument(
+        "--fix", action="store_true", help="Overwrite drifted counters"
+    )
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        drift = repository.find_counter_drift(db, args.run)
+        for run_id, stored, actual in drift:
+            print(f"{run_id}: stored={stored} actual={actual}")
+        if args.fix and drift:
+            repository.recompute_run_counters(db, args.run)
+            print(f"Fixed counters for {len(drift)} run(s)")
+        elif not drift:
+            print("No counter drift found")
+    finally:
+        db.close()
+
+    sys.exit(1 if drift and not args.fix else 0)
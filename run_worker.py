@@ -11,9 +11,30 @@ if __name__ == "__main__":
     parser.add_argument(
         "--host", type=str, default="127.0.0.1", help="Host to bind to"
     )
+    parser.add_argument(
+        "--advertise-url",
+        type=str,
+        default=None,
+        help="URL the master uses to reach this worker (default: http://<host>:<port>)",
+    )
+    parser.add_argument(
+        "--master-url", type=str, default=None, help="Master to register with"
+    )
+    parser.add_argument(
+        "--no-register",
+        action="store_true",
+        help="Do not register/heartbeat (master must list this worker statically)",
+    )
     args = parser.parse_args()
 
     os.environ["WORKER_ID"] = f"worker-{args.port}"
+    if not args.no_register:
+        host = "127.0.0.1" if args.host in ("0.0.0.0", "::") else args.host
+        os.environ["AIRFLOW_MINI_WORKER_URL"] = (
+            args.advertise_url or f"http://{host}:{args.port}"
+        )
+    if args.master_url:
+        os.environ["AIRFLOW_MINI_MASTER_URL"] = args.master_url
 
     uvicorn.run(
         "app.worker.server:app",
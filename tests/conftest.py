@@ -1,24 +1,27 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.db.database import Base, get_db
+from app.db.database import Base, get_db, make_engine
 from app.main import app
 
 
 @pytest.fixture()
-def client(tmp_path):
-    """Provide a TestClient with a fresh temporary database per test."""
+def session_factory(tmp_path):
+    """Provide a sessionmaker bound to a fresh temporary database."""
     db_path = tmp_path / "test.db"
-    engine = create_engine(
-        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
-    )
-    TestSession = sessionmaker(bind=engine)
+    engine = make_engine(f"sqlite:///{db_path}")
     Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(session_factory):
+    """Provide a TestClient with a fresh temporary database per test."""
 
     def override_get_db():
-        db = TestSession()
+        db = session_factory()
         try:
             yield db
         finally:
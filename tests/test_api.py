@@ -1,4 +1,8 @@
+import time
+
 from app import config
+from app.core.models import TaskState
+from app.db import repository
 
 API_KEY = config.API_KEY
 HEADERS = {"X-API-Key": API_KEY}
@@ -14,6 +18,16 @@ SAMPLE_WORKFLOW = {
 }
 
 
+def _claim(client, session_factory, task_instance_ids, worker_id="worker-1"):
+    """Queue tasks and claim them as ``worker_id``; returns their payloads."""
+    db = session_factory()
+    repository.queue_tasks(db, task_instance_ids, queued_at="2024-01-01")
+    db.close()
+    claim = {"worker_id": worker_id, "max_tasks": len(task_instance_ids), "wait": 0}
+    tasks = client.post("/internal/work/claim", json=claim).json()["tasks"]
+    return {t["task_instance_id"]: t for t in tasks}
+
+
 def test_auth_required(client):
     response = client.get("/workflows")
     assert response.status_code in (401, 403, 422)
@@ -50,6 +64,17 @@ def test_register_invalid_dag_with_cycle(client):
     assert response.status_code == 400
 
 
+def test_register_scheduled_workflow(client):
+    workflow = {**SAMPLE_WORKFLOW, "id": "hourly", "schedule": "@hourly"}
+    response = client.post("/workflows", json=workflow, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["next_run_at"].endswith(":00:00+00:00")
+
+    workflow = {**SAMPLE_WORKFLOW, "id": "never", "schedule": "0 0 31 2 *"}
+    response = client.post("/workflows", json=workflow, headers=HEADERS)
+    assert response.status_code == 400
+
+
 def test_list_workflows(client):
     client.post("/workflows", json=SAMPLE_WORKFLOW, headers=HEADERS)
     response = client.get("/workflows", headers=HEADERS)
@@ -114,7 +139,7 @@ def test_get_run_tasks(client):
     assert task_ids == {"A", "B", "C", "D"}
 
 
-def test_task_result_callback(client):
+def test_task_result_callback(client, session_factory):
     client.post("/workflows", json=SAMPLE_WORKFLOW, headers=HEADERS)
     run_resp = client.post("/workflows/test_wf/run", headers=HEADERS)
     run_id = run_resp.json()["id"]
@@ -122,6 +147,7 @@ def test_task_result_callback(client):
     # Get task A's instance id
     tasks_resp = client.get(f"/runs/{run_id}/tasks", headers=HEADERS)
     task_a = next(t for t in tasks_resp.json() if t["task_id"] == "A")
+    _claim(client, session_factory, [task_a["id"]])
 
     # Simulate worker callback
     callback = {
@@ -138,3 +164,251 @@ def test_task_result_callback(client):
     task_a_updated = next(t for t in tasks_resp.json() if t["task_id"] == "A")
     assert task_a_updated["status"] == "SUCCESS"
     assert task_a_updated["output"] == "A output"
+
+
+def test_task_results_batch_callback(client, session_factory):
+    client.post("/workflows", json=SAMPLE_WORKFLOW, headers=HEADERS)
+    run_id = client.post("/workflows/test_wf/run", headers=HEADERS).json()["id"]
+    tasks = client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()
+    ids = {t["task_id"]: t["id"] for t in tasks}
+    _claim(client, session_factory, [ids["A"], ids["B"]])
+
+    batch = {
+        "results": [
+            {"task_instance_id": ids["A"], "status": "SUCCESS", "output": "a"},
+            {"task_instance_id": ids["B"], "status": "FAILED", "output": "b"},
+            {"task_instance_id": "unknown", "status": "SUCCESS"},
+        ]
+    }
+    response = client.post("/internal/task-results", json=batch)
+    assert response.status_code == 200
+    assert response.json()["applied"] == 2
+
+    # Redelivery of the same batch (e.g. after a lost response) is a no-op
+    response = client.post("/internal/task-results", json=batch)
+    assert response.json()["applied"] == 0
+
+    statuses = {
+        t["task_id"]: t["status"]
+        for t in client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()
+    }
+    assert statuses == {
+        "A": "SUCCESS",
+        "B": "FAILED",
+        "C": "PENDING",
+        "D": "PENDING",
+    }
+    counts = client.get(f"/runs/{run_id}", headers=HEADERS).json()["task_counts"]
+    assert counts["SUCCESS"] == 1
+    assert counts["FAILED"] == 1
+    assert counts["PENDING"] == 2
+
+
+def test_run_succeeds_when_all_tasks_succeed(client, session_factory):
+    client.post("/workflows", json=SAMPLE_WORKFLOW, headers=HEADERS)
+    run_id = client.post("/workflows/test_wf/run", headers=HEADERS).json()["id"]
+    tasks = client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()
+    _claim(client, session_factory, [t["id"] for t in tasks])
+
+    for task in tasks:
+        assert client.get(f"/runs/{run_id}", headers=HEADERS).json()["status"] == "RUNNING"
+        client.post(
+            "/internal/task-result",
+            json={"task_instance_id": task["id"], "status": "SUCCESS"},
+        )
+
+    run = client.get(f"/runs/{run_id}", headers=HEADERS).json()
+    assert run["status"] == "SUCCESS"
+    assert run["finished_at"] is not None
+
+
+def test_late_result_of_a_reaped_attempt_is_dropped(client, session_factory):
+    workflow = {
+        "id": "slow_wf",
+        "tasks": [
+            {"id": "A", "command": "sleep 60", "max_retries": 1, "retry_delay": 0}
+        ],
+    }
+    client.post("/workflows", json=workflow, headers=HEADERS)
+    run_id = client.post("/workflows/slow_wf/run", headers=HEADERS).json()["id"]
+    db = session_factory()
+    task_id = repository.get_task_instances(db, run_id)[0].id
+    db.close()
+    first = _claim(client, session_factory, [task_id], "worker-1")[task_id]
+
+    # worker-1 is slow to report: its lease runs out and the task goes to
+    # worker-2
+    db = session_factory()
+    reaped = repository.reap_expired_leases(db, "9999-01-01T00:00:00+00:00")
+    assert [t.id for t in reaped] == [task_id]
+    repository.requeue_retrying_tasks(db, [task_id])
+    db.close()
+    second = _claim(client, session_factory, [task_id], "worker-2")[task_id]
+    assert second["attempt"] != first["attempt"]
+
+    late = {
+        "task_instance_id": task_id,
+        "status": "SUCCESS",
+        "output": "from worker-1",
+        "worker_id": "worker-1",
+        "attempt": first["attempt"],
+    }
+    batch = {"results": [late]}
+    assert client.post("/internal/task-results", json=batch).json()["applied"] == 0
+    task = client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()[0]
+    assert (task["status"], task["worker_id"]) == ("RUNNING", "worker-2")
+
+    current = {**late, "worker_id": "worker-2", "attempt": second["attempt"]}
+    batch = {"results": [current]}
+    assert client.post("/internal/task-results", json=batch).json()["applied"] == 1
+    run = client.get(f"/runs/{run_id}", headers=HEADERS).json()
+    assert run["status"] == "SUCCESS"
+
+
+def test_result_loses_to_a_reap_between_its_load_and_write(
+    client, session_factory, monkeypatch
+):
+    workflow = {
+        "id": "raced_wf",
+        "tasks": [{"id": "A", "command": "true", "max_retries": 1}],
+    }
+    client.post("/workflows", json=workflow, headers=HEADERS)
+    run_id = client.post("/workflows/raced_wf/run", headers=HEADERS).json()["id"]
+    db = session_factory()
+    task_id = repository.get_task_instances(db, run_id)[0].id
+    db.close()
+    claimed = _claim(client, session_factory, [task_id])[task_id]
+
+    load = repository.get_task_instances_by_ids
+
+    def load_then_reap(db, task_instance_ids):
+        tasks = load(db, task_instance_ids)
+        # The reaper loads what it moved with the same helper
+        monkeypatch.setattr(repository, "get_task_instances_by_ids", load)
+        other = session_factory()
+        repository.reap_expired_leases(other, "9999-01-01T00:00:00+00:00")
+        other.close()
+        return tasks
+
+    monkeypatch.setattr(repository, "get_task_instances_by_ids", load_then_reap)
+    result = {
+        "task_instance_id": task_id,
+        "status": "SUCCESS",
+        "worker_id": "worker-1",
+        "attempt": claimed["attempt"],
+    }
+    batch = {"results": [result]}
+    assert client.post("/internal/task-results", json=batch).json()["applied"] == 0
+
+    db = session_factory()
+    assert repository.get_task_instance(db, task_id).status == TaskState.RETRYING
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_worker_heartbeat_joins_membership(client):
+    beat = {
+        "worker_id": "worker-9001",
+        "url": "http://10.0.0.9:9001",
+        "load": {"slots": 8, "free_slots": 8},
+    }
+    response = client.post("/internal/workers/register", json=beat)
+    assert response.status_code == 200
+
+    deadline = time.monotonic() + 5
+    while True:
+        workers = client.get("/workers", headers=HEADERS).json()
+        joined = [w for w in workers if w["url"] == beat["url"]]
+        if joined or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    assert joined and joined[0]["slots"] == 8
+    assert joined[0]["worker_id"] == "worker-9001"
+
+    client.post("/internal/workers/deregister", json=beat)
+    assert client.get("/workers").status_code == 401
+
+
+def test_claim_work_hands_out_queued_tasks_once(client, session_factory):
+    client.post("/workflows", json=SAMPLE_WORKFLOW, headers=HEADERS)
+    run_id = client.post(
+        f"/workflows/{SAMPLE_WORKFLOW['id']}/run", headers=HEADERS
+    ).json()["id"]
+    db = session_factory()
+    task_a = next(
+        t.id for t in repository.get_task_instances(db, run_id) if t.task_id == "A"
+    )
+    repository.queue_tasks(db, [task_a], queued_at="2024-01-01")
+    db.close()
+
+    claim = {"worker_id": "worker-1", "max_tasks": 4, "wait": 0}
+    body = client.post("/internal/work/claim", json=claim).json()
+    assert [t["task_id"] for t in body["tasks"]] == ["A"]
+    assert body["tasks"][0]["results_url"].endswith("/internal/task-results")
+
+    start = time.monotonic()
+    claim.update(wait=0.2, running=[task_a])
+    assert client.post("/internal/work/claim", json=claim).json()["tasks"] == []
+    assert time.monotonic() - start >= 0.2
+
+    tasks = client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()
+    assert {t["task_id"]: t["status"] for t in tasks}["A"] == "RUNNING"
+
+
+def test_callable_task_reaches_workers(client, session_factory):
+    workflow = {
+        "id": "py_wf",
+        "tasks": [{"id": "A", "callable": {"target": "math:factorial", "args": [5]}}],
+    }
+    response = client.post("/workflows", json=workflow, headers=HEADERS)
+    assert response.json()["definition"]["tasks"][0] == {
+        "id": "A",
+        "callable": {"target": "math:factorial", "args": [5], "kwargs": {}},
+        "dependencies": [],
+        "max_retries": 0,
+        "priority": 0,
+    }
+    run_id = client.post("/workflows/py_wf/run", headers=HEADERS).json()["id"]
+    db = session_factory()
+    task = repository.get_task_instances(db, run_id)[0]
+    repository.queue_tasks(db, [task.id], queued_at="2024-01-01")
+    db.close()
+
+    claim = {"worker_id": "worker-1", "max_tasks": 1, "wait": 0}
+    claimed = client.post("/internal/work/claim", json=claim).json()["tasks"]
+    assert claimed[0]["callable"] == {
+        "target": "math:factorial", "args": [5], "kwargs": {}
+    }
+    tasks = client.get(f"/runs/{run_id}/tasks", headers=HEADERS).json()
+    assert (tasks[0]["command"], tasks[0]["callable"]["target"]) == ("", "math:factorial")
+
+
+def test_task_log_streams_as_server_sent_events(client, session_factory, monkeypatch):
+    workflow = {"id": "log_wf", "tasks": [{"id": "A", "command": "echo A"}]}
+    client.post("/workflows", json=workflow, headers=HEADERS)
+    db = session_factory()
+    run = repository.create_run(db, "log_wf", workflow["tasks"])
+    (task,) = repository.get_task_instances(db, run.id)
+    task_instance_id = task.id
+    url = f"/runs/{run.id}/tasks/A/logs"
+    assert client.get(url, headers=HEADERS).status_code == 404
+
+    repository.mark_tasks_running(db, {"http://w1": [task_instance_id]}, "now")
+    repository.update_task_status(db, task_instance_id, "SUCCESS")
+    db.close()
+    log = "héllo\nworld\n".encode()
+
+    async def fake_fetch(log_url, start, end):
+        assert log_url == f"http://w1/logs/{task_instance_id}"
+        return log[start:end]
+
+    monkeypatch.setattr(client.app.state.log_tails, "_fetch", fake_fetch)
+    response = client.get(url, headers=HEADERS)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        f"id: {len(log)}\nevent: log\ndata: héllo\ndata: world\ndata: \n\n"
+        'event: end\ndata: {"status": "SUCCESS"}\n\n'
+    )
+
+    resumed = client.get(url, headers={**HEADERS, "Last-Event-ID": "7"})
+    assert resumed.text.startswith(f"id: {len(log)}\nevent: log\ndata: world\n")
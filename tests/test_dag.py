@@ -1,4 +1,8 @@
-from app.core.dag import validate_dag
+import json
+from types import SimpleNamespace
+
+from app import config
+from app.core.dag import DagCache, bottom_levels, compile_dag, validate_dag
 
 
 def test_valid_dag():
@@ -64,6 +68,49 @@ def test_missing_task_command():
     assert any("'command'" in e for e in errors)
 
 
+def test_callable_tasks():
+    dag = {
+        "id": "test",
+        "tasks": [
+            {"id": "A", "callable": {"target": "math:factorial", "args": [5]}},
+            {"id": "B", "command": "echo B", "callable": {"target": "math:sqrt"}},
+            {"id": "C", "callable": {"target": "math.factorial"}},
+        ],
+    }
+    errors = validate_dag(dag)
+    assert errors == [
+        "Task 'B' must have either a 'command' or a 'callable' field",
+        "Task 'C' callable must name a 'package.module:function'",
+    ]
+    assert compile_dag(dag).callables[0] == {"target": "math:factorial", "args": [5]}
+
+
+def test_unknown_pool(monkeypatch):
+    monkeypatch.setattr(config, "POOLS", {"warehouse": 4})
+    dag = {
+        "id": "test",
+        "tasks": [
+            {"id": "A", "command": "echo A", "pool": "warehouse"},
+            {"id": "B", "command": "echo B", "pool": "api"},
+        ],
+    }
+    assert validate_dag(dag) == ["Task 'B' uses unknown pool 'api'"]
+
+
+def test_schedule_must_be_a_valid_cron_or_an_interval():
+    tasks = [{"id": "A", "command": "echo A"}]
+    weekdays = {"id": "t", "schedule": "*/5 * * * mon-fri", "tasks": tasks}
+    assert validate_dag(weekdays) == []
+    bad = {"id": "t", "schedule": "0 25 * * *", "tasks": tasks}
+    assert validate_dag(bad) == [
+        "Invalid schedule '0 25 * * *': hour must be 0-23, got '25'"
+    ]
+    both = {"id": "t", "schedule": "@daily", "schedule_interval": 60, "tasks": tasks}
+    assert validate_dag(both) == [
+        "Workflow may have a 'schedule' or a 'schedule_interval', not both"
+    ]
+
+
 def test_unknown_dependency():
     dag = {
         "id": "test",
@@ -109,3 +156,118 @@ def test_three_node_cycle():
     }
     errors = validate_dag(dag)
     assert any("cycle" in e.lower() for e in errors)
+
+
+def _workflow_row(workflow_id, definition, version=1):
+    return SimpleNamespace(
+        id=workflow_id, definition=json.dumps(definition), version=version
+    )
+
+
+def test_compile_dag_structure():
+    dag = compile_dag(
+        {
+            "id": "test",
+            "tasks": [
+                {"id": "D", "command": "echo D", "dependencies": ["B", "C"]},
+                {"id": "B", "command": "echo B", "dependencies": ["A"]},
+                {"id": "C", "command": "echo C", "dependencies": ["A"]},
+                {"id": "A", "command": "echo A", "dependencies": []},
+            ],
+        }
+    )
+    a, b, c, d = (dag.index[t] for t in "ABCD")
+    assert list(dag.in_degree) == [2, 1, 1, 0]
+    assert sorted(dag.downstream(a)) == [b, c]
+    assert list(dag.downstream(d)) == []
+    position = {i: pos for pos, i in enumerate(dag.topo_order)}
+    assert position[a] < position[b] < position[d]
+    assert position[a] < position[c] < position[d]
+
+
+def test_compile_dag_cycle_has_no_topo_order():
+    dag = compile_dag(
+        {
+            "id": "test",
+            "tasks": [
+                {"id": "A", "command": "echo A", "dependencies": ["B"]},
+                {"id": "B", "command": "echo B", "dependencies": ["A"]},
+            ],
+        }
+    )
+    assert dag.topo_order is None
+
+
+WIDE_THEN_DEEP = {
+    "id": "wtd",
+    "tasks": [
+        {"id": "root", "command": "true"},
+        {"id": "w1", "command": "true", "dependencies": ["root"]},
+        {"id": "w2", "command": "true", "dependencies": ["root"]},
+        {"id": "deep1", "command": "true", "dependencies": ["w2"]},
+        {"id": "deep2", "command": "true", "dependencies": ["deep1"]},
+    ],
+}
+
+
+def test_bottom_levels_rank_the_critical_path_highest():
+    dag = compile_dag(WIDE_THEN_DEEP)
+    rank = dict(zip(dag.task_ids, dag.ranks))
+    assert rank == {"root": 4, "w1": 1, "w2": 3, "deep1": 2, "deep2": 1}
+
+    # Durations override unit weights; unknown tasks count as the mean
+    weighted = bottom_levels(dag, {"w1": 30.0, "deep1": 2.0, "deep2": 4.0})
+    rank = dict(zip(dag.task_ids, weighted))
+    assert rank["w1"] == 30 and rank["w2"] == 12 + 6
+    assert rank["root"] == 12 + 30
+
+
+def test_dag_cache_refreshes_ranks_once_they_are_stale():
+    cache = DagCache(max_entries=10, max_bytes=10**9)
+    dag = cache.get(_workflow_row("wtd", WIDE_THEN_DEEP))
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"w1": 30.0, "w2": 1.0, "deep1": 1.0, "deep2": 1.0}
+
+    ranks = cache.ranks(dag, load, max_age=60)
+    assert ranks[dag.index["w1"]] > ranks[dag.index["w2"]]
+    assert cache.ranks(dag, load, max_age=60) is ranks
+    assert len(loads) == 1
+    cache.ranks(dag, load, max_age=0)
+    assert len(loads) == 2
+    # Without any history the unit-weight ranks are used
+    assert cache.ranks(dag, dict, max_age=0) == dag.ranks
+
+
+def test_dag_cache_hit_and_version_bump():
+    cache = DagCache(max_entries=10, max_bytes=10**9)
+    definition = {"id": "wf", "tasks": [{"id": "A", "command": "echo A"}]}
+    first = cache.get(_workflow_row("wf", definition))
+    assert cache.get(_workflow_row("wf", definition)) is first
+
+    updated = {"id": "wf", "tasks": [{"id": "B", "command": "echo B"}]}
+    second = cache.get(_workflow_row("wf", updated, version=2))
+    assert second is not first
+    assert second.task_ids == ("B",)
+    assert len(cache) == 1
+
+
+def test_dag_cache_evicts_least_recently_used():
+    cache = DagCache(max_entries=2, max_bytes=10**9)
+    rows = {
+        wid: _workflow_row(wid, {"id": wid, "tasks": [{"id": "A", "command": "x"}]})
+        for wid in ("a", "b", "c")
+    }
+    a = cache.get(rows["a"])
+    cache.get(rows["b"])
+    cache.get(rows["a"])  # touch "a" so "b" is the LRU entry
+    cache.get(rows["c"])
+    assert len(cache) == 2
+    assert cache.get(rows["a"]) is a
+
+    tiny = DagCache(max_entries=10, max_bytes=1)
+    tiny.get(rows["a"])
+    tiny.get(rows["b"])
+    assert len(tiny) == 1
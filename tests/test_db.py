@@ -0,0 +1,313 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import TaskState
+from app.db import repository
+from app.db.backends import PostgresBackend, SqliteBackend, get_backend
+from app.db.database import init_db, make_engine
+
+
+def test_init_db_adds_columns_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE workflows ("
+                "id VARCHAR PRIMARY KEY, definition TEXT NOT NULL, "
+                "created_at VARCHAR NOT NULL)"
+            )
+        )
+        conn.execute(
+            text("INSERT INTO workflows VALUES ('wf', '{}', '2024-01-01')")
+        )
+
+    init_db(engine)
+
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("workflows")}
+    assert "version" in columns
+    indexes = {i["name"] for i in inspector.get_indexes("task_instances")}
+    assert "ix_task_instances_run_id_status" in indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM workflows")).scalar() == 1
+
+
+def test_sqlite_connections_use_tuned_profile(session_factory):
+    db = session_factory()
+    assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert db.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    db.close()
+
+
+def test_hot_queries_use_indexes(session_factory):
+    db = session_factory()
+    plans = [
+        " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {q}")))
+        for q in (
+            "SELECT * FROM workflow_runs WHERE status = 'RUNNING'",
+            "SELECT * FROM task_instances WHERE run_id = 'r'",
+            "SELECT id FROM task_instances WHERE status = 'QUEUED' "
+            "ORDER BY queued_at LIMIT 8",
+            "SELECT id FROM task_instances WHERE status = 'RUNNING' "
+            "AND lease_expires_at <= '2024-01-01'",
+        )
+    ]
+    assert all("USING INDEX" in plan for plan in plans)
+    db.close()
+
+
+def _run_with_tasks(session_factory, n=3):
+    db = session_factory()
+    tasks = [{"id": f"t{i}", "command": "true", "max_retries": 2} for i in range(n)]
+    repository.create_workflow(db, "wf", {"id": "wf", "tasks": tasks})
+    run = repository.create_run(db, "wf", tasks)
+    return db, repository.get_task_instances(db, run.id)
+
+
+def test_transition_tasks_is_compare_and_set(session_factory):
+    db, tasks = _run_with_tasks(session_factory)
+    repository.update_task_status(db, tasks[0].id, TaskState.SUCCESS)
+
+    moved = repository.transition_tasks(
+        db,
+        [t.id for t in tasks],
+        TaskState.PENDING,
+        TaskState.RUNNING,
+        worker_id="w1",
+    )
+
+    assert sorted(moved) == sorted(t.id for t in tasks[1:])
+    db.expire_all()
+    assert repository.get_task_instance(db, tasks[0].id).status == TaskState.SUCCESS
+    assert repository.get_task_instance(db, tasks[1].id).worker_id == "w1"
+    db.close()
+
+
+def test_requeue_retrying_tasks_consumes_a_retry(session_factory):
+    db, tasks = _run_with_tasks(session_factory)
+    repository.mark_tasks_running(
+        db, {"http://w1": [tasks[0].id]}, "now", lease_expires_at="2024-01-01"
+    )
+    repository.reap_expired_leases(db, "2024-01-01")
+    db.execute(text("UPDATE task_instances SET peak_rss_kb = 10, wall_seconds = 1"))
+    db.commit()
+
+    moved = repository.requeue_retrying_tasks(db, [t.id for t in tasks])
+
+    assert moved == [tasks[0].id]
+    db.expire_all()
+    task = repository.get_task_instance(db, tasks[0].id)
+    assert task.status == TaskState.PENDING
+    assert task.retries_left == 1
+    # Nothing of the reaped attempt carries over to the next one
+    assert (task.started_at, task.finished_at, task.worker_id) == (None, None, None)
+    assert (task.output, task.log_url, task.lease_expires_at) == (None, None, None)
+    assert (task.peak_rss_kb, task.wall_seconds, task.not_before) == (None, None, None)
+    db.close()
+
+
+def test_unclaimed_tasks_go_back_to_pending(session_factory):
+    db, tasks = _run_with_tasks(session_factory, n=2)
+    ids = [t.id for t in tasks]
+    repository.mark_tasks_running(db, {"http://w1": ids}, "now", lease_expires_at="9")
+    repository.update_task_status(db, ids[0], TaskState.SUCCESS)
+
+    assert repository.unclaim_tasks(db, ids) == [ids[1]]
+    db.expire_all()
+    task = repository.get_task_instance(db, ids[1])
+    assert task.status == TaskState.PENDING
+    assert (task.worker_id, task.log_url, task.lease_expires_at) == (None, None, None)
+    assert repository.get_task_instance(db, ids[0]).status == TaskState.SUCCESS
+    db.close()
+
+
+def test_claims_take_oldest_queued_tasks_once_and_leases_expire(session_factory):
+    db, tasks = _run_with_tasks(session_factory, n=3)
+    for k, task in enumerate(reversed(tasks)):
+        repository.queue_tasks(db, [task.id], queued_at=f"2024-01-01T00:00:0{k}")
+
+    first = repository.claim_queued_tasks(db, "w1", 2, "now", "2024-01-01T00:01:00")
+    second = repository.claim_queued_tasks(db, "w2", 2, "now", "2024-01-01T00:01:00")
+    assert {t.id for t in first} == {tasks[2].id, tasks[1].id}
+    assert [t.id for t in second] == [tasks[0].id]
+    assert all(t.status == TaskState.RUNNING and t.worker_id == "w1" for t in first)
+
+    # Only the owner's leases are renewed; the rest expire and are retried
+    renewed = repository.renew_leases(
+        db, ["w1"], [tasks[0].id, tasks[1].id], "2024-01-01T00:09:00"
+    )
+    assert renewed == 1
+    reaped = repository.reap_expired_leases(db, "2024-01-01T00:05:00")
+    assert sorted(t.id for t in reaped) == sorted([tasks[0].id, tasks[2].id])
+    assert all(t.status == TaskState.RETRYING for t in reaped)
+    assert repository.reap_expired_leases(db, "2024-01-01T00:05:00") == []
+
+    db.expire_all()
+    counts = repository.run_task_counts(repository.get_run(db, tasks[0].run_id))
+    assert counts[TaskState.RETRYING] == 2 and counts[TaskState.RUNNING] == 1
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_claims_skip_tasks_that_do_not_fit_the_worker(session_factory):
+    db = session_factory()
+    definitions = [{"id": f"t{c}", "command": "true", "cpus": c} for c in (4, 1, 2)]
+    repository.create_workflow(db, "wf", {"id": "wf", "tasks": definitions})
+    run = repository.create_run(db, "wf", definitions)
+    by_id = {t.task_id: t for t in repository.get_task_instances(db, run.id)}
+    tasks = [by_id[d["id"]] for d in definitions]
+    for k, task in enumerate(tasks):
+        repository.queue_tasks(db, [task.id], queued_at=f"2024-01-01T00:00:0{k}")
+
+    claimed = repository.claim_queued_tasks(
+        db, "w1", 3, "now", "later", free_cpus=3, idle=False
+    )
+    assert {t.id for t in claimed} == {tasks[1].id, tasks[2].id}
+    # An idle worker takes the oldest task even if it asks for more
+    claimed = repository.claim_queued_tasks(
+        db, "w2", 3, "now", "later", free_cpus=2, idle=True
+    )
+    assert [t.id for t in claimed] == [tasks[0].id]
+    db.close()
+
+
+def test_lost_worker_leases_fail_tasks_without_retries(session_factory):
+    db, tasks = _run_with_tasks(session_factory, n=2)
+    repository.mark_tasks_running(
+        db, {"http://w1": [t.id for t in tasks]}, "now", lease_expires_at="9999"
+    )
+    repository.update_task_status(
+        db, tasks[0].id, TaskState.RUNNING, retries_left=0
+    )
+    assert repository.expire_worker_leases(db, ["http://w1"], "2024-01-01") == 2
+    reaped = {t.id: t for t in repository.reap_expired_leases(db, "2024-01-01")}
+    assert reaped[tasks[0].id].status == TaskState.FAILED
+    assert reaped[tasks[0].id].output.startswith("Lease expired")
+    assert reaped[tasks[1].id].status == TaskState.RETRYING
+    # Its retry waits out the default backoff (10 s, less up to half jitter)
+    assert "2024-01-01T00:00:05" <= reaped[tasks[1].id].not_before
+    assert reaped[tasks[1].id].not_before <= "2024-01-01T00:00:10+00:00"
+    assert reaped[tasks[0].id].not_before is None
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_backend_is_selected_from_url_scheme():
+    assert isinstance(get_backend("sqlite:///x.db"), SqliteBackend)
+    pg = get_backend("postgresql+psycopg://u:p@localhost/db")
+    assert isinstance(pg, PostgresBackend)
+    assert pg.supports_skip_locked
+
+
+def test_run_counters_follow_every_transition(session_factory):
+    db, tasks = _run_with_tasks(session_factory)
+    run_id = tasks[0].run_id
+    ids = [t.id for t in tasks]
+
+    repository.mark_tasks_running(db, {"w1": ids}, started_at="now")
+    repository.update_task_status(db, ids[0], TaskState.SUCCESS)
+    repository.update_task_instances(
+        db,
+        [(repository.get_task_instance(db, ids[1]), {"status": TaskState.RETRYING})],
+    )
+    repository.requeue_retrying_tasks(db, [ids[1]])
+
+    counts = repository.run_task_counts(repository.get_run(db, run_id))
+    assert counts == {
+        TaskState.PENDING: 1,
+        TaskState.QUEUED: 0,
+        TaskState.RUNNING: 1,
+        TaskState.SUCCESS: 1,
+        TaskState.FAILED: 0,
+        TaskState.RETRYING: 0,
+        TaskState.UPSTREAM_FAILED: 0,
+    }
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_writes_racing_a_transition_leave_the_counters_exact(session_factory):
+    db, tasks = _run_with_tasks(session_factory, n=2)
+    ids = [t.id for t in tasks]
+    repository.mark_tasks_running(db, {"w1": ids}, started_at="now")
+    loaded = repository.get_task_instances_by_ids(db, ids)
+
+    # The reaper retries both tasks after they were loaded
+    other = session_factory()
+    repository.transition_tasks(other, ids, TaskState.RUNNING, TaskState.RETRYING)
+    other.close()
+
+    changes = [(loaded[0], {"status": TaskState.FAILED})]
+    assert repository.update_task_instances(db, changes) == []
+    results = [(loaded[1], {"status": TaskState.SUCCESS})]
+    assert repository.record_task_results(db, results) == []
+
+    db.expire_all()
+    statuses = [repository.get_task_instance(db, i).status for i in ids]
+    assert statuses == [TaskState.RETRYING, TaskState.RETRYING]
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_counter_drift_is_detected_and_fixed(session_factory):
+    db, tasks = _run_with_tasks(session_factory)
+    run_id = tasks[0].run_id
+    db.execute(text("UPDATE workflow_runs SET pending_count = 7"))
+    db.commit()
+
+    drift = repository.find_counter_drift(db)
+    assert [(r, stored[TaskState.PENDING]) for r, stored, _ in drift] == [(run_id, 7)]
+
+    assert repository.recompute_run_counters(db) == 1
+    assert repository.find_counter_drift(db) == []
+    db.close()
+
+
+def test_init_db_backfills_counters_for_old_runs(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    init_db(engine)
+    db = sessionmaker(bind=engine)()
+    tasks = [{"id": "A", "command": "true"}, {"id": "B", "command": "true"}]
+    repository.create_workflow(db, "wf", {"id": "wf", "tasks": tasks})
+    run = repository.create_run(db, "wf", tasks)
+    db.close()
+    with engine.begin() as conn:
+        for column in repository.COUNTER_COLUMNS.values():
+            conn.execute(text(f"ALTER TABLE workflow_runs DROP COLUMN {column}"))
+
+    init_db(engine)
+
+    db = sessionmaker(bind=engine)()
+    counts = repository.run_task_counts(repository.get_run(db, run.id))
+    assert counts[TaskState.PENDING] == 2
+    db.close()
+
+
+def test_task_durations_average_recent_successes(session_factory):
+    db, first = _run_with_tasks(session_factory, n=2)
+    second_run = repository.create_run(
+        db, "wf", [{"id": f"t{i}", "command": "true"} for i in range(2)]
+    )
+    second = repository.get_task_instances(db, second_run.id)
+    t0 = [t for t in first + second if t.task_id == "t0"]
+    t1 = [t for t in first + second if t.task_id == "t1"]
+    repository.update_task_instances(
+        db,
+        [
+            (t0[0], {"status": TaskState.SUCCESS, "wall_seconds": 2.0}),
+            (t0[1], {"status": TaskState.SUCCESS, "wall_seconds": 4.0}),
+            # No measured wall time: taken from the timestamps
+            (
+                t1[0],
+                {
+                    "status": TaskState.SUCCESS,
+                    "started_at": "2024-01-01T00:00:00+00:00",
+                    "finished_at": "2024-01-01T00:00:10+00:00",
+                },
+            ),
+            (t1[1], {"status": TaskState.FAILED, "wall_seconds": 99.0}),
+        ],
+    )
+    assert repository.task_durations(db, "wf") == {"t0": 3.0, "t1": 10.0}
+    assert repository.task_durations(db, "other") == {}
+    db.close()
@@ -0,0 +1,72 @@
+import asyncio
+
+from app.core.logtail import LogTails
+
+
+class FakeWorkerLog:
+    """A growing log file behind a range-capable fetch, counting reads."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.finished = False
+        self.reads: list[tuple[int, int]] = []
+
+    async def fetch(self, url: str, start: int, end: int) -> bytes:
+        self.reads.append((start, end))
+        return bytes(self.data[start:end])
+
+    async def is_finished(self) -> bool:
+        return self.finished
+
+
+async def _collect(tails, log, offset=0):
+    received = bytearray()
+    async for chunk_offset, data in tails.follow(
+        "ti@1", "http://w/logs/ti", log.is_finished, offset
+    ):
+        assert chunk_offset == offset + len(received)
+        received += data
+    return bytes(received)
+
+
+def test_followers_share_one_reader_and_get_every_byte():
+    async def scenario():
+        log = FakeWorkerLog()
+        tails = LogTails(poll_interval=0.01, buffer_bytes=1024)
+        tails._fetch = log.fetch
+        followers = [asyncio.create_task(_collect(tails, log)) for _ in range(20)]
+        for k in range(10):
+            log.data += f"line {k}\n".encode()
+            await asyncio.sleep(0.02)
+        log.finished = True
+        results = await asyncio.gather(*followers)
+        return log, tails, results
+
+    log, tails, results = asyncio.run(scenario())
+    assert all(r == bytes(log.data) for r in results)
+    # One poller for all 20 followers, each poll reading only new bytes
+    assert all(start >= 0 for start, _ in log.reads)
+    assert len(log.reads) < 100
+    assert len(tails) == 0
+
+
+def test_late_follower_reads_only_the_range_it_missed():
+    async def scenario():
+        log = FakeWorkerLog()
+        tails = LogTails(poll_interval=0.01, buffer_bytes=10)
+        tails._fetch = log.fetch
+        first = asyncio.create_task(_collect(tails, log))
+        for k in range(5):
+            log.data += b"0123456789"
+            await asyncio.sleep(0.02)
+        log.reads.clear()
+        late = asyncio.create_task(_collect(tails, log, offset=5))
+        await asyncio.sleep(0.02)
+        log.finished = True
+        return log, await first, await late
+
+    log, first, late = asyncio.run(scenario())
+    assert first == bytes(log.data)
+    assert late == bytes(log.data[5:])
+    # The late follower fetched [5, 40) itself; the rest came from the buffer
+    assert (5, 40) in log.reads
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+
+from app import config
+from app.core.models import TaskState
+from app.core.placement import WorkerRegistry
+from app.core.scheduler import Scheduler
+from app.db import repository
+
+
+def _tick(scheduler):
+    async def tick_and_flush():
+        await scheduler._tick()
+        await asyncio.gather(*scheduler._inflight)
+
+    asyncio.run(tick_and_flush())
+
+
+def _place(registry: WorkerRegistry, n: int) -> dict[str, int]:
+    counts = {url: 0 for url in registry.urls}
+    for k in range(n):
+        url = registry.pick(now=0.0)
+        registry.assign(f"ti-{k}", url)
+        counts[url] += 1
+    return counts
+
+
+def test_least_loaded_fills_the_idle_worker_first():
+    registry = WorkerRegistry(["a", "b"], strategy="least_loaded")
+    for k in range(3):
+        registry.assign(f"long-{k}", "a")
+    assert _place(registry, 5) == {"a": 1, "b": 4}
+
+
+def test_weighted_places_in_proportion_to_slots():
+    registry = WorkerRegistry(["big", "small"], strategy="weighted")
+    registry.update_load("big", {"slots": 6, "free_slots": 6})
+    registry.update_load("small", {"slots": 2, "free_slots": 2})
+    assert _place(registry, 8) == {"big": 6, "small": 2}
+
+
+def test_power_of_two_avoids_the_loaded_worker():
+    registry = WorkerRegistry(["a", "b", "c"], strategy="power_of_two", seed=1)
+    for k in range(10):
+        registry.assign(f"long-{k}", "a")
+    counts = _place(registry, 10)
+    assert counts["a"] == 0
+
+
+def test_assign_and_release_are_idempotent():
+    registry = WorkerRegistry(["a", "b"])
+    registry.assign("ti", "a")
+    registry.assign("ti", "a")
+    registry.assign("ti", "b")
+    assert [w.in_flight for w in registry.workers.values()] == [0, 1]
+    registry.release("ti")
+    registry.release("ti")
+    assert [w.in_flight for w in registry.workers.values()] == [0, 0]
+
+
+def test_busy_workers_are_not_picked():
+    registry = WorkerRegistry(["a", "b"])
+    registry.mark_busy("a", until=10.0)
+    assert registry.pick(now=5.0) == "b"
+    registry.mark_busy("b", until=10.0)
+    assert registry.pick(now=5.0) is None
+    assert registry.pick(now=10.0) is not None
+
+
+def test_tasks_only_go_where_their_cores_and_memory_fit():
+    registry = WorkerRegistry(["a", "b"])
+    registry.update_load("a", {"slots": 8, "cpus": 4, "memory_mb": 4096})
+    registry.update_load("b", {"slots": 8, "cpus": 2, "memory_mb": 1024})
+
+    registry.assign("big", registry.pick(now=0.0, cpus=3, memory_mb=2048), 3, 2048)
+    assert registry.workers["a"].reserved_cpus == 3
+    # "a" has one core left and "b" half the memory asked for
+    registry.assign("small", "b", 1, 512)
+    assert registry.pick(now=0.0, cpus=2, memory_mb=512) is None
+    assert registry.pick(now=0.0, cpus=1, memory_mb=1024) == "a"
+
+    # An idle worker takes a task bigger than itself rather than never
+    registry.release("small")
+    assert registry.pick(now=0.0, cpus=16, memory_mb=0) == "b"
+    registry.release("big")
+    assert registry.workers["a"].reserved_cpus == 0
+    assert registry.workers["a"].reserved_memory_mb == 0
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        WorkerRegistry(["a"], strategy="fastest")
+
+
+def test_scheduler_rebuilds_in_flight_from_running_tasks(monkeypatch, session_factory):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    db = session_factory()
+    workflow = {
+        "id": "placement",
+        "tasks": [{"id": t, "command": "true"} for t in ("A", "B", "C")],
+    }
+    repository.create_workflow(db, "placement", workflow)
+    run = repository.create_run(db, "placement", workflow["tasks"])
+    ids = {t.task_id: t.id for t in repository.get_task_instances(db, run.id)}
+    repository.mark_tasks_running(
+        db, {"http://w1": [ids["A"], ids["B"]], "http://w2": [ids["C"]]}, "now"
+    )
+
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry(["http://w1", "http://w2"])
+    scheduler._resync(db)
+    assert scheduler.workers.workers["http://w1"].in_flight == 2
+    assert scheduler.workers.workers["http://w2"].in_flight == 1
+
+    scheduler.task_state_changed(run.id, "A", TaskState.SUCCESS)
+    scheduler._apply_events(db)
+    assert scheduler.workers.workers["http://w1"].in_flight == 1
+    db.close()
+
+
+def test_heartbeats_add_refresh_and_expire_workers():
+    registry = WorkerRegistry(["http://static"])
+    assert registry.heartbeat("http://new", "worker-9", {"slots": 4}, now=10.0)
+    assert not registry.heartbeat("http://new", "worker-9", None, now=12.0)
+    assert registry.workers["http://new"].slots == 4
+    # What threads other than the scheduler's may read
+    members = registry.members
+    assert members == {"http://static", "http://new"}
+
+    # Statically configured workers without heartbeats are never expired
+    assert [w.url for w in registry.expire(deadline=13.0)] == ["http://new"]
+    assert registry.urls == ["http://static"]
+    assert registry.members == {"http://static"}
+    assert members == {"http://static", "http://new"}
+
+
+def test_placements_count_once_the_worker_joins():
+    registry = WorkerRegistry([])
+    registry.assign("ti-1", "http://late")
+    registry.assign("ti-2", "http://late")
+    registry.release("ti-2")
+    registry.heartbeat("http://late", "worker-1", None, now=0.0)
+    assert registry.workers["http://late"].in_flight == 1
+
+
+def test_waiting_tasks_go_to_a_worker_as_soon_as_it_joins(monkeypatch, session_factory):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    db = session_factory()
+    workflow = {"id": "join", "tasks": [{"id": "A", "command": "true"}]}
+    repository.create_workflow(db, "join", workflow)
+    repository.create_run(db, "join", workflow["tasks"])
+
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry([])
+    sent = []
+
+    async def fake_send(worker_url, payloads):
+        sent.append(worker_url)
+        return ["accepted"] * len(payloads)
+
+    scheduler._send_to_worker = fake_send
+    _tick(scheduler)
+    assert sent == []
+
+    scheduler.worker_heartbeat("http://new", "worker-1", {"slots": 2})
+    _tick(scheduler)
+    assert sent == ["http://new"]
+    db.close()
+
+
+def test_silent_worker_is_dropped(monkeypatch, session_factory):
+    monkeypatch.setattr(config, "WORKER_HEARTBEAT_TIMEOUT", 0.0)
+    db = session_factory()
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry([])
+    scheduler.worker_heartbeat("http://gone", "worker-1", None)
+    scheduler._apply_events(None)
+    assert scheduler.workers.urls == ["http://gone"]
+    time.sleep(0.01)
+    scheduler._expire_workers(db)
+    assert scheduler.workers.urls == []
+    db.close()
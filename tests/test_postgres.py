@@ -0,0 +1,53 @@
+"""Storage tests that need a real PostgreSQL server.
+
+Point ``AIRFLOW_MINI_TEST_POSTGRES_URL`` at a throwaway database, e.g.::
+
+    docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=pg postgres:16
+    AIRFLOW_MINI_TEST_POSTGRES_URL=postgresql+psycopg://postgres:pg@127.0.0.1/postgres \\
+        python -m pytest tests/test_postgres.py
+"""
+
+import os
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import TaskState
+from app.db import repository
+from app.db.database import Base, init_db, make_engine
+
+POSTGRES_URL = os.getenv("AIRFLOW_MINI_TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(
+    not POSTGRES_URL, reason="AIRFLOW_MINI_TEST_POSTGRES_URL not set"
+)
+
+
+@pytest.fixture()
+def pg_session_factory():
+    engine = make_engine(POSTGRES_URL)
+    Base.metadata.drop_all(bind=engine)
+    init_db(engine)
+    yield sessionmaker(bind=engine)
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+def test_concurrent_claims_skip_locked_rows(pg_session_factory):
+    db = pg_session_factory()
+    tasks = [{"id": f"t{i}", "command": "true"} for i in range(4)]
+    repository.create_workflow(db, "wf", {"id": "wf", "tasks": tasks})
+    run = repository.create_run(db, "wf", tasks)
+    ids = [t.id for t in repository.get_task_instances(db, run.id)]
+
+    holder = pg_session_factory()
+    locked = repository._lock_claimable(holder, ids[:2], TaskState.PENDING)
+    assert sorted(locked) == sorted(ids[:2])
+
+    # A second claimer skips the locked rows instead of blocking on them
+    claimed = repository.mark_tasks_running(db, {"w1": ids}, started_at="now")
+    assert sorted(claimed) == sorted(ids[2:])
+
+    holder.rollback()
+    holder.close()
+    db.close()
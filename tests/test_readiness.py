@@ -0,0 +1,230 @@
+from types import SimpleNamespace
+
+from app.core.concurrency import ConcurrencyLimits
+from app.core.dag import bottom_levels, compile_dag
+from app.core.models import TaskState
+from app.core.readiness import ReadyQueue, RunReadiness
+
+DAG = compile_dag(
+    {
+        "id": "wf",
+        "tasks": [
+            {"id": "A", "command": "echo A", "dependencies": []},
+            {"id": "B", "command": "echo B", "dependencies": ["A"]},
+            {"id": "C", "command": "echo C", "dependencies": ["A"]},
+            {"id": "D", "command": "echo D", "dependencies": ["B", "C"]},
+        ],
+    }
+)
+A, B, C, D = (DAG.index[t] for t in "ABCD")
+
+
+def _readiness(
+    statuses: dict[str, str] | None = None, dag=DAG, run_id: str = "run"
+) -> RunReadiness:
+    statuses = statuses or {}
+    instances = [
+        SimpleNamespace(
+            id=f"{run_id}-{tid}",
+            task_id=tid,
+            status=statuses.get(tid, TaskState.PENDING),
+        )
+        for tid in dag.task_ids
+    ]
+    return RunReadiness(run_id, dag, instances)
+
+
+def _wide(workflow_id: str, n: int, priority: int = 0, task_priorities=()):
+    tasks = [{"id": f"t{k}", "command": "true"} for k in range(n)]
+    for k, p in enumerate(task_priorities):
+        tasks[k]["priority"] = p
+    return compile_dag({"id": workflow_id, "tasks": tasks, "priority": priority})
+
+
+def _queue(*runs: RunReadiness) -> ReadyQueue:
+    queue = ReadyQueue()
+    for readiness in runs:
+        for i in readiness.pop_ready():
+            queue.push(readiness, i)
+    return queue
+
+
+def _drain(queue: ReadyQueue, n: int | None = None) -> list[tuple[str, int]]:
+    taken = []
+    while n is None or len(taken) < n:
+        item = queue.pop()
+        if item is None:
+            break
+        taken.append((item[0].run_id, item[1]))
+    return taken
+
+
+def test_only_roots_are_ready_initially():
+    readiness = _readiness()
+    assert readiness.pop_ready() == [A]
+    assert readiness.pop_ready() == []
+
+
+def test_success_releases_downstream_once_all_deps_succeed():
+    readiness = _readiness()
+    readiness.pop_ready()
+    readiness.mark(A, TaskState.RUNNING)
+    readiness.mark(A, TaskState.SUCCESS)
+    assert sorted(readiness.pop_ready()) == [B, C]
+
+    readiness.mark(B, TaskState.SUCCESS)
+    assert readiness.pop_ready() == []
+    readiness.mark(C, TaskState.SUCCESS)
+    assert readiness.pop_ready() == [D]
+
+
+def test_rebuild_from_persisted_states():
+    readiness = _readiness(
+        {"A": TaskState.SUCCESS, "B": TaskState.RUNNING, "C": TaskState.RETRYING}
+    )
+    # A RETRYING task waits for its retry timer, not in the ready queue
+    assert readiness.pop_ready() == []
+    assert not readiness.has_work
+    assert readiness.waiting_on[D] == 2
+
+    readiness.mark(C, TaskState.PENDING)
+    assert readiness.pop_ready() == [C]
+    assert not readiness.has_work
+
+
+def test_failure_blocks_every_pending_task_downstream():
+    readiness = _readiness({"A": TaskState.SUCCESS, "C": TaskState.RUNNING})
+    readiness.mark(B, TaskState.FAILED)
+    assert readiness.pop_upstream_failed() == [D]
+    assert readiness.status[D] == TaskState.UPSTREAM_FAILED
+    assert not readiness.finished
+    readiness.mark(C, TaskState.SUCCESS)
+    assert readiness.pop_ready() == []
+    assert readiness.finished
+
+    # Rebuilt after a restart, before the blocked tasks were written back
+    readiness = _readiness({"A": TaskState.FAILED})
+    assert sorted(readiness.pop_upstream_failed()) == [B, C, D]
+    assert readiness.pop_upstream_failed() == []
+    assert readiness.finished
+
+
+def test_limits_count_active_tasks_and_runs_know_when_they_finish():
+    limits = ConcurrencyLimits()
+    readiness = RunReadiness(
+        "run",
+        DAG,
+        [
+            SimpleNamespace(id="ti-A", task_id="A", status=TaskState.SUCCESS),
+            SimpleNamespace(id="ti-B", task_id="B", status=TaskState.RUNNING),
+        ],
+        limits=limits,
+    )
+    assert limits.running == 1 and readiness.started
+    readiness.mark(C, TaskState.QUEUED)
+    readiness.mark(C, TaskState.RUNNING)
+    assert limits.running == 2
+    readiness.mark(B, TaskState.SUCCESS)
+    readiness.mark(C, TaskState.RETRYING)
+    assert limits.running == 0
+    readiness.mark(C, TaskState.SUCCESS)
+    assert not readiness.finished
+    readiness.mark(D, TaskState.FAILED)
+    assert readiness.finished
+
+
+def test_ready_queue_shares_dispatches_between_workflows():
+    big = _readiness(dag=_wide("big", 100), run_id="big")
+    queue = _queue(big)
+    assert _drain(queue, 10) == [("big", k) for k in range(10)]
+
+    # A run triggered later is served alongside the queued one, not after
+    small = _readiness(dag=_wide("small", 3), run_id="small")
+    for i in small.pop_ready():
+        queue.push(small, i)
+    taken = _drain(queue, 6)
+    assert [run_id for run_id, _ in taken].count("small") == 3
+    assert taken[0][0] == "small"
+    assert len(queue) == 90 - 3
+
+
+def test_ready_queue_orders_by_workflow_and_task_priority():
+    low = _readiness(dag=_wide("low", 2), run_id="low")
+    high = _readiness(dag=_wide("high", 2, priority=5), run_id="high")
+    mixed = _readiness(
+        dag=_wide("mixed", 3, task_priorities=(0, 0, 9)), run_id="mixed"
+    )
+    queue = _queue(low, high, mixed)
+    assert _drain(queue) == [
+        ("mixed", 2),
+        ("high", 0),
+        ("high", 1),
+        # "mixed" already had a turn
+        ("low", 0),
+        ("low", 1),
+        ("mixed", 0),
+        ("mixed", 1),
+    ]
+
+
+def test_ready_queue_requeue_discard_and_stale_tasks():
+    first = _readiness(dag=_wide("wf", 3), run_id="first")
+    second = _readiness(dag=_wide("wf", 2), run_id="second")
+    queue = _queue(first, second)
+    readiness, i = queue.pop()
+    queue.requeue(readiness, i)
+    queue.push(readiness, i)
+    assert len(queue) == 5
+    assert queue.pop() == (first, 0)
+
+    # Tasks that stopped being runnable while queued are skipped
+    first.mark(1, TaskState.SUCCESS)
+    queue.discard("second")
+    assert _drain(queue) == [("first", 2)]
+    assert len(queue) == 0
+
+
+def test_ready_queue_refund_does_not_advance_the_clock():
+    high = _readiness(dag=_wide("high", 5, priority=5), run_id="high")
+    low = _readiness(dag=_wide("low", 3), run_id="low")
+    queue = _queue(high, low)
+    assert _drain(queue, 3) == [("high", 0), ("high", 1), ("high", 2)]
+
+    # Popped but not dispatched (e.g. its pool is full)
+    readiness, i = queue.pop()
+    queue.refund(readiness)
+
+    # A workflow that joins now competes with "low", which nothing has
+    # served yet, instead of starting from "high"'s charges
+    new = _readiness(dag=_wide("new", 3), run_id="new")
+    for i in new.pop_ready():
+        queue.push(new, i)
+    assert _drain(queue) == [
+        ("high", 4),
+        ("low", 0),
+        ("new", 0),
+        ("low", 1),
+        ("new", 1),
+        ("low", 2),
+        ("new", 2),
+    ]
+
+
+def test_ready_queue_starts_the_critical_path_first():
+    dag = compile_dag(
+        {
+            "id": "wtd",
+            "tasks": [
+                {"id": "w0", "command": "true"},
+                {"id": "w1", "command": "true"},
+                {"id": "w2", "command": "true"},
+                {"id": "deep", "command": "true", "dependencies": ["w2"]},
+            ],
+        }
+    )
+    assert [i for _, i in _drain(_queue(_readiness(dag=dag)))] == [2, 0, 1]
+    # Ranks weighted by durations: "w1" now takes longest
+    readiness = RunReadiness(
+        "run", dag, [], ranks=bottom_levels(dag, {"w1": 10.0, "w2": 1.0})
+    )
+    assert [i for _, i in _drain(_queue(readiness))] == [1, 2, 0]
@@ -0,0 +1,527 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app import config
+from app.core.models import RunState, TaskState
+from app.core.placement import WorkerRegistry
+from app.core.retries import retry_delay
+from app.core.scheduler import Scheduler
+from app.db import repository
+
+SAMPLE_WORKFLOW = {
+    "id": "wf",
+    "tasks": [
+        {"id": "A", "command": "echo A", "dependencies": []},
+        {"id": "B", "command": "echo B", "dependencies": ["A"]},
+        {"id": "C", "command": "echo C", "dependencies": ["A"]},
+        {"id": "D", "command": "echo D", "dependencies": ["B", "C"]},
+    ],
+}
+
+
+def test_wake_triggers_tick_before_interval(monkeypatch):
+    monkeypatch.setattr(config, "SCHEDULER_INTERVAL", 30.0)
+    scheduler = Scheduler()
+    ticks = []
+
+    async def fake_tick():
+        ticks.append(time.monotonic())
+
+    scheduler._tick = fake_tick
+
+    async def scenario():
+        loop_task = asyncio.create_task(scheduler.start())
+        while not ticks:
+            await asyncio.sleep(0.01)
+        start = time.monotonic()
+        scheduler.wake()
+        while len(ticks) < 2:
+            await asyncio.sleep(0.01)
+        loop_task.cancel()
+        return ticks[1] - start
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5)) < 1.0
+
+
+def test_wake_before_start_is_noop():
+    Scheduler().wake()
+
+
+def _tick(scheduler):
+    """Run one tick and wait for the background dispatch it started."""
+
+    async def tick_and_flush():
+        await scheduler._tick()
+        await asyncio.gather(*scheduler._inflight)
+
+    asyncio.run(tick_and_flush())
+
+
+def _scheduler_with_fake_dispatch(
+    monkeypatch, session_factory, dispatched, reject=()
+):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    scheduler = Scheduler()
+
+    async def fake_send(worker_url, payloads):
+        dispatched.extend(p["task_id"] for p in payloads)
+        return [
+            "rejected" if p["task_id"] in reject else "accepted" for p in payloads
+        ]
+
+    scheduler._send_to_worker = fake_send
+    return scheduler
+
+
+def test_tick_dispatches_only_newly_ready_tasks(monkeypatch, session_factory):
+    db = session_factory()
+    repository.create_workflow(db, "wf", SAMPLE_WORKFLOW)
+    run = repository.create_run(db, "wf", SAMPLE_WORKFLOW["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert dispatched == ["A"]
+
+    _tick(scheduler)
+    assert dispatched == ["A"]
+
+    task_a = next(
+        t for t in repository.get_task_instances(db, run.id) if t.task_id == "A"
+    )
+    repository.update_task_status(db, task_a.id, TaskState.SUCCESS)
+    scheduler.task_state_changed(run.id, "A", TaskState.SUCCESS)
+    _tick(scheduler)
+    assert sorted(dispatched) == ["A", "B", "C"]
+
+    # A restarted scheduler rebuilds readiness from the DB and does not
+    # re-dispatch tasks that are already RUNNING.
+    restarted = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, restarted
+    )
+    _tick(scheduler)
+    assert restarted == []
+    db.close()
+
+
+def test_rejected_dispatch_reverts_only_that_task(monkeypatch, session_factory):
+    db = session_factory()
+    workflow = {
+        "id": "wide",
+        "tasks": [{"id": t, "command": "true"} for t in ("A", "B", "C")],
+    }
+    repository.create_workflow(db, "wide", workflow)
+    run = repository.create_run(db, "wide", workflow["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched, reject={"B"}
+    )
+    _tick(scheduler)
+
+    statuses = {t.task_id: t.status for t in repository.get_task_instances(db, run.id)}
+    assert statuses == {
+        "A": TaskState.RUNNING,
+        "B": TaskState.PENDING,
+        "C": TaskState.RUNNING,
+    }
+    assert run.id in scheduler._dirty
+
+    _tick(scheduler)
+    assert sorted(dispatched) == ["A", "B", "B", "C"]
+    db.close()
+
+
+def test_busy_worker_is_skipped_and_tasks_stay_pending(monkeypatch, session_factory):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    monkeypatch.setattr(config, "WORKER_BUSY_COOLDOWN", 60.0)
+    db = session_factory()
+    workflow = {
+        "id": "busy-fanout",
+        "tasks": [{"id": t, "command": "true"} for t in ("A", "B", "C", "D")],
+    }
+    repository.create_workflow(db, "busy-fanout", workflow)
+    run = repository.create_run(db, "busy-fanout", workflow["tasks"])
+
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry(["http://busy", "http://free"])
+    sent = []
+
+    async def fake_send(worker_url, payloads):
+        sent.append((worker_url, sorted(p["task_id"] for p in payloads)))
+        status = "busy" if worker_url == "http://busy" else "accepted"
+        return [status] * len(payloads)
+
+    scheduler._send_to_worker = fake_send
+    _tick(scheduler)
+    statuses = [t.status for t in repository.get_task_instances(db, run.id)]
+    assert statuses.count(TaskState.PENDING) == 2
+    assert scheduler.workers.pick() == "http://free"
+
+    # While it cools down every task goes to the free worker
+    _tick(scheduler)
+    assert sent[-1][0] == "http://free"
+    statuses = [t.status for t in repository.get_task_instances(db, run.id)]
+    assert statuses == [TaskState.RUNNING] * 4
+
+    # With every worker busy nothing is sent and ready tasks are kept
+    scheduler._mark_busy("http://free")
+    run2 = repository.create_run(db, "busy-fanout", workflow["tasks"])
+    scheduler.run_created(run2.id)
+    calls = len(sent)
+    _tick(scheduler)
+    assert len(sent) == calls
+    assert len(scheduler._ready) == 4
+    db.close()
+
+
+def test_tasks_of_a_lost_worker_are_retried_elsewhere(monkeypatch, session_factory):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    db = session_factory()
+    workflow = {
+        "id": "orphans",
+        "tasks": [
+            {"id": "A", "command": "true", "max_retries": 1, "retry_delay": 0}
+        ],
+    }
+    repository.create_workflow(db, "orphans", workflow)
+    run = repository.create_run(db, "orphans", workflow["tasks"])
+
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry(["http://a", "http://b"])
+    sent = []
+
+    async def fake_send(worker_url, payloads):
+        sent.append(worker_url)
+        return ["accepted"] * len(payloads)
+
+    scheduler._send_to_worker = fake_send
+    _tick(scheduler)
+    assert sent == ["http://a"]
+
+    # The worker goes away without reporting: its task is retried on "b"
+    scheduler.worker_left("http://a")
+    _tick(scheduler)
+    assert sent == ["http://a", "http://b"]
+    (task,) = repository.get_task_instances(db, run.id)
+    db.refresh(task)
+    assert (task.status, task.worker_id, task.retries_left) == (
+        TaskState.RUNNING,
+        "http://b",
+        0,
+    )
+    assert scheduler.workers.workers["http://b"].in_flight == 1
+    db.close()
+
+
+def test_dispatch_is_only_reverted_when_it_never_reached_the_worker(
+    monkeypatch, session_factory
+):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    db = session_factory()
+    workflow = {"id": "lost", "tasks": [{"id": "A", "command": "true"}]}
+    repository.create_workflow(db, "lost", workflow)
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry(["http://w"])
+    error = httpx.ReadTimeout
+    sent = []
+
+    def handler(request):
+        sent.append(request.url.path)
+        raise error("no answer", request=request)
+
+    scheduler._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    # The worker may have started it: it stays RUNNING under its lease
+    # instead of being sent again
+    timed_out = repository.create_run(db, "lost", workflow["tasks"])
+    _tick(scheduler)
+    scheduler.workers.mark_busy("http://w", 0)
+    _tick(scheduler)
+    assert sent == ["/execute"]
+    (task,) = repository.get_task_instances(db, timed_out.id)
+    assert task.status == TaskState.RUNNING and task.lease_expires_at
+
+    # A connection that failed never delivered it: back to PENDING
+    error = httpx.ConnectError
+    refused = repository.create_run(db, "lost", workflow["tasks"])
+    scheduler.run_created(refused.id)
+    scheduler.workers.mark_busy("http://w", 0)
+    _tick(scheduler)
+    assert sent == ["/execute", "/execute"]
+    (task,) = repository.get_task_instances(db, refused.id)
+    assert task.status == TaskState.PENDING
+    db.close()
+
+
+def test_task_already_running_on_the_worker_counts_as_accepted(
+    monkeypatch, session_factory
+):
+    monkeypatch.setattr("app.core.scheduler.SessionLocal", session_factory)
+    db = session_factory()
+    workflow = {"id": "dup", "tasks": [{"id": t, "command": "true"} for t in "AB"]}
+    repository.create_workflow(db, "dup", workflow)
+    scheduler = Scheduler()
+    scheduler.workers = WorkerRegistry(["http://w"])
+
+    def handler(request):
+        if request.url.path == "/execute":
+            return httpx.Response(409, json={"detail": "already running"})
+        tasks = json.loads(request.content)["tasks"]
+        results = [
+            {"task_instance_id": t["task_instance_id"], "status": "rejected"}
+            for t in tasks
+        ]
+        results[0]["reason"] = "already running"
+        return httpx.Response(200, json={"results": results})
+
+    scheduler._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    single = scheduler._send_to_worker("http://w", [{"task_instance_id": "a"}])
+    assert asyncio.run(single) == ["accepted"]
+
+    run = repository.create_run(db, "dup", workflow["tasks"])
+    _tick(scheduler)
+    statuses = {t.task_id: t.status for t in repository.get_task_instances(db, run.id)}
+    # Only the task rejected for another reason goes back to PENDING
+    assert sorted(statuses.values()) == [TaskState.PENDING, TaskState.RUNNING]
+    db.close()
+
+
+def test_pull_mode_queues_ready_tasks_and_wakes_claimers(monkeypatch, session_factory):
+    monkeypatch.setattr(config, "DISPATCH_MODE", "pull")
+    db = session_factory()
+    repository.create_workflow(db, "pull", dict(SAMPLE_WORKFLOW, id="pull"))
+    run = repository.create_run(db, "pull", SAMPLE_WORKFLOW["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+
+    async def scenario():
+        since = scheduler.work_generation
+        waiter = asyncio.create_task(scheduler.wait_for_work(since, timeout=5))
+        await asyncio.sleep(0)
+        await scheduler._tick()
+        await asyncio.wait_for(waiter, timeout=1)
+        # Work queued before the wait started is not missed either
+        await asyncio.wait_for(scheduler.wait_for_work(since, timeout=5), timeout=1)
+
+    asyncio.run(scenario())
+    assert dispatched == []
+    statuses = {t.task_id: t.status for t in repository.get_task_instances(db, run.id)}
+    assert statuses == {
+        "A": TaskState.QUEUED,
+        "B": TaskState.PENDING,
+        "C": TaskState.PENDING,
+        "D": TaskState.PENDING,
+    }
+    db.close()
+
+
+def test_concurrency_limit_shares_places_between_workflows(monkeypatch, session_factory):
+    monkeypatch.setattr(config, "MAX_RUNNING_TASKS", 2)
+    db = session_factory()
+    big = {"id": "big", "tasks": [{"id": f"b{k}", "command": "true"} for k in range(6)]}
+    small = {"id": "small", "tasks": [{"id": "s0", "command": "true"}]}
+    repository.create_workflow(db, "big", big)
+    repository.create_workflow(db, "small", small)
+    big_run = repository.create_run(db, "big", big["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert dispatched == ["b0", "b1"]
+    assert len(scheduler._ready) == 4
+
+    small_run = repository.create_run(db, "small", small["tasks"])
+    scheduler.run_created(small_run.id)
+    _tick(scheduler)
+    assert dispatched == ["b0", "b1"]
+
+    # The first free place goes to the small run, not to the big backlog
+    b0 = next(
+        t for t in repository.get_task_instances(db, big_run.id) if t.task_id == "b0"
+    )
+    repository.update_task_status(db, b0.id, TaskState.SUCCESS)
+    scheduler.task_state_changed(big_run.id, "b0", TaskState.SUCCESS)
+    _tick(scheduler)
+    assert dispatched == ["b0", "b1", "s0"]
+    db.close()
+
+
+def _succeed(db, scheduler, run_id, task_id):
+    task = next(
+        t for t in repository.get_task_instances(db, run_id) if t.task_id == task_id
+    )
+    repository.update_task_status(db, task.id, TaskState.SUCCESS)
+    scheduler.task_state_changed(run_id, task_id, TaskState.SUCCESS)
+
+
+def test_pools_and_max_active_tasks_cap_what_is_dispatched(monkeypatch, session_factory):
+    monkeypatch.setattr(config, "POOLS", {"warehouse": 2})
+    db = session_factory()
+    workflow = {
+        "id": "etl",
+        "max_active_tasks": 4,
+        "tasks": [
+            {"id": f"load{k}", "command": "true", "pool": "warehouse"} for k in range(4)
+        ]
+        + [{"id": f"other{k}", "command": "true"} for k in range(3)],
+    }
+    repository.create_workflow(db, "etl", workflow)
+    run = repository.create_run(db, "etl", workflow["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert sorted(dispatched) == ["load0", "load1", "other0", "other1"]
+    # The rest wait for a slot instead of being rescanned every pass
+    assert len(scheduler._ready) == 0
+
+    _succeed(db, scheduler, run.id, "load0")
+    _tick(scheduler)
+    assert dispatched[4:] == ["load2"]
+    _succeed(db, scheduler, run.id, "other0")
+    _tick(scheduler)
+    assert dispatched[5:] == ["other2"]
+    assert scheduler.limits.running == 4
+    db.close()
+
+
+def test_max_active_runs_admits_runs_in_trigger_order(monkeypatch, session_factory):
+    db = session_factory()
+    workflow = {
+        "id": "one-at-a-time",
+        "max_active_runs": 1,
+        "tasks": [{"id": "A", "command": "true"}],
+    }
+    repository.create_workflow(db, "one-at-a-time", workflow)
+    first = repository.create_run(db, "one-at-a-time", workflow["tasks"])
+    second = repository.create_run(db, "one-at-a-time", workflow["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert dispatched == ["A"]
+    statuses = [t.status for t in repository.get_task_instances(db, second.id)]
+    assert statuses == [TaskState.PENDING]
+
+    _succeed(db, scheduler, first.id, "A")
+    _tick(scheduler)
+    assert dispatched == ["A", "A"]
+    db.expire_all()
+    statuses = [t.status for t in repository.get_task_instances(db, second.id)]
+    assert statuses == [TaskState.RUNNING]
+    db.close()
+
+
+def test_failed_run_frees_its_max_active_runs_slot(monkeypatch, session_factory):
+    db = session_factory()
+    workflow = {
+        "id": "fails-first",
+        "max_active_runs": 1,
+        "tasks": [
+            {"id": "A", "command": "false"},
+            {"id": "B", "command": "true", "dependencies": ["A"]},
+        ],
+    }
+    repository.create_workflow(db, "fails-first", workflow)
+    first = repository.create_run(db, "fails-first", workflow["tasks"])
+    second = repository.create_run(db, "fails-first", workflow["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert dispatched == ["A"]
+
+    task = next(
+        t for t in repository.get_task_instances(db, first.id) if t.task_id == "A"
+    )
+    repository.update_task_status(db, task.id, TaskState.FAILED)
+    repository.check_run_completion(db, first.id)
+    scheduler.task_state_changed(first.id, "A", TaskState.FAILED)
+    _tick(scheduler)
+
+    db.expire_all()
+    instances = repository.get_task_instances(db, first.id)
+    statuses = {t.task_id: t.status for t in instances}
+    assert statuses == {"A": TaskState.FAILED, "B": TaskState.UPSTREAM_FAILED}
+    assert repository.get_run(db, first.id).status == RunState.FAILED
+    assert repository.find_counter_drift(db) == []
+    assert dispatched == ["A", "A"]
+    instances = repository.get_task_instances(db, second.id)
+    statuses = {t.task_id: t.status for t in instances}
+    assert statuses == {"A": TaskState.RUNNING, "B": TaskState.PENDING}
+    db.close()
+
+
+def test_retry_delay_backs_off_with_jitter_up_to_the_max(monkeypatch):
+    monkeypatch.setattr(config, "RETRY_JITTER", 0.0)
+    assert [retry_delay(k, 1, 2, 10) for k in range(5)] == [1, 2, 4, 8, 10]
+    assert retry_delay(10_000, 1, 2, 10) == 10
+    monkeypatch.setattr(config, "RETRY_JITTER", 0.5)
+    delays = [retry_delay(3, 1, 2, 10, random.Random(k)) for k in range(100)]
+    assert all(4 <= d <= 8 for d in delays) and len(set(delays)) == 100
+
+
+def test_retries_wait_out_their_backoff_across_restarts(monkeypatch, session_factory):
+    db = session_factory()
+    workflow = {
+        "id": "flaky",
+        "tasks": [{"id": "A", "command": "false", "max_retries": 2}],
+    }
+    repository.create_workflow(db, "flaky", workflow)
+    run = repository.create_run(db, "flaky", workflow["tasks"])
+
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    (task,) = repository.get_task_instances(db, run.id)
+    not_before = datetime.now(timezone.utc) + timedelta(seconds=0.5)
+    repository.update_task_instances(
+        db,
+        [(task, {"status": TaskState.RETRYING, "not_before": not_before.isoformat()})],
+    )
+    scheduler.task_state_changed(
+        run.id, "A", TaskState.RETRYING, not_before.isoformat()
+    )
+    _tick(scheduler)
+    assert dispatched == ["A"]
+    assert scheduler._retries.next_due() == not_before.timestamp()
+
+    # A restarted scheduler times the retry from the stored not_before
+    dispatched = []
+    scheduler = _scheduler_with_fake_dispatch(
+        monkeypatch, session_factory, dispatched
+    )
+    _tick(scheduler)
+    assert dispatched == [] and len(scheduler._retries) == 1
+    time.sleep(max(0.0, not_before.timestamp() - time.time()))
+    _tick(scheduler)
+    assert dispatched == ["A"]
+    db.refresh(task)
+    assert (task.status, task.retries_left, task.not_before) == (
+        TaskState.RUNNING,
+        1,
+        None,
+    )
+    db.close()
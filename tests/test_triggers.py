@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import config
+from app.core.cron import CronExpression
+from app.core.triggers import RunTrigger, Schedule
+from app.db import repository
+from app.db.tables import WorkflowRun
+
+UTC = timezone.utc
+
+
+def _times(expression: str, after: datetime, n: int) -> list[str]:
+    cron = CronExpression(expression)
+    times = []
+    for _ in range(n):
+        after = cron.next_after(after)
+        times.append(after.strftime("%a %m-%d %H:%M"))
+    return times
+
+
+def _runs(db, workflow_id: str) -> list[WorkflowRun]:
+    return db.query(WorkflowRun).filter(WorkflowRun.workflow_id == workflow_id).all()
+
+
+def test_cron_expressions_match_like_cron():
+    start = datetime(2024, 1, 31, 23, 59, tzinfo=UTC)
+    assert _times("*/20 * * * *", start, 3) == [
+        "Thu 02-01 00:00",
+        "Thu 02-01 00:20",
+        "Thu 02-01 00:40",
+    ]
+    assert _times("30 2 * * mon-fri", start, 3) == [
+        "Thu 02-01 02:30",
+        "Fri 02-02 02:30",
+        "Mon 02-05 02:30",
+    ]
+    # Both day fields restricted: either one matches
+    assert _times("0 0 13 * 5", start, 3) == [
+        "Fri 02-02 00:00",
+        "Fri 02-09 00:00",
+        "Tue 02-13 00:00",
+    ]
+    assert _times("@monthly", start, 2) == ["Thu 02-01 00:00", "Fri 03-01 00:00"]
+    assert _times("0 0 29 feb *", start, 2) == ["Thu 02-29 00:00", "Tue 02-29 00:00"]
+
+
+@pytest.mark.parametrize(
+    "expression", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *", "0 0 30 2 *"]
+)
+def test_invalid_cron_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_schedules_jitter_per_workflow_and_catch_up_only_the_latest_times(monkeypatch):
+    monkeypatch.setattr(config, "SCHEDULE_JITTER", 60.0)
+    offsets = {Schedule(f"wf-{k}", cron="@hourly").offset for k in range(200)}
+    assert len(offsets) == 200
+    assert all(timedelta(0) <= o < timedelta(seconds=60) for o in offsets)
+    # Never more than half the period
+    assert Schedule("wf", interval=10).offset < timedelta(seconds=5)
+
+    monkeypatch.setattr(config, "SCHEDULE_JITTER", 0.0)
+    schedule = Schedule("wf", interval=3600, max_catchup_runs=2)
+    now = datetime(2025, 1, 1, 12, 30, tzinfo=UTC)
+    # The master was down for a year: only the last two hours get a run
+    due, following = schedule.due(now - timedelta(days=365), now)
+    assert [t.hour for t in due] == [11, 12]
+    assert following == datetime(2025, 1, 1, 13, tzinfo=UTC)
+    assert schedule.due(following, now) == ([], following)
+
+
+def test_trigger_creates_due_runs_once_and_times_the_next(monkeypatch, session_factory):
+    monkeypatch.setattr("app.core.triggers.SessionLocal", session_factory)
+    monkeypatch.setattr(config, "SCHEDULE_JITTER", 0.0)
+    db = session_factory()
+    definition = {
+        "id": "every-minute",
+        "schedule": "* * * * *",
+        "max_catchup_runs": 3,
+        "tasks": [{"id": "A", "command": "true"}],
+    }
+    now = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+    monkeypatch.setattr("app.core.triggers._now", lambda: now + timedelta(seconds=30))
+    missed = (now - timedelta(minutes=10)).isoformat()
+    repository.create_workflow(db, "every-minute", definition, next_run_at=missed)
+
+    class FakeScheduler:
+        def __init__(self):
+            self.created = []
+
+        def run_created(self, run_id):
+            self.created.append(run_id)
+
+    scheduler = FakeScheduler()
+    trigger = RunTrigger(scheduler)
+    trigger.workflow_registered("every-minute")
+    trigger._tick()
+    runs = _runs(db, "every-minute")
+    assert sorted(r.scheduled_at for r in runs) == [
+        (now - timedelta(minutes=k)).isoformat() for k in (2, 1, 0)
+    ]
+    assert sorted(scheduler.created) == sorted(r.id for r in runs)
+    next_run_at = (now + timedelta(minutes=1)).isoformat()
+    assert repository.get_workflow(db, "every-minute").next_run_at == next_run_at
+    assert len(trigger) == 1 and trigger._heap[0][2] == next_run_at
+
+    # A second master still holding the old next_run_at creates nothing
+    # and follows the stored one instead
+    other = RunTrigger(FakeScheduler())
+    other._schedules["every-minute"] = Schedule.of(definition)
+    other._push("every-minute", missed)
+    other._tick()
+    assert len(_runs(db, "every-minute")) == 3
+    assert other._next == {"every-minute": next_run_at}
+    db.close()
@@ -0,0 +1,449 @@
+import os
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.worker import server
+from app.worker.executor import execute_command
+from app.worker.heartbeat import Heartbeat
+from app.worker.logs import sweep_logs
+from app.worker.pool import ExecutionPool
+from app.worker.puller import WorkPuller
+from app.worker.reporter import ResultReporter
+
+
+@pytest.fixture()
+def worker(monkeypatch):
+    """Worker TestClient with one slot and one queue place; tasks block
+    (nothing is executed) until the test finishes."""
+    started = []
+    release = threading.Event()
+
+    def fake_run(request, base_url):
+        started.append(request)
+        release.wait(5)
+
+    pool = ExecutionPool(slots=1, queue_size=1)
+    monkeypatch.setattr(server, "pool", pool)
+    monkeypatch.setattr(server, "_run_and_report", fake_run)
+    with TestClient(server.app) as c:
+        yield c, started
+    release.set()
+    server._running.clear()
+    server._attempts.clear()
+
+
+def _task(task_instance_id: str) -> dict:
+    return {
+        "task_instance_id": task_instance_id,
+        "task_id": task_instance_id,
+        "command": "true",
+        "callback_url": "http://127.0.0.1:1/internal/task-result",
+    }
+
+
+def test_execute_accepts_task(worker):
+    client, started = worker
+    response = client.post("/execute", json=_task("ti-1"))
+    assert response.status_code == 200
+    assert response.json()["status"] == "accepted"
+    _wait_for(lambda: [r.task_instance_id for r in started] == ["ti-1"])
+
+
+def test_execute_rejects_task_already_running(worker):
+    client, _ = worker
+    client.post("/execute", json={**_task("ti-1"), "attempt": "first"})
+    response = client.post("/execute", json={**_task("ti-1"), "attempt": "second"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "already running"
+    # The running copy reports its result as the master's latest attempt
+    assert server._finished("ti-1") == "second"
+
+
+def test_execute_batch_reports_acceptance_per_task(worker):
+    client, started = worker
+    client.post("/execute", json=_task("ti-2"))
+
+    response = client.post(
+        "/execute/batch", json={"tasks": [_task("ti-1"), _task("ti-2")]}
+    )
+
+    assert response.status_code == 200
+    results = {r["task_instance_id"]: r for r in response.json()["results"]}
+    assert results["ti-1"]["status"] == "accepted"
+    assert results["ti-2"]["status"] == "rejected"
+    assert results["ti-2"]["reason"] == "already running"
+    assert response.json()["load"]["queued"] + response.json()["load"]["running"] == 2
+
+
+def test_execute_returns_busy_when_pool_is_full(worker):
+    client, _ = worker
+    client.post("/execute", json=_task("ti-1"))
+    client.post("/execute", json=_task("ti-2"))
+
+    response = client.post("/execute", json=_task("ti-3"))
+    assert response.status_code == 429
+    assert response.json()["detail"]["status"] == "busy"
+
+    response = client.post("/execute/batch", json={"tasks": [_task("ti-4")]})
+    assert response.json()["results"][0]["status"] == "busy"
+    # A busy task is not left marked as running, so it can be resent later
+    assert "ti-3" not in server._running
+
+
+def test_pool_logs_tasks_that_raise(caplog):
+    pool = ExecutionPool(slots=1, queue_size=0)
+
+    def report_result():
+        raise ValueError("cannot encode the result")
+
+    assert pool.try_submit(report_result)
+    _wait_for(lambda: pool.load()["free_slots"] == 1)
+    assert "Task report_result failed" in caplog.text
+    assert "cannot encode the result" in caplog.text
+    pool.shutdown()
+
+
+def _reporter(post, **overrides):
+    options = dict(
+        batch_size=3,
+        flush_interval=5.0,
+        max_buffered=100,
+        retry_base_delay=0.01,
+        retry_max_delay=0.02,
+        retry_deadline=5.0,
+        post=post,
+    )
+    options.update(overrides)
+    return ResultReporter(**options)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.01)
+
+
+def test_reporter_flushes_full_batches():
+    sent = []
+    reporter = _reporter(lambda url, body: sent.append(body["results"]) or True)
+    for i in range(3):
+        reporter.report("http://master/internal/task-results", {"id": i})
+    _wait_for(lambda: sent)
+    assert sent == [[{"id": 0}, {"id": 1}, {"id": 2}]]
+
+
+def test_reporter_flushes_immediately_when_idle():
+    sent = []
+    reporter = _reporter(
+        lambda url, body: sent.append(body["results"]) or True,
+        is_idle=lambda: True,
+    )
+    reporter.report("http://master/internal/task-results", {"id": 0})
+    _wait_for(lambda: sent)
+    assert sent == [[{"id": 0}]]
+
+
+def test_reporter_retries_until_master_is_back():
+    attempts = []
+
+    def flaky_post(url, body):
+        attempts.append(body["results"])
+        if len(attempts) < 3:
+            raise httpx.ConnectError("master down")
+        return True
+
+    reporter = _reporter(flaky_post, batch_size=1)
+    reporter.report("http://master/internal/task-results", {"id": 0})
+    _wait_for(lambda: len(attempts) == 3)
+    assert attempts == [[{"id": 0}]] * 3
+    assert reporter.pending() == 0
+
+
+def test_heartbeat_registers_and_deregisters():
+    calls = []
+    heartbeat = Heartbeat(
+        master_url="http://master/",
+        worker_id="worker-1",
+        worker_url="http://w1:8001",
+        interval=0.01,
+        load=lambda: {"slots": 2},
+        running=lambda: ["ti-1"],
+        post=lambda url, body: calls.append((url, body)),
+    )
+    heartbeat.start()
+    _wait_for(lambda: len(calls) >= 2)
+    heartbeat.stop()
+
+    assert calls[0] == (
+        "http://master/internal/workers/heartbeat",
+        {
+            "worker_id": "worker-1",
+            "url": "http://w1:8001",
+            "load": {"slots": 2},
+            "running": ["ti-1"],
+        },
+    )
+    assert calls[-1][0] == "http://master/internal/workers/deregister"
+
+
+def test_puller_claims_no_more_than_free_slots():
+    requests = []
+    started = []
+    release = threading.Event()
+    pool = ExecutionPool(slots=2, queue_size=10)
+
+    def fake_post(url, body):
+        requests.append(body)
+        if body["max_tasks"] == 0:
+            return {"tasks": []}
+        ids = [f"ti-{len(started) + k}" for k in range(body["max_tasks"])]
+        return {"tasks": [{"task_instance_id": i} for i in ids]}
+
+    def start(task):
+        started.append(task["task_instance_id"])
+        pool.try_submit(release.wait, 5)
+
+    puller = WorkPuller(
+        master_url="http://master",
+        worker_id="worker-1",
+        pool=pool,
+        claim_size=8,
+        wait=1.0,
+        renew_interval=0.01,
+        running=lambda: list(started),
+        start=start,
+        post=fake_post,
+    )
+    puller.start()
+    _wait_for(lambda: len(requests) >= 3)
+    puller.stop()
+    release.set()
+
+    assert requests[0]["max_tasks"] == 2
+    assert started == ["ti-0", "ti-1"]
+    # Full: only lease renewals for what is running
+    assert requests[2] == {
+        "worker_id": "worker-1",
+        "max_tasks": 0,
+        "wait": 0.0,
+        "running": ["ti-0", "ti-1"],
+    }
+
+
+def test_output_is_streamed_to_the_log_and_bounded(tmp_path):
+    log = tmp_path / "ti.log"
+    command = "python -c \"print('a' * 1000000)\"; echo done >&2; exit 3"
+    success, output = execute_command(
+        command, log_path=str(log), head_bytes=10, tail_bytes=7
+    )
+    assert not success
+    assert log.stat().st_size == 1000001 + len("done\n")
+    assert output.startswith("a" * 10)
+    assert output.endswith("a\ndone")
+    assert "bytes omitted" in output and len(output) < 100
+
+
+def test_log_file_is_capped_to_its_head_and_tail(tmp_path):
+    log = tmp_path / "ti.log"
+    command = "python -c \"print('a' * 1000, end='')\"; echo done"
+    success, _ = execute_command(
+        command, log_path=str(log), head_bytes=10, tail_bytes=5, log_max_bytes=100
+    )
+    assert success
+    head, marker, tail = log.read_text().split("\n", 2)
+    assert head == "a" * 100
+    assert marker == "... [900 bytes omitted from the log] ..."
+    assert tail == "done\n"
+
+
+def test_log_sweep_deletes_old_logs_then_oldest_over_budget(tmp_path):
+    now = time.time()
+    ages = {"old": 7200, "running": 7200, "a": 30, "b": 20, "c": 10}
+    for name, age in ages.items():
+        path = tmp_path / f"{name}.log"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - age, now - age))
+    (tmp_path / "notes.txt").write_text("not a log")
+
+    deleted = sweep_logs(
+        str(tmp_path), max_age=3600, max_bytes=300, keep=["running"], now=now
+    )
+    # "old" is past max_age; "a" goes to get back to 300 bytes, while
+    # "running" stays however old it is
+    assert sorted(os.path.basename(p) for p in deleted) == ["a.log", "old.log"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "b.log", "c.log", "notes.txt", "running.log"
+    ]
+    assert sweep_logs(str(tmp_path / "missing"), 3600, 250) == []
+
+
+def test_timeout_kills_the_whole_command(tmp_path):
+    started = time.monotonic()
+    success, output = execute_command(
+        "echo before; sleep 30 | cat", timeout=0.2, log_path=str(tmp_path / "t.log")
+    )
+    assert not success
+    assert output == "before\nCommand timed out"
+    assert time.monotonic() - started < 10
+
+
+def test_memory_limit_fails_the_command_and_usage_is_recorded(tmp_path):
+    allocate = "python -c \"b = bytearray(200 * 1024 * 1024); print('allocated')\""
+    usage = {}
+    success, output = execute_command(
+        allocate, memory_mb=100, log_path=str(tmp_path / "m.log"), usage=usage
+    )
+    assert not success
+    assert "MemoryError" in output
+    assert usage["wall_seconds"] >= 0 and "cpu_seconds" in usage
+
+    usage = {}
+    success, output = execute_command(allocate, usage=usage)
+    assert success and output == "allocated"
+    assert usage["peak_rss_kb"] >= 200 * 1024
+
+
+def test_log_endpoint_serves_byte_ranges(worker, monkeypatch, tmp_path):
+    client, _ = worker
+    monkeypatch.setattr(config, "WORKER_LOG_DIR", str(tmp_path))
+    (tmp_path / "ti-1.log").write_bytes(b"0123456789")
+
+    full = client.get("/logs/ti-1")
+    assert (full.status_code, full.content) == (200, b"0123456789")
+    part = client.get("/logs/ti-1", headers={"Range": "bytes=2-4"})
+    assert (part.status_code, part.content) == (206, b"234")
+    assert part.headers["content-range"] == "bytes 2-4/10"
+    assert client.get("/logs/ti-1", headers={"Range": "bytes=7-"}).content == b"789"
+    assert client.get("/logs/ti-1", headers={"Range": "bytes=-3"}).content == b"789"
+    assert client.get("/logs/ti-1", headers={"Range": "bytes=10-"}).status_code == 416
+    assert client.get("/logs/missing").status_code == 404
+
+
+def test_async_timeout_and_cancellation_kill_the_process_group(tmp_path):
+    import asyncio
+
+    from app.worker.executor import execute_command_async
+
+    async def scenario():
+        success, output = await execute_command_async(
+            "echo before; sleep 30 | cat", timeout=0.2
+        )
+        assert (success, output) == (False, "before\nCommand timed out")
+
+        log = tmp_path / "cancel.log"
+        task = asyncio.create_task(
+            execute_command_async("echo $$; sleep 30 | cat", log_path=str(log))
+        )
+        while not log.exists() or not log.read_text():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return int(log.read_text())
+
+    started = time.monotonic()
+    group = asyncio.run(scenario())
+    assert time.monotonic() - started < 10
+    # SIGKILL is delivered asynchronously; give the group a moment to die
+    deadline = time.monotonic() + 5
+    while _live_processes_in_group(group) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _live_processes_in_group(group) == []
+
+
+def _live_processes_in_group(group: int) -> list[int]:
+    """Pids still running in a process group (zombies waiting for init are dead)."""
+    import os
+
+    live = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields: state, ppid, pgrp, ...
+        if int(fields[2]) == group and fields[0] != "Z":
+            live.append(int(pid))
+    return live
+
+
+def test_async_pool_runs_coroutines_within_its_slots():
+    import asyncio
+
+    from app.worker.pool import AsyncExecutionPool
+
+    pool = AsyncExecutionPool(slots=50, queue_size=10)
+    release = threading.Event()
+    peak = []
+
+    async def task():
+        peak.append(pool.load()["running"])
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    accepted = sum(pool.try_submit(task) for _ in range(70))
+    assert accepted == 60
+    _wait_for(lambda: pool.load()["running"] == 50)
+    assert pool.load()["queued"] == 10 and max(peak) <= 50
+    release.set()
+    _wait_for(lambda: pool.load()["running"] == 0 and pool.load()["queued"] == 0)
+    assert len(peak) == 60
+    pool.shutdown()
+
+
+def test_async_pool_blocking_calls_get_a_thread_per_slot():
+    from app.worker.pool import AsyncExecutionPool
+
+    # More slots than the loop's default executor has threads
+    pool = AsyncExecutionPool(slots=40, queue_size=0)
+    release = threading.Event()
+    blocked = []
+
+    def wait_on_interpreter():
+        blocked.append(1)
+        release.wait(5)
+
+    async def task():
+        await pool.run_blocking(wait_on_interpreter)
+
+    assert sum(pool.try_submit(task) for _ in range(40)) == 40
+    _wait_for(lambda: len(blocked) == 40)
+    release.set()
+    _wait_for(lambda: pool.load()["running"] == 0)
+    pool.shutdown()
+
+
+def test_interpreter_pool_reuses_warm_processes(tmp_path):
+    from app.worker.interpreters import InterpreterPool
+
+    interpreters = InterpreterPool(1, preload=("json",), max_tasks=3)
+    try:
+        log = tmp_path / "task.log"
+        assert interpreters.run("builtins:print", ["hello"], log_path=str(log)) == (
+            True,
+            "hello",
+        )
+        assert log.read_text() == "hello\n"
+        pids = [interpreters.run("os:getpid")[1] for _ in range(3)]
+        # Reused until max_tasks, then replaced
+        assert pids[0] == pids[1] != pids[2]
+
+        success, output = interpreters.run("math:sqrt", [-1])
+        assert not success and output.endswith("ValueError: math domain error")
+
+        started = time.monotonic()
+        assert interpreters.run("time:sleep", [30], timeout=0.2) == (
+            False,
+            "Command timed out",
+        )
+        assert time.monotonic() - started < 5
+        assert interpreters.run("math:factorial", [5]) == (True, "120")
+    finally:
+        interpreters.close()